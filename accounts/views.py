@@ -79,24 +79,21 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             status__in=['agendado', 'confirmado']
         ).order_by('data_aula', 'horario_inicio')[:5]
         
-        # Faturas vencidas (usando FaturaSimples)
+        # Faturas vencidas (usando FaturaSimples, status calculado pelo vencimento)
         context['faturas_vencidas'] = FaturaSimples.objects.filter(
-            personal_trainer=user,
-            status='atrasada'
-        ).count()
+            personal_trainer=user
+        ).atrasadas().count()
         
         # Faturas que vencem hoje (usando FaturaSimples)
         context['faturas_vencem_hoje'] = FaturaSimples.objects.filter(
             personal_trainer=user,
-            status='pendente',
             data_vencimento=hoje
-        ).count()
+        ).pendentes().count()
         
         # Faturas pendentes (usando FaturaSimples)
         context['faturas_pendentes'] = FaturaSimples.objects.filter(
-            personal_trainer=user,
-            status='pendente'
-        ).count()
+            personal_trainer=user
+        ).pendentes().count()
         
         # Notificações não lidas (DESABILITADAS)
         # context['notificacoes_nao_lidas'] = Notificacao.objects.filter(
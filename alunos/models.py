@@ -5,6 +5,8 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from frequencia.cache import invalidar_cache_frequencia
+
 
 class Aluno(models.Model):
     """
@@ -49,6 +51,16 @@ class Aluno(models.Model):
     def __str__(self):
         return self.nome
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Nome e situação do aluno aparecem nos feeds da agenda
+        invalidar_cache_frequencia(self.personal_trainer_id)
+    
+    def delete(self, *args, **kwargs):
+        # A exclusão leva junto aulas e presenças sem passar pelo delete() delas
+        invalidar_cache_frequencia(self.personal_trainer_id)
+        return super().delete(*args, **kwargs)
+    
     @property
     def idade(self):
         """Calcula a idade do aluno."""
@@ -4,6 +4,7 @@ Views para gerenciamento de alunos.
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.conf import settings
 from django.contrib import messages
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
 from django.urls import reverse_lazy, reverse
@@ -15,6 +16,8 @@ from django.http import JsonResponse
 from .models import Aluno, MedidasCorporais, FotoProgresso, HorarioPadraoAluno, AcompanhamentoMensal
 from .forms import AlunoForm, MedidasCorporaisForm, FotoProgressoForm, AgendamentoPadraoForm, PlanoFinanceiroForm, AcompanhamentoMensalForm
 from frequencia.models import AgendaAula
+from frequencia.ics import gerar_token
+from frequencia.services import FrequenciaService
 from financeiro.models import ContratoAluno, Fatura, PlanoMensalidade
 
 
@@ -117,46 +120,45 @@ class AlunoCreateView(LoginRequiredMixin, CreateView):
     
     def _criar_agendamentos_padrao(self, aluno, dias_semana, horario_inicio):
         """
-        Cria agendamentos automáticos para as próximas 4 semanas.
-        """
-        from datetime import timedelta
+        Grava os horários padrão do aluno e cria as aulas até o horizonte da agenda.
         
+        As semanas seguintes são criadas pelo comando noturno materializar_agenda.
+        """
         # Calcular horário de fim (assumindo 1 hora de duração)
         horario_fim = (datetime.combine(timezone.now().date(), horario_inicio) + timedelta(hours=1)).time()
         
-        # Obter a data de início da próxima semana
-        hoje = timezone.now().date()
-        dias_ate_segunda = (7 - hoje.weekday()) % 7
-        if dias_ate_segunda == 0:
-            dias_ate_segunda = 7
-        inicio_proxima_semana = hoje + timedelta(days=dias_ate_segunda)
-        
-        agendamentos_criados = 0
-        
-        # Criar agendamentos para as próximas 4 semanas
-        for semana in range(4):
-            inicio_semana = inicio_proxima_semana + timedelta(weeks=semana)
-            
-            for dia_semana in dias_semana:
-                dia_semana_int = int(dia_semana)
-                data_agendamento = inicio_semana + timedelta(days=dia_semana_int)
-                
-                # Criar o agendamento
-                AgendaAula.objects.create(
+        HorarioPadraoAluno.objects.bulk_create(
+            [
+                HorarioPadraoAluno(
                     aluno=aluno,
-                    data_aula=data_agendamento,
+                    dia_semana=int(dia_semana),
                     horario_inicio=horario_inicio,
-                    horario_fim=horario_fim,
-                    status='agendado',
-                    tipo_treino='Treino Regular',
-                    observacoes='Agendamento automático criado no cadastro'
+                    horario_fim=horario_fim
                 )
-                agendamentos_criados += 1
+                for dia_semana in dias_semana
+            ],
+            ignore_conflicts=True
+        )
+        
+        semanas = settings.AGENDA_HORIZONTE_SEMANAS
+        conflitos = []
+        agendamentos_criados = FrequenciaService().materializar_agenda(
+            aluno=aluno,
+            semanas=semanas,
+            ao_encontrar_conflito=lambda aula, ocupados: conflitos.append(aula)
+        )
         
         messages.info(
             self.request, 
-            f'{agendamentos_criados} agendamentos criados automaticamente para as próximas 4 semanas.'
+            f'{agendamentos_criados} agendamentos criados automaticamente para as próximas {semanas} semanas.'
         )
+        if conflitos:
+            datas = ', '.join(f'{aula.data_aula:%d/%m}' for aula in conflitos[:5])
+            messages.warning(
+                self.request,
+                f'{len(conflitos)} aula(s) não criada(s) por conflito com outros alunos no mesmo horário ({datas}'
+                f'{"..." if len(conflitos) > 5 else ""}).'
+            )
     
     def _criar_contrato_financeiro(self, aluno, dados_financeiros):
         """
@@ -290,13 +292,15 @@ class AlunoDetailView(LoginRequiredMixin, DetailView):
             data_aula__gte=timezone.now().date(),
             status__in=['agendado', 'confirmado']
         ).order_by('data_aula', 'horario_inicio')[:3]
-        
-        # Faturas pendentes
-        from financeiro.models import Fatura
-        context['faturas_pendentes'] = Fatura.objects.filter(
-            aluno=aluno,
-            status__in=['pendente', 'parcial']
-        ).order_by('data_vencimento')
+        context['url_ics'] = self.request.build_absolute_uri(reverse(
+            'frequencia:calendario_ics', args=[gerar_token('aluno', aluno.pk, aluno.personal_trainer_id)]
+        ))
+        
+        # Faturas pendentes (livro de cobranças: Fatura e FaturaSimples)
+        from financeiro.models import Cobranca
+        context['faturas_pendentes'] = Cobranca.objects.filter(
+            aluno=aluno
+        ).em_aberto().order_by('data_vencimento')
         
         # Acompanhamento mensal (ano atual)
         ano_atual = timezone.now().year
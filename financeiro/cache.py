@@ -0,0 +1,30 @@
+"""
+Cache dos dados financeiros por personal trainer.
+
+Usa o cache versionado de formafit.cache no espaço de nomes 'financeiro':
+qualquer escrita em faturas ou pagamentos troca a versão do personal trainer.
+"""
+from formafit import cache as cache_versionado
+from formafit.cache import TEMPO_CACHE
+
+NAMESPACE = 'financeiro'
+
+
+def versao_financeira(personal_trainer_id):
+    """Versão atual dos dados financeiros do personal trainer."""
+    return cache_versionado.versao(NAMESPACE, personal_trainer_id)
+
+
+def chave_cache(personal_trainer_id, nome, *partes):
+    """Monta a chave de cache de uma consulta do personal trainer na versão atual."""
+    return cache_versionado.chave_cache(NAMESPACE, personal_trainer_id, nome, *partes)
+
+
+def obter_ou_calcular(personal_trainer_id, nome, partes, calcular, timeout=TEMPO_CACHE):
+    """Retorna o valor em cache ou o calcula e guarda."""
+    return cache_versionado.obter_ou_calcular(NAMESPACE, personal_trainer_id, nome, partes, calcular, timeout)
+
+
+def invalidar_cache_financeiro(personal_trainer_id=None):
+    """Invalida o cache financeiro de um personal trainer (ou de todos, sem argumento) após o commit."""
+    cache_versionado.invalidar(NAMESPACE, personal_trainer_id)
@@ -0,0 +1,265 @@
+"""
+Leitura de extratos bancários (CSV ou OFX) e conciliação com as faturas em aberto.
+
+As faturas em aberto do personal trainer são carregadas uma única vez e indexadas
+por valor e, dentro de cada valor, ordenadas pelo vencimento. Cada lançamento do
+extrato consulta apenas esse índice em memória: busca pelo valor, recorte da
+janela de datas por bisect e desempate pelo nome do aluno na descrição.
+"""
+import bisect
+import csv
+import hashlib
+import io
+import re
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from .models import Fatura, FaturaSimples
+
+Lancamento = namedtuple('Lancamento', 'data valor descricao identificador')
+
+Candidato = namedtuple('Candidato', 'tipo id aluno_id aluno valor vencimento nomes')
+
+COLUNAS_CSV = {
+    'data': {'data', 'date', 'data lancamento', 'data do lancamento', 'data movimento'},
+    'valor': {'valor', 'value', 'amount', 'valor (r$)', 'credito', 'credito (r$)'},
+    'descricao': {'descricao', 'historico', 'description', 'memo', 'lancamento', 'detalhes'},
+    'identificador': {'id', 'identificador', 'fitid', 'codigo', 'id transacao', 'id da transacao'},
+}
+
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y')
+
+# Palavras que não identificam o aluno na descrição do lançamento
+PALAVRAS_IGNORADAS = {'de', 'da', 'do', 'das', 'dos', 'e', 'pix', 'ted', 'doc', 'transf', 'transferencia', 'recebido', 'recebida'}
+
+
+class ErroExtrato(ValueError):
+    """Arquivo de extrato que não pôde ser lido."""
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower().strip()
+
+
+def _palavras(texto):
+    return {
+        palavra for palavra in re.findall(r'[a-z]+', _normalizar(texto))
+        if len(palavra) > 1 and palavra not in PALAVRAS_IGNORADAS
+    }
+
+
+def _decimal(valor):
+    """Converte '1.234,56', '1234.56' ou 'R$ 150,00' em Decimal."""
+    valor = re.sub(r'[^\d,.\-]', '', valor or '')
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(valor).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ErroExtrato(f'Valor inválido no extrato: {valor!r}')
+
+
+def _data(valor):
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor.strip(), formato).date()
+        except ValueError:
+            continue
+    raise ErroExtrato(f'Data inválida no extrato: {valor!r}')
+
+
+def _identificador(data, valor, descricao, ocorrencia):
+    """Hash do lançamento; `ocorrencia` diferencia lançamentos idênticos no mesmo extrato."""
+    conteudo = f'{data.isoformat()}|{valor}|{_normalizar(descricao)}|{ocorrencia}'
+    return hashlib.sha1(conteudo.encode()).hexdigest()
+
+
+def _decodificar(conteudo):
+    if isinstance(conteudo, str):
+        return conteudo
+    try:
+        return conteudo.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return conteudo.decode('latin-1')
+
+
+def ler_csv(conteudo):
+    """Lê os créditos de um extrato CSV com cabeçalho (separador ; ou ,)."""
+    texto = _decodificar(conteudo)
+    amostra = texto[:4096]
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        dialeto = csv.excel
+
+    leitor = csv.reader(io.StringIO(texto), dialeto)
+    cabecalho = [_normalizar(coluna) for coluna in next(leitor, [])]
+
+    posicoes = {}
+    for campo, nomes in COLUNAS_CSV.items():
+        for posicao, coluna in enumerate(cabecalho):
+            if coluna in nomes:
+                posicoes[campo] = posicao
+                break
+    if 'data' not in posicoes or 'valor' not in posicoes:
+        raise ErroExtrato('O CSV precisa das colunas de data e valor.')
+
+    registros = []
+    for linha in leitor:
+        if not any(coluna.strip() for coluna in linha):
+            continue
+        if len(linha) <= max(posicoes.values()):
+            raise ErroExtrato(f'Linha {leitor.line_num} do CSV está incompleta.')
+        registros.append((
+            _data(linha[posicoes['data']]),
+            _decimal(linha[posicoes['valor']]),
+            linha[posicoes['descricao']].strip() if 'descricao' in posicoes else '',
+            linha[posicoes['identificador']].strip() if 'identificador' in posicoes else '',
+        ))
+    return _lancamentos(registros)
+
+
+def _tag_ofx(bloco, tag):
+    encontrado = re.search(rf'<{tag}>([^<\r\n]*)', bloco, re.IGNORECASE)
+    return encontrado.group(1).strip() if encontrado else ''
+
+
+def ler_ofx(conteudo):
+    """Lê os créditos de um extrato OFX (SGML ou XML)."""
+    texto = _decodificar(conteudo)
+    if '<OFX>' not in texto.upper():
+        raise ErroExtrato('Arquivo OFX inválido.')
+
+    # No OFX 1.x (SGML) as tags de fechamento são opcionais
+    registros = []
+    for parte in re.split(r'<STMTTRN>', texto, flags=re.IGNORECASE)[1:]:
+        bloco = re.split(r'</STMTTRN>', parte, flags=re.IGNORECASE)[0]
+        data = _tag_ofx(bloco, 'DTPOSTED')[:8]
+        try:
+            data = datetime.strptime(data, '%Y%m%d').date()
+        except ValueError:
+            raise ErroExtrato(f'Data inválida no extrato: {data!r}')
+        descricao = ' '.join(filter(None, [_tag_ofx(bloco, 'NAME'), _tag_ofx(bloco, 'MEMO')]))
+        registros.append((data, _decimal(_tag_ofx(bloco, 'TRNAMT')), descricao, _tag_ofx(bloco, 'FITID')))
+    return _lancamentos(registros)
+
+
+def _lancamentos(registros):
+    """Mantém apenas os créditos e completa o identificador dos lançamentos sem um."""
+    ocorrencias = Counter()
+    lancamentos = []
+    for data, valor, descricao, identificador in registros:
+        if valor <= 0:
+            continue
+        if not identificador:
+            chave = (data, valor, _normalizar(descricao))
+            ocorrencias[chave] += 1
+            identificador = _identificador(data, valor, descricao, ocorrencias[chave])
+        lancamentos.append(Lancamento(data, valor, descricao[:255], identificador[:64]))
+    return lancamentos
+
+
+def ler_extrato(conteudo, formato):
+    """Lê o extrato no formato informado ('csv' ou 'ofx')."""
+    leitores = {'csv': ler_csv, 'ofx': ler_ofx}
+    if formato not in leitores:
+        raise ErroExtrato(f'Formato de extrato não suportado: {formato}')
+    return leitores[formato](conteudo)
+
+
+def referencia(candidato):
+    """Referência do candidato usada nos formulários de revisão ('simples:12', 'fatura:5')."""
+    return f'{candidato.tipo}:{candidato.id}'
+
+
+class Conciliador:
+    """
+    Casa lançamentos do extrato com as faturas em aberto de um personal trainer.
+
+    Uma fatura é usada por no máximo um lançamento. Lançamentos com mais de uma
+    fatura possível, e sem nome de aluno que as diferencie, vão para revisão.
+    """
+    # As faturas simples vencem no último dia do mês e costumam ser pagas ao longo dele
+    DIAS_ANTES_VENCIMENTO = 35
+    DIAS_APOS_VENCIMENTO = 60
+    MAXIMO_CANDIDATOS_REVISAO = 5
+
+    def __init__(self, personal_trainer):
+        self.indice = defaultdict(list)
+        self.usados = set()
+
+        faturas_simples = FaturaSimples.objects.filter(
+            personal_trainer=personal_trainer
+        ).exclude(status='paga').values_list('id', 'aluno_id', 'aluno__nome', 'valor', 'data_vencimento')
+        for fatura_id, aluno_id, aluno, valor, vencimento in faturas_simples.iterator(chunk_size=2000):
+            self._indexar(Candidato('simples', fatura_id, aluno_id, aluno, valor, vencimento, _palavras(aluno)))
+
+        faturas = Fatura.objects.filter(
+            aluno__personal_trainer=personal_trainer,
+            status__in=['pendente', 'atrasada', 'parcial']
+        ).values_list('id', 'aluno_id', 'aluno__nome', 'valor_final', 'valor_pago', 'data_vencimento')
+        for fatura_id, aluno_id, aluno, valor_final, valor_pago, vencimento in faturas.iterator(chunk_size=2000):
+            saldo = valor_final - valor_pago
+            if saldo > 0:
+                self._indexar(Candidato('fatura', fatura_id, aluno_id, aluno, saldo, vencimento, _palavras(aluno)))
+
+        for candidatos in self.indice.values():
+            candidatos.sort(key=lambda candidato: (candidato.vencimento, candidato.tipo, candidato.id))
+        self.vencimentos = {
+            valor: [candidato.vencimento for candidato in candidatos]
+            for valor, candidatos in self.indice.items()
+        }
+
+    def _indexar(self, candidato):
+        self.indice[candidato.valor].append(candidato)
+
+    def candidatos(self, lancamento):
+        """Faturas ainda não usadas com o mesmo valor e vencimento dentro da janela do lançamento."""
+        vencimentos = self.vencimentos.get(lancamento.valor)
+        if not vencimentos:
+            return []
+        inicio = bisect.bisect_left(vencimentos, lancamento.data - timedelta(days=self.DIAS_APOS_VENCIMENTO))
+        fim = bisect.bisect_right(vencimentos, lancamento.data + timedelta(days=self.DIAS_ANTES_VENCIMENTO))
+        return [
+            candidato for candidato in self.indice[lancamento.valor][inicio:fim]
+            if (candidato.tipo, candidato.id) not in self.usados
+        ]
+
+    def conciliar(self, lancamento):
+        """
+        Retorna (status, candidato escolhido, candidatos para revisão).
+
+        Entre as faturas possíveis vencem as do aluno com mais palavras do nome na
+        descrição; se todas forem do mesmo aluno, fica a de vencimento mais antigo.
+        """
+        candidatos = self.candidatos(lancamento)
+        if not candidatos:
+            return 'sem_correspondencia', None, []
+
+        palavras = _palavras(lancamento.descricao)
+        pontuacoes = [len(candidato.nomes & palavras) for candidato in candidatos]
+        melhor = max(pontuacoes)
+        melhores = [candidato for candidato, pontos in zip(candidatos, pontuacoes) if pontos == melhor]
+
+        if len({candidato.aluno_id for candidato in melhores}) == 1:
+            escolhido = melhores[0]
+            self.usados.add((escolhido.tipo, escolhido.id))
+            return 'conciliada', escolhido, []
+
+        return 'revisao', None, melhores[:self.MAXIMO_CANDIDATOS_REVISAO]
+
+    @staticmethod
+    def serializar(candidatos):
+        """Candidatos em formato JSON, para a fila de revisão."""
+        return [
+            {
+                'referencia': referencia(candidato),
+                'aluno': candidato.aluno,
+                'valor': str(candidato.valor),
+                'vencimento': candidato.vencimento.isoformat(),
+            }
+            for candidato in candidatos
+        ]
@@ -0,0 +1,67 @@
+"""
+Respostas JSON condicionais (ETag) para os endpoints AJAX.
+
+A versão de uma resposta sai de uma única agregação barata sobre os registros de
+que ela depende (quantidade e maior data_atualizacao), somada à versão do cache
+do personal trainer (a financeira, por padrão). Se o navegador já tem essa versão a resposta é um
+304 sem corpo; caso contrário o JSON serializado é lido do cache (ou calculado e
+guardado) pela mesma chave.
+
+Não há Last-Modified: exclusões e trocas de versão do cache não avançam a maior
+data_atualizacao, e um cliente que mandasse só If-Modified-Since receberia um 304
+com dados antigos.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .cache import versao_financeira
+
+TEMPO_CACHE_RESPOSTA = 60 * 5
+
+
+def versao_registros(registros):
+    """Quantidade e maior data_atualizacao dos registros, em uma única consulta."""
+    resumo = registros.aggregate(total=Count('pk'), ultima=Max('data_atualizacao'))
+    return resumo['total'], resumo['ultima']
+
+
+def resposta_json_condicional(request, nome, partes, registros, calcular, safe=True, versao_cache=versao_financeira):
+    """
+    Responde com o JSON de calcular() ou com 304 se o cliente já tem a versão atual.
+
+    partes identifica a consulta (mês, ano, pk...) e registros é o queryset cuja
+    alteração invalida a resposta. A quantidade entra na versão para que exclusões,
+    que não mudam a maior data_atualizacao, também gerem uma nova ETag. versao_cache
+    é a versão do cache do app dono dos registros (por padrão, a financeira).
+    """
+    total, ultima = versao_registros(registros)
+    versao = ':'.join(str(parte) for parte in [
+        nome, request.user.pk, versao_cache(request.user.pk), *partes,
+        total, ultima.isoformat() if ultima else '-',
+    ])
+    assinatura = hashlib.md5(versao.encode(), usedforsecurity=False).hexdigest()
+    etag = quote_etag(assinatura)
+
+    resposta = get_conditional_response(request, etag=etag)
+    if resposta is None:
+        chave = f'financeiro:resposta:{nome}:{assinatura}'
+        conteudo = cache.get(chave)
+        if conteudo is None:
+            dados = calcular()
+            if safe and not isinstance(dados, dict):
+                raise TypeError('Apenas dicionários podem ser serializados com safe=True.')
+            conteudo = json.dumps(dados, cls=DjangoJSONEncoder)
+            cache.set(chave, conteudo, TEMPO_CACHE_RESPOSTA)
+        resposta = HttpResponse(conteudo, content_type='application/json')
+
+    resposta['ETag'] = etag
+    # O navegador guarda a resposta, mas revalida a cada requisição
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
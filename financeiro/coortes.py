@@ -0,0 +1,170 @@
+"""
+Análise de coortes de alunos: retenção, MRR, churn e ARPU.
+
+Cada aluno pertence à coorte do mês em que começou (Aluno.data_inicio) e conta
+como pagante em um mês quando tem mensalidade simples paga com aquela referência.
+Os dados são lidos em uma consulta por tabela, só com as colunas necessárias, e
+as matrizes coorte × idade (meses desde o início) saem de groupby/pivot do pandas.
+Os meses são tratados como inteiros (ano * 12 + mês - 1) para simplificar a
+aritmética entre coortes e referências.
+"""
+import numpy as np
+import pandas as pd
+from django.db.models import Q
+
+from alunos.models import Aluno
+
+from .models import FaturaSimples
+
+
+def _dataframe(linhas, colunas):
+    return pd.DataFrame(list(linhas), columns=colunas)
+
+
+def _indice_mes(ano, mes):
+    return ano * 12 + mes - 1
+
+
+def _rotulo(indice):
+    return f'{indice % 12 + 1:02d}/{indice // 12}'
+
+
+def _lista(valores, casas):
+    """Série/linha para lista serializável (NaN vira None)."""
+    return [None if pd.isna(valor) else round(float(valor), casas) for valor in valores]
+
+
+def _carregar(personal_trainer, primeiro_mes):
+    alunos = _dataframe(
+        Aluno.objects.filter(personal_trainer=personal_trainer).values_list('id', 'data_inicio', 'ativo'),
+        ['aluno_id', 'data_inicio', 'ativo']
+    )
+    inicio = pd.to_datetime(alunos['data_inicio'])
+    alunos['coorte'] = _indice_mes(inicio.dt.year, inicio.dt.month)
+
+    ano, mes = primeiro_mes // 12, primeiro_mes % 12 + 1
+    pagamentos = _dataframe(
+        FaturaSimples.objects.filter(
+            Q(ano_referencia__gt=ano) | Q(ano_referencia=ano, mes_referencia__gte=mes),
+            personal_trainer=personal_trainer,
+            status='paga'
+        ).values_list('aluno_id', 'ano_referencia', 'mes_referencia', 'valor'),
+        ['aluno_id', 'ano', 'mes', 'valor']
+    )
+    pagamentos['mes'] = _indice_mes(pagamentos['ano'], pagamentos['mes'])
+    pagamentos['valor'] = pagamentos['valor'].astype(float)
+    # Mais de uma fatura do aluno no mesmo mês conta como um pagante
+    pagamentos = pagamentos.groupby(['aluno_id', 'mes'], as_index=False)['valor'].sum()
+    return alunos, pagamentos
+
+
+def _churn(presenca, niveis):
+    """
+    Fração dos pagantes de um mês que não pagaram o mês seguinte.
+
+    presenca é uma matriz 0/1 (uma linha por aluno, uma coluna por mês);
+    niveis agrupa as linhas (coorte) ou None para o total por mês.
+    """
+    anterior = presenca.shift(1, axis=1)
+    perdidos = (anterior.eq(1) & presenca.eq(0))
+    base = anterior.eq(1)
+    if niveis is not None:
+        perdidos = perdidos.groupby(level=niveis).sum()
+        base = base.groupby(level=niveis).sum()
+    else:
+        perdidos = perdidos.sum()
+        base = base.sum()
+    return perdidos / base.replace(0, np.nan)
+
+
+def calcular_coortes(personal_trainer, hoje, meses=12):
+    """
+    Matrizes de coorte dos últimos `meses` meses e a série mensal consolidada.
+
+    As células de meses que ainda não chegaram ficam como None. O mês atual entra
+    parcial (só o que já foi pago).
+    """
+    atual = _indice_mes(hoje.year, hoje.month)
+    primeiro = atual - meses + 1
+    idades = list(range(meses))
+    indices = list(range(primeiro, atual + 1))
+
+    # Um mês a mais de pagamentos para o churn do primeiro mês da série
+    alunos, pagamentos = _carregar(personal_trainer, primeiro - 1)
+    pagamentos = pagamentos[pagamentos['mes'] <= atual]
+
+    # Série mensal (todos os alunos)
+    presenca_mensal = (
+        pagamentos.assign(pagou=1)
+        .pivot_table(index='aluno_id', columns='mes', values='pagou', aggfunc='max', fill_value=0)
+        .reindex(columns=[primeiro - 1, *indices], fill_value=0)
+    )
+    mrr_mensal = pagamentos.groupby('mes')['valor'].sum().reindex(indices, fill_value=0.0)
+    pagantes_mensal = pagamentos.groupby('mes')['aluno_id'].nunique().reindex(indices, fill_value=0)
+    churn_mensal = _churn(presenca_mensal, None).reindex(indices)
+
+    # Coortes
+    alunos = alunos[alunos['coorte'].between(primeiro, atual)]
+    tamanho = alunos.groupby('coorte').size().reindex(indices, fill_value=0)
+    ativos = alunos.groupby('coorte')['ativo'].sum().reindex(indices, fill_value=0)
+
+    coorte = pagamentos.merge(alunos[['aluno_id', 'coorte']], on='aluno_id')
+    coorte['idade'] = coorte['mes'] - coorte['coorte']
+    coorte = coorte[coorte['idade'] >= 0]
+
+    pagantes = (
+        coorte.groupby(['coorte', 'idade'])['aluno_id'].nunique()
+        .unstack(fill_value=0).reindex(index=indices, columns=idades, fill_value=0)
+    )
+    mrr = (
+        coorte.pivot_table(index='coorte', columns='idade', values='valor', aggfunc='sum', fill_value=0.0)
+        .reindex(index=indices, columns=idades, fill_value=0.0)
+    )
+    presenca = (
+        coorte.assign(pagou=1)
+        .pivot_table(index=['coorte', 'aluno_id'], columns='idade', values='pagou', aggfunc='max', fill_value=0)
+        .reindex(columns=idades, fill_value=0)
+    )
+
+    retencao = pagantes.div(tamanho.replace(0, np.nan), axis=0) * 100
+    arpu = mrr / pagantes.replace(0, np.nan)
+    churn = (_churn(presenca, 'coorte') * 100).reindex(index=indices, columns=idades)
+
+    # Células no futuro (coorte + idade além do mês atual)
+    futuro = np.add.outer(np.array(indices), np.array(idades)) > atual
+    retencao, mrr, arpu, churn = (
+        matriz.mask(futuro) for matriz in (retencao, mrr.astype(float), arpu, churn)
+    )
+
+    return {
+        'meses': meses,
+        'idades': idades,
+        'coortes': [
+            {
+                'coorte': _rotulo(indice),
+                'alunos': int(tamanho[indice]),
+                'ativos': int(ativos[indice]),
+                'retencao': _lista(retencao.loc[indice], 1),
+                'mrr': _lista(mrr.loc[indice], 2),
+                'churn': _lista(churn.loc[indice], 1),
+                'arpu': _lista(arpu.loc[indice], 2),
+            }
+            for indice in reversed(indices)
+        ],
+        'mensal': [
+            {
+                'mes': _rotulo(indice),
+                'mrr': mrr_mes,
+                'pagantes': int(pagantes_mes),
+                'churn': churn_mes,
+                'arpu': arpu_mes,
+            }
+            for indice, mrr_mes, pagantes_mes, churn_mes, arpu_mes in zip(
+                indices,
+                _lista(mrr_mensal, 2),
+                pagantes_mensal,
+                _lista(churn_mensal * 100, 1),
+                _lista(mrr_mensal / pagantes_mensal.replace(0, np.nan), 2),
+            )
+        ],
+    }
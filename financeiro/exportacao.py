@@ -0,0 +1,231 @@
+"""
+Exportação de faturas, pagamentos, alunos e presenças em CSV e XLSX.
+
+As linhas são lidas com values_list().iterator(), sem instanciar modelos nem
+carregar o resultado inteiro: o CSV é enviado linha a linha e o XLSX usa o modo
+write-only do openpyxl, que grava as linhas em arquivo temporário. O consumo de
+memória não depende da quantidade de linhas exportadas.
+"""
+import csv
+import tempfile
+from datetime import date, datetime
+
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+from alunos.models import Aluno
+from frequencia.models import RegistroPresenca
+from .models import Fatura, FaturaSimples, Pagamento
+
+TAMANHO_LOTE_EXPORTACAO = 2000
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _data(valor):
+    """Converte 'AAAA-MM-DD' em date; valores inválidos são ignorados."""
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+    except ValueError:
+        return None
+
+
+def _faturas_simples(personal_trainer, filtros):
+    faturas = FaturaSimples.objects.filter(personal_trainer=personal_trainer)
+    if filtros.get('apenas_ativos'):
+        faturas = faturas.filter(aluno__ativo=True)
+    return faturas.com_status_atual().filtrar(
+        status=filtros.get('status'),
+        aluno=filtros.get('aluno'),
+        mes=filtros.get('mes'),
+        ano=filtros.get('ano')
+    ).order_by('-ano_referencia', '-mes_referencia', 'aluno__nome')
+
+
+def _faturas(personal_trainer, filtros):
+    faturas = Fatura.objects.filter(aluno__personal_trainer=personal_trainer).com_status_atual()
+    if filtros.get('status'):
+        faturas = faturas.filter(status_atual=filtros['status'])
+    if filtros.get('aluno'):
+        faturas = faturas.filter(aluno=filtros['aluno'])
+    if filtros.get('mes'):
+        faturas = faturas.filter(mes_referencia=filtros['mes'])
+    if filtros.get('ano'):
+        faturas = faturas.filter(ano_referencia=filtros['ano'])
+    return faturas.order_by('-ano_referencia', '-mes_referencia', 'aluno__nome')
+
+
+def _pagamentos(personal_trainer, filtros):
+    pagamentos = Pagamento.objects.filter(fatura__aluno__personal_trainer=personal_trainer)
+    if filtros.get('aluno'):
+        pagamentos = pagamentos.filter(fatura__aluno=filtros['aluno'])
+    if _data(filtros.get('data_inicio')):
+        pagamentos = pagamentos.filter(data_pagamento__gte=_data(filtros['data_inicio']))
+    if _data(filtros.get('data_fim')):
+        pagamentos = pagamentos.filter(data_pagamento__lte=_data(filtros['data_fim']))
+    return pagamentos.order_by('-data_pagamento', '-id')
+
+
+def _alunos(personal_trainer, filtros):
+    alunos = Aluno.objects.filter(personal_trainer=personal_trainer)
+    if filtros.get('apenas_ativos'):
+        alunos = alunos.filter(ativo=True)
+    return alunos.order_by('nome')
+
+
+def _presencas(personal_trainer, filtros):
+    presencas = RegistroPresenca.objects.filter(aluno__personal_trainer=personal_trainer)
+    if filtros.get('aluno'):
+        presencas = presencas.filter(aluno=filtros['aluno'])
+    if filtros.get('status'):
+        presencas = presencas.filter(status=filtros['status'])
+    if _data(filtros.get('data_inicio')):
+        presencas = presencas.filter(data_aula__gte=_data(filtros['data_inicio']))
+    if _data(filtros.get('data_fim')):
+        presencas = presencas.filter(data_aula__lte=_data(filtros['data_fim']))
+    return presencas.order_by('-data_aula', 'horario_inicio')
+
+
+# Cada exportação: título da planilha, consulta e colunas (cabeçalho, campo)
+EXPORTACOES = {
+    'faturas-simples': {
+        'titulo': 'Faturas',
+        'consulta': _faturas_simples,
+        'colunas': [
+            ('ID', 'id'),
+            ('Aluno', 'aluno__nome'),
+            ('Mês', 'mes_referencia'),
+            ('Ano', 'ano_referencia'),
+            ('Valor', 'valor'),
+            ('Vencimento', 'data_vencimento'),
+            ('Status', 'status_atual'),
+            ('Data do Pagamento', 'data_pagamento'),
+            ('Observações', 'observacoes'),
+        ],
+    },
+    'faturas': {
+        'titulo': 'Faturas',
+        'consulta': _faturas,
+        'colunas': [
+            ('ID', 'id'),
+            ('Aluno', 'aluno__nome'),
+            ('Mês', 'mes_referencia'),
+            ('Ano', 'ano_referencia'),
+            ('Valor Original', 'valor_original'),
+            ('Desconto', 'desconto'),
+            ('Acréscimo', 'acrescimo'),
+            ('Valor Final', 'valor_final'),
+            ('Valor Pago', 'valor_pago'),
+            ('Vencimento', 'data_vencimento'),
+            ('Status', 'status_atual'),
+        ],
+    },
+    'pagamentos': {
+        'titulo': 'Pagamentos',
+        'consulta': _pagamentos,
+        'colunas': [
+            ('ID', 'id'),
+            ('Fatura', 'fatura_id'),
+            ('Aluno', 'fatura__aluno__nome'),
+            ('Mês de Referência', 'fatura__mes_referencia'),
+            ('Ano de Referência', 'fatura__ano_referencia'),
+            ('Data do Pagamento', 'data_pagamento'),
+            ('Valor Pago', 'valor_pago'),
+            ('Forma de Pagamento', 'forma_pagamento'),
+            ('Observações', 'observacoes'),
+        ],
+    },
+    'alunos': {
+        'titulo': 'Alunos',
+        'consulta': _alunos,
+        'colunas': [
+            ('ID', 'id'),
+            ('Nome', 'nome'),
+            ('E-mail', 'email'),
+            ('Telefone', 'telefone'),
+            ('Data de Nascimento', 'data_nascimento'),
+            ('Sexo', 'sexo'),
+            ('Peso Inicial', 'peso_inicial'),
+            ('Altura', 'altura'),
+            ('Ativo', 'ativo'),
+            ('Data de Início', 'data_inicio'),
+        ],
+    },
+    'presencas': {
+        'titulo': 'Presenças',
+        'consulta': _presencas,
+        'colunas': [
+            ('ID', 'id'),
+            ('Aluno', 'aluno__nome'),
+            ('Data da Aula', 'data_aula'),
+            ('Início', 'horario_inicio'),
+            ('Fim', 'horario_fim'),
+            ('Status', 'status'),
+            ('Observações', 'observacoes'),
+        ],
+    },
+}
+
+
+def linhas_exportacao(tipo, personal_trainer, filtros):
+    """Retorna (título, cabeçalho, iterador de linhas) da exportação."""
+    exportacao = EXPORTACOES[tipo]
+    cabecalho = [titulo for titulo, _ in exportacao['colunas']]
+    campos = [campo for _, campo in exportacao['colunas']]
+
+    linhas = exportacao['consulta'](personal_trainer, filtros).values_list(*campos).iterator(
+        chunk_size=TAMANHO_LOTE_EXPORTACAO
+    )
+    return exportacao['titulo'], cabecalho, linhas
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de gravá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_csv(valor):
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return '' if valor is None else valor
+
+
+def gerar_csv(cabecalho, linhas):
+    """Gera o CSV linha a linha (com BOM, para o Excel reconhecer o UTF-8)."""
+    escritor = csv.writer(_Eco())
+    yield '﻿' + escritor.writerow(cabecalho)
+    for linha in linhas:
+        yield escritor.writerow([_valor_csv(valor) for valor in linha])
+
+
+def gravar_xlsx(destino, titulo, cabecalho, linhas):
+    """Grava a planilha em destino (caminho ou arquivo) no modo write-only do openpyxl."""
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(title=titulo)
+    aba.append(cabecalho)
+    for linha in linhas:
+        aba.append(list(linha))
+    planilha.save(destino)
+
+
+def resposta_csv(nome_arquivo, cabecalho, linhas):
+    resposta = StreamingHttpResponse(gerar_csv(cabecalho, linhas), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.csv"'
+    return resposta
+
+
+def resposta_xlsx(nome_arquivo, titulo, cabecalho, linhas):
+    # O arquivo temporário é apagado quando a resposta fecha o arquivo
+    arquivo = tempfile.TemporaryFile()
+    gravar_xlsx(arquivo, titulo, cabecalho, linhas)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=f'{nome_arquivo}.xlsx',
+        content_type=CONTENT_TYPE_XLSX
+    )
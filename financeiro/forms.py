@@ -545,3 +545,41 @@ class GerarFaturasAutomaticasForm(forms.Form):
         now = timezone.now()
         self.fields['mes_referencia'].initial = now.month
         self.fields['ano_referencia'].initial = now.year
+
+
+class ImportarExtratoForm(forms.Form):
+    """Formulário para importar extratos bancários ou de PIX."""
+    
+    TAMANHO_MAXIMO = 10 * 1024 * 1024
+    
+    arquivo = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.ofx'
+        }),
+        label='Arquivo do Extrato',
+        help_text='CSV com colunas de data, valor e descrição, ou OFX exportado pelo banco'
+    )
+    
+    forma_pagamento = forms.ChoiceField(
+        choices=Pagamento.FORMA_PAGAMENTO_CHOICES,
+        initial='pix',
+        widget=forms.Select(attrs={
+            'class': 'form-control'
+        }),
+        label='Forma de Pagamento',
+        help_text='Registrada nos pagamentos das faturas conciliadas'
+    )
+    
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        extensao = arquivo.name.rsplit('.', 1)[-1].lower()
+        if extensao not in ('csv', 'ofx'):
+            raise forms.ValidationError('Envie um arquivo .csv ou .ofx.')
+        if arquivo.size > self.TAMANHO_MAXIMO:
+            raise forms.ValidationError('O arquivo deve ter no máximo 10 MB.')
+        return arquivo
+    
+    @property
+    def formato(self):
+        return self.cleaned_data['arquivo'].name.rsplit('.', 1)[-1].lower()
@@ -0,0 +1,48 @@
+"""
+Management command para apurar multa e juros das faturas vencidas.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Apura multa e juros das faturas vencidas e não pagas; pensado para rodar uma vez por dia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Dia de referência (DD/MM/AAAA, padrão: hoje)')
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+        parser.add_argument(
+            '--estornar',
+            action='store_true',
+            help='Estorna a apuração do dia informado em vez de apurar'
+        )
+
+    def handle(self, *args, **options):
+        data = None
+        if options['data']:
+            try:
+                data = datetime.strptime(options['data'], '%d/%m/%Y').date()
+            except ValueError:
+                raise CommandError(f"Data inválida: {options['data']}. Use o formato DD/MM/AAAA.")
+
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        service = FinanceiroService()
+        if options['estornar']:
+            if data is None:
+                raise CommandError('Informe com --data o dia da apuração a estornar.')
+            estornadas = service.estornar_encargos(data, personal_trainer)
+            self.stdout.write(self.style.SUCCESS(f'Encargos estornados em {estornadas} fatura(s).'))
+            return
+
+        alteradas = service.aplicar_encargos_atraso(data, personal_trainer)
+        self.stdout.write(self.style.SUCCESS(f'Encargos atualizados em {alteradas} fatura(s).'))
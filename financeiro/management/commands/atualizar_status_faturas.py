@@ -0,0 +1,27 @@
+"""
+Management command para atualizar o status das faturas vencidas.
+"""
+from django.core.management.base import BaseCommand
+
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Marca como atrasadas as faturas vencidas (Fatura e FaturaSimples); pensado para rodar agendado'
+
+    def handle(self, *args, **options):
+        resultado = FinanceiroService().atualizar_status_faturas()
+
+        descricoes = {
+            'faturas_atrasadas': 'Faturas marcadas como atrasadas',
+            'faturas_reabertas': 'Faturas reabertas como pendentes',
+            'faturas_simples_atrasadas': 'Faturas simples marcadas como atrasadas',
+            'faturas_simples_reabertas': 'Faturas simples reabertas como pendentes',
+        }
+
+        for chave, descricao in descricoes.items():
+            self.stdout.write(f'{descricao}: {resultado[chave]}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'\n{sum(resultado.values())} fatura(s) atualizada(s).')
+        )
@@ -0,0 +1,56 @@
+"""
+Management command para exportar faturas, pagamentos, alunos ou presenças em CSV ou XLSX.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from financeiro.exportacao import EXPORTACOES, gerar_csv, gravar_xlsx, linhas_exportacao
+
+
+class Command(BaseCommand):
+    help = 'Exporta os dados de um personal trainer em CSV ou XLSX, linha a linha'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(EXPORTACOES), help='Dados a exportar')
+        parser.add_argument('--personal-trainer', required=True, help='E-mail do personal trainer')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv', help='Formato do arquivo (padrão: csv)')
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: saída padrão, apenas para CSV)')
+        parser.add_argument('--status', help='Filtrar pelo status')
+        parser.add_argument('--aluno', type=int, help='Filtrar pelo id do aluno')
+        parser.add_argument('--mes', type=int, help='Filtrar pelo mês de referência')
+        parser.add_argument('--ano', type=int, help='Filtrar pelo ano de referência')
+        parser.add_argument('--data-inicio', help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--data-fim', help='Data final (AAAA-MM-DD)')
+        parser.add_argument('--apenas-ativos', action='store_true', help='Apenas alunos ativos')
+
+    def handle(self, *args, **options):
+        if options['formato'] == 'xlsx' and not options['saida']:
+            raise CommandError('Informe --saida para exportar em XLSX.')
+
+        try:
+            personal_trainer = User.objects.get(email=options['personal_trainer'])
+        except User.DoesNotExist:
+            raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        filtros = {
+            'status': options['status'],
+            'aluno': options['aluno'],
+            'mes': options['mes'],
+            'ano': options['ano'],
+            'data_inicio': options['data_inicio'],
+            'data_fim': options['data_fim'],
+            'apenas_ativos': options['apenas_ativos'],
+        }
+        titulo, cabecalho, linhas = linhas_exportacao(options['tipo'], personal_trainer, filtros)
+
+        if options['formato'] == 'xlsx':
+            gravar_xlsx(options['saida'], titulo, cabecalho, linhas)
+        elif options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+                arquivo.writelines(gerar_csv(cabecalho, linhas))
+        else:
+            for linha in gerar_csv(cabecalho, linhas):
+                self.stdout.write(linha, ending='')
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Exportação gravada em {options['saida']}."))
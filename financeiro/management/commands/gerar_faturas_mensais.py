@@ -0,0 +1,66 @@
+"""
+Management command para gerar as faturas mensais dos contratos ativos.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import User
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Gera as faturas do mês para os contratos ativos de todos os personal trainers'
+
+    def add_arguments(self, parser):
+        hoje = timezone.now().date()
+        parser.add_argument('--mes', type=int, default=hoje.month, help='Mês de referência (padrão: mês atual)')
+        parser.add_argument('--ano', type=int, default=hoje.year, help='Ano de referência (padrão: ano atual)')
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+        parser.add_argument(
+            '--tamanho-lote',
+            type=int,
+            default=FinanceiroService.TAMANHO_LOTE_FATURAMENTO,
+            help='Quantidade de faturas inseridas por transação'
+        )
+
+    def handle(self, *args, **options):
+        mes = options['mes']
+        ano = options['ano']
+
+        if mes < 1 or mes > 12:
+            raise CommandError('Mês inválido. Use um valor entre 1 e 12.')
+
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        service = FinanceiroService()
+        resumo = service.gerar_faturas_mensais(
+            mes,
+            ano,
+            personal_trainer=personal_trainer,
+            tamanho_lote=options['tamanho_lote']
+        )
+
+        trainers = User.objects.in_bulk(list(resumo.keys()))
+        total_criadas = 0
+
+        for trainer_id, dados in sorted(resumo.items()):
+            trainer = trainers.get(trainer_id)
+            nome = (trainer.nome_completo or trainer.email) if trainer else f'#{trainer_id}'
+            total_criadas += dados['faturas_criadas']
+            self.stdout.write(
+                f"{nome}: {dados['faturas_criadas']} criada(s), "
+                f"{dados['faturas_existentes']} já existente(s), "
+                f"R$ {dados['valor_total']:.2f}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n{total_criadas} fatura(s) gerada(s) para {mes:02d}/{ano} '
+                f'({len(resumo)} personal trainer(s)).'
+            )
+        )
@@ -0,0 +1,125 @@
+"""
+Management command para gerar as faturas simples do mês de todos os personal trainers.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import User
+from financeiro.models import CheckpointFaturamento
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Gera as faturas simples do mês para todos os personal trainers, com checkpoint e execução paralela'
+
+    def add_arguments(self, parser):
+        hoje = timezone.now().date()
+        parser.add_argument('--mes', type=int, default=hoje.month, help='Mês de referência (padrão: mês atual)')
+        parser.add_argument('--ano', type=int, default=hoje.year, help='Ano de referência (padrão: ano atual)')
+        parser.add_argument(
+            '--valor',
+            type=Decimal,
+            help='Valor usado para alunos sem contrato ativo (sem ele, esses alunos são ignorados)'
+        )
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Quantidade de personal trainers processados em paralelo (mais de 1 só com PostgreSQL)'
+        )
+        parser.add_argument(
+            '--tamanho-lote',
+            type=int,
+            default=FinanceiroService.TAMANHO_LOTE_FATURAMENTO,
+            help='Quantidade de alunos gravados por transação'
+        )
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Descarta os checkpoints do período e processa tudo novamente'
+        )
+
+    def handle(self, *args, **options):
+        mes = options['mes']
+        ano = options['ano']
+
+        if mes < 1 or mes > 12:
+            raise CommandError('Mês inválido. Use um valor entre 1 e 12.')
+        if options['workers'] < 1:
+            raise CommandError('Informe ao menos 1 worker.')
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            # O SQLite aceita um escritor por vez: threads gravando juntas dão "database is locked"
+            raise CommandError('Execução paralela (--workers maior que 1) exige PostgreSQL; com SQLite use 1 worker.')
+
+        trainers = User.objects.filter(alunos__ativo=True).distinct().order_by('id')
+        if options['personal_trainer']:
+            trainers = trainers.filter(email=options['personal_trainer'])
+        trainers = list(trainers)
+
+        if not trainers:
+            self.stdout.write(self.style.WARNING('Nenhum personal trainer com alunos ativos.'))
+            return
+
+        if options['reiniciar']:
+            CheckpointFaturamento.objects.filter(
+                personal_trainer__in=trainers,
+                mes_referencia=mes,
+                ano_referencia=ano
+            ).delete()
+
+        inicio = time.perf_counter()
+        total_criadas = 0
+        falhas = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futuros = {
+                executor.submit(self._faturar_trainer, trainer, mes, ano, options): trainer
+                for trainer in trainers
+            }
+
+            for futuro in as_completed(futuros):
+                trainer = futuros[futuro]
+                try:
+                    criadas = futuro.result()
+                except Exception as e:
+                    falhas += 1
+                    self.stderr.write(self.style.ERROR(f'✗ {trainer.email}: {e}'))
+                    continue
+
+                total_criadas += criadas
+                self.stdout.write(f'✓ {trainer.email}: {criadas} fatura(s) criada(s)')
+
+        duracao = time.perf_counter() - inicio
+        faturas_por_segundo = total_criadas / duracao if duracao > 0 else 0
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n{total_criadas} fatura(s) criada(s) para {mes:02d}/{ano} em {duracao:.2f}s '
+                f'({faturas_por_segundo:.1f} faturas/s).'
+            )
+        )
+
+        if falhas:
+            raise CommandError(
+                f'{falhas} personal trainer(s) com erro. Execute novamente para continuar do último checkpoint.'
+            )
+
+    def _faturar_trainer(self, trainer, mes, ano, options):
+        """Processa um personal trainer em uma thread do pool."""
+        try:
+            return FinanceiroService().gerar_faturas_simples_em_lotes(
+                mes,
+                ano,
+                trainer,
+                valor_padrao=options['valor'],
+                tamanho_lote=options['tamanho_lote']
+            )
+        finally:
+            # Cada thread abre sua própria conexão com o banco
+            connection.close()
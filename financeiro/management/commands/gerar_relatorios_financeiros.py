@@ -0,0 +1,53 @@
+"""
+Management command para gerar (ou reconstruir) os relatórios financeiros mensais.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import User
+from financeiro.services import FinanceiroService
+
+
+def _mes_ano(valor):
+    try:
+        data = datetime.strptime(valor, '%m/%Y')
+    except ValueError:
+        raise CommandError(f'Mês inválido: {valor}. Use o formato MM/AAAA.')
+    return data.year, data.month
+
+
+class Command(BaseCommand):
+    help = 'Gera os relatórios financeiros de um intervalo de meses em uma única passada agrupada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', required=True, help='Primeiro mês (MM/AAAA)')
+        parser.add_argument('--fim', help='Último mês (MM/AAAA, padrão: mês atual)')
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+
+    def handle(self, *args, **options):
+        inicio = _mes_ano(options['inicio'])
+        if options['fim']:
+            fim = _mes_ano(options['fim'])
+        else:
+            hoje = timezone.now().date()
+            fim = (hoje.year, hoje.month)
+
+        if inicio > fim:
+            raise CommandError('O mês inicial deve ser anterior ao final.')
+
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        gerados = FinanceiroService().gerar_relatorios_financeiros(inicio, fim, personal_trainer)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{gerados} relatório(s) gerado(s) de {inicio[1]:02d}/{inicio[0]} a {fim[1]:02d}/{fim[0]}.'
+            )
+        )
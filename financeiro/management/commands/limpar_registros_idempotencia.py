@@ -0,0 +1,25 @@
+"""
+Management command para excluir os registros de idempotência antigos.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Exclui os registros de idempotência dos pagamentos mais antigos que o prazo de retenção; pensado para rodar uma vez por dia'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            help='Prazo de retenção em dias (padrão: IDEMPOTENCIA_DIAS_RETENCAO)'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 1:
+            raise CommandError('--dias deve ser pelo menos 1.')
+
+        excluidos = FinanceiroService().limpar_registros_idempotencia(options['dias'])
+
+        self.stdout.write(self.style.SUCCESS(f'{excluidos} registro(s) de idempotência excluído(s).'))
@@ -0,0 +1,26 @@
+"""
+Management command para reconstruir o total pago das faturas.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula valor_pago e status das faturas a partir dos pagamentos registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+
+    def handle(self, *args, **options):
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        atualizadas = FinanceiroService().reconciliar_valor_pago(personal_trainer)
+
+        self.stdout.write(self.style.SUCCESS(f'{atualizadas} fatura(s) reconciliada(s).'))
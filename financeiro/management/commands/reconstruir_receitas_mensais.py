@@ -0,0 +1,26 @@
+"""
+Management command para reconstruir a receita mensal consolidada.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói a tabela de receita mensal (gráficos de receita) a partir das faturas e pagamentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+
+    def handle(self, *args, **options):
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        linhas = FinanceiroService().reconstruir_receitas_mensais(personal_trainer)
+
+        self.stdout.write(self.style.SUCCESS(f'{linhas} mês(es) de receita reconstruído(s).'))
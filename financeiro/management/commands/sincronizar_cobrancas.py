@@ -0,0 +1,38 @@
+"""
+Management command para copiar Fatura e FaturaSimples para o livro de cobranças.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from financeiro.services import FinanceiroService
+
+
+class Command(BaseCommand):
+    help = 'Copia as faturas existentes para o livro de cobranças em lotes (pode rodar com o sistema no ar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+        parser.add_argument('--tamanho-lote', type=int, default=1000, help='Faturas por transação (padrão: 1000)')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] < 1:
+            raise CommandError('O tamanho do lote deve ser maior que zero.')
+
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        def progresso(origem, gravadas):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{gravadas} cobrança(s) gravada(s) ({origem})...')
+
+        gravadas = FinanceiroService().sincronizar_cobrancas(
+            personal_trainer,
+            tamanho_lote=options['tamanho_lote'],
+            ao_gravar_lote=progresso
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'{gravadas} cobrança(s) sincronizada(s).'))
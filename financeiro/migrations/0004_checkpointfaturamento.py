@@ -0,0 +1,35 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0003_alter_faturasimples_ano_referencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointFaturamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes_referencia', models.IntegerField(choices=[(1, '01'), (2, '02'), (3, '03'), (4, '04'), (5, '05'), (6, '06'), (7, '07'), (8, '08'), (9, '09'), (10, '10'), (11, '11'), (12, '12')])),
+                ('ano_referencia', models.IntegerField()),
+                ('ultimo_aluno_id', models.BigIntegerField(default=0, help_text='Último aluno processado; a próxima execução continua a partir dele')),
+                ('faturas_criadas', models.IntegerField(default=0)),
+                ('concluido', models.BooleanField(default=False)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('personal_trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints_faturamento', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Faturamento',
+                'verbose_name_plural': 'Checkpoints de Faturamento',
+                'unique_together': {('personal_trainer', 'mes_referencia', 'ano_referencia')},
+            },
+        ),
+    ]
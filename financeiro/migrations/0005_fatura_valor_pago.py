@@ -0,0 +1,40 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:34
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def preencher_valor_pago(apps, schema_editor):
+    """Preenche o total pago das faturas existentes com a soma dos pagamentos."""
+    Fatura = apps.get_model('financeiro', 'Fatura')
+    Pagamento = apps.get_model('financeiro', 'Pagamento')
+
+    total_pagamentos = Pagamento.objects.filter(
+        fatura=models.OuterRef('pk')
+    ).values('fatura').annotate(
+        total=models.Sum('valor_pago')
+    ).values('total')
+
+    Fatura.objects.update(
+        valor_pago=Coalesce(
+            models.Subquery(total_pagamentos, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+            models.Value(Decimal('0.00'))
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0004_checkpointfaturamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='valor_pago',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Total pago, mantido pelos pagamentos registrados', max_digits=10),
+        ),
+        migrations.RunPython(preencher_valor_pago, migrations.RunPython.noop),
+    ]
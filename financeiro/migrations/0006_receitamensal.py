@@ -0,0 +1,39 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:38
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0005_fatura_valor_pago'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceitaMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.IntegerField()),
+                ('mes', models.IntegerField(choices=[(1, '01'), (2, '02'), (3, '03'), (4, '04'), (5, '05'), (6, '06'), (7, '07'), (8, '08'), (9, '09'), (10, '10'), (11, '11'), (12, '12')])),
+                ('total_faturado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total_pago', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total_pendente', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total_atrasado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('quantidade_faturas', models.IntegerField(default=0)),
+                ('total_recebido', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Pagamentos registrados no mês', max_digits=12)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('personal_trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receitas_mensais', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Receita Mensal',
+                'verbose_name_plural': 'Receitas Mensais',
+                'ordering': ['-ano', '-mes'],
+                'unique_together': {('personal_trainer', 'ano', 'mes')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0006_receitamensal'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='relatoriofinanceiro',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='relatoriofinanceiro',
+            name='personal_trainer',
+            field=models.ForeignKey(blank=True, help_text='Vazio apenas em relatórios antigos, gerados para todos os personal trainers', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='relatorios_financeiros', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatoriofinanceiro',
+            unique_together={('personal_trainer', 'mes', 'ano')},
+        ),
+    ]
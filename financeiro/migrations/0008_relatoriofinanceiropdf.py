@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0007_relatorio_financeiro_por_personal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioFinanceiroPDF',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('periodo_inicio', models.DateField()),
+                ('periodo_fim', models.DateField()),
+                ('status', models.CharField(choices=[('pendente', 'Na fila'), ('gerando', 'Gerando'), ('concluido', 'Concluído'), ('erro', 'Erro na Geração')], default='pendente', max_length=15)),
+                ('chave_conteudo', models.CharField(blank=True, help_text='Hash dos dados usados no PDF', max_length=64)),
+                ('arquivo_pdf', models.FileField(blank=True, null=True, upload_to='relatorios_financeiros/')),
+                ('erro', models.TextField(blank=True)),
+                ('data_solicitacao', models.DateTimeField(auto_now_add=True)),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('personal_trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relatorios_financeiros_pdf', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Relatório Financeiro em PDF',
+                'verbose_name_plural': 'Relatórios Financeiros em PDF',
+                'ordering': ['-data_solicitacao'],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0008_relatoriofinanceiropdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtratoBancario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome_arquivo', models.CharField(max_length=255)),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('ofx', 'OFX')], max_length=5)),
+                ('total_linhas', models.IntegerField(default=0)),
+                ('linhas_conciliadas', models.IntegerField(default=0)),
+                ('linhas_em_revisao', models.IntegerField(default=0)),
+                ('linhas_sem_correspondencia', models.IntegerField(default=0)),
+                ('linhas_duplicadas', models.IntegerField(default=0, help_text='Lançamentos ignorados por já constarem em extratos anteriores')),
+                ('data_importacao', models.DateTimeField(auto_now_add=True)),
+                ('personal_trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extratos_bancarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Extrato Bancário',
+                'verbose_name_plural': 'Extratos Bancários',
+                'ordering': ['-data_importacao'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LinhaExtrato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('descricao', models.CharField(blank=True, max_length=255)),
+                ('identificador', models.CharField(help_text='FITID do OFX ou hash do lançamento; evita importar o mesmo lançamento duas vezes', max_length=64)),
+                ('status', models.CharField(choices=[('conciliada', 'Conciliada'), ('revisao', 'Em Revisão'), ('sem_correspondencia', 'Sem Correspondência'), ('ignorada', 'Ignorada')], max_length=20)),
+                ('candidatos', models.JSONField(blank=True, default=list)),
+                ('extrato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='linhas', to='financeiro.extratobancario')),
+                ('fatura_simples', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='linhas_extrato', to='financeiro.faturasimples')),
+                ('pagamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='linhas_extrato', to='financeiro.pagamento')),
+                ('personal_trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='linhas_extrato', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Linha de Extrato',
+                'verbose_name_plural': 'Linhas de Extrato',
+                'ordering': ['data', 'id'],
+                'indexes': [models.Index(fields=['personal_trainer', 'status'], name='financeiro__persona_dce1a7_idx')],
+                'unique_together': {('personal_trainer', 'identificador')},
+            },
+        ),
+    ]
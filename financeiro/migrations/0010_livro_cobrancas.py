@@ -0,0 +1,47 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:58
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alunos', '0004_acompanhamentomensal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0009_extratos_bancarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cobranca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origem', models.CharField(choices=[('fatura', 'Fatura com contrato'), ('simples', 'Fatura simples')], max_length=10)),
+                ('mes_referencia', models.IntegerField(choices=[(1, '01'), (2, '02'), (3, '03'), (4, '04'), (5, '05'), (6, '06'), (7, '07'), (8, '08'), (9, '09'), (10, '10'), (11, '11'), (12, '12')])),
+                ('ano_referencia', models.IntegerField()),
+                ('valor', models.DecimalField(decimal_places=2, help_text='Valor final da cobrança', max_digits=10)),
+                ('valor_pago', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('data_vencimento', models.DateField()),
+                ('data_pagamento', models.DateField(blank=True, help_text='Data do último pagamento', null=True)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('atrasada', 'Atrasada'), ('parcial', 'Paga Parcialmente'), ('paga', 'Paga'), ('cancelada', 'Cancelada')], max_length=15)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cobrancas', to='alunos.aluno')),
+                ('fatura', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cobranca', to='financeiro.fatura')),
+                ('fatura_simples', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cobranca', to='financeiro.faturasimples')),
+                ('personal_trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cobrancas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cobrança',
+                'verbose_name_plural': 'Cobranças',
+                'ordering': ['-ano_referencia', '-mes_referencia'],
+                'indexes': [models.Index(fields=['personal_trainer', 'status', 'data_vencimento'], name='financeiro__persona_13b2de_idx'), models.Index(fields=['personal_trainer', 'ano_referencia', 'mes_referencia'], name='financeiro__persona_8099fd_idx'), models.Index(fields=['personal_trainer', 'data_pagamento'], name='financeiro__persona_1d331b_idx'), models.Index(fields=['aluno', 'status'], name='financeiro__aluno_i_14c2dc_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cobranca',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('fatura__isnull', False), ('fatura_simples__isnull', True), ('origem', 'fatura')), models.Q(('fatura__isnull', True), ('fatura_simples__isnull', False), ('origem', 'simples')), _connector='OR'), name='cobranca_origem_unica'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0010_livro_cobrancas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planomensalidade',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
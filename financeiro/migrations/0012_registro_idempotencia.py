@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0011_planomensalidade_data_atualizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64)),
+                ('operacao', models.CharField(choices=[('registrar_pagamento', 'Registrar Pagamento'), ('marcar_como_paga', 'Marcar Fatura Simples como Paga')], max_length=30)),
+                ('resultado', models.JSONField(default=dict)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('personal_trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registros_idempotencia', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Registro de Idempotência',
+                'verbose_name_plural': 'Registros de Idempotência',
+                'unique_together': {('personal_trainer', 'chave')},
+            },
+        ),
+    ]
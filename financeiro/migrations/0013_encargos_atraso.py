@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:08
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0012_registro_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='encargos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Parte do acréscimo referente a multa e juros por atraso, mantida pela apuração diária', max_digits=8),
+        ),
+        migrations.CreateModel(
+            name='LancamentoEncargo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_referencia', models.DateField(help_text='Dia da apuração')),
+                ('dias_atraso', models.IntegerField()),
+                ('multa_percentual', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('juros_mensal_percentual', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('encargos_anteriores', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('encargos_novos', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('estornado', models.BooleanField(default=False)),
+                ('data_estorno', models.DateTimeField(blank=True, null=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('fatura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos_encargo', to='financeiro.fatura')),
+            ],
+            options={
+                'verbose_name': 'Lançamento de Encargo',
+                'verbose_name_plural': 'Lançamentos de Encargos',
+                'ordering': ['-data_referencia', 'fatura'],
+                'indexes': [models.Index(fields=['data_referencia', 'estornado'], name='financeiro__data_re_53d621_idx'), models.Index(fields=['fatura', 'data_referencia'], name='financeiro__fatura__9546e4_idx')],
+            },
+        ),
+    ]
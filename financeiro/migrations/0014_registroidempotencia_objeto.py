@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0013_encargos_atraso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registroidempotencia',
+            name='objeto_id',
+            field=models.PositiveIntegerField(help_text='Fatura alvo da operação', null=True),
+        ),
+    ]
@@ -1,11 +1,16 @@
 """
 Modelos para gestão financeira dos alunos.
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.utils import timezone
 from django.conf import settings
+from datetime import date
 from decimal import Decimal
 from alunos.models import Aluno
+import uuid
+from .cache import invalidar_cache_financeiro
 
 
 class PlanoMensalidade(models.Model):
@@ -18,6 +23,7 @@ class PlanoMensalidade(models.Model):
     aulas_incluidas = models.IntegerField(help_text="Número de aulas incluídas no plano")
     ativo = models.BooleanField(default=True)
     data_criacao = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'Plano de Mensalidade'
@@ -26,6 +32,11 @@ class PlanoMensalidade(models.Model):
     
     def __str__(self):
         return f"{self.nome} - R$ {self.valor}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # O valor do plano entra na previsão de recebimentos de todos os personal trainers
+        invalidar_cache_financeiro()
 
 
 class ContratoAluno(models.Model):
@@ -49,12 +60,89 @@ class ContratoAluno(models.Model):
     def __str__(self):
         return f"Contrato - {self.aluno.nome}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # A previsão de recebimentos é calculada a partir dos contratos
+        invalidar_cache_financeiro(self.aluno.personal_trainer_id)
+    
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        invalidar_cache_financeiro(self.aluno.personal_trainer_id)
+        return resultado
+    
     @property
     def valor_mensalidade(self):
         """Retorna o valor da mensalidade (personalizado ou do plano)."""
         return self.valor_personalizado or self.plano_mensalidade.valor
 
 
+def _status_pelo_total_pago(total_pago):
+    """
+    Expressão do status de uma Fatura a partir do total pago.
+    
+    Recebe uma expressão (ex: F('valor_pago') + valor) para que o total e o
+    status sejam gravados no mesmo UPDATE. Faturas canceladas não mudam.
+    """
+    zero = models.Value(Decimal('0.00'))
+    return models.Case(
+        models.When(status='cancelada', then=models.F('status')),
+        models.When(GreaterThanOrEqual(total_pago, models.F('valor_final')), then=models.Value('paga')),
+        models.When(GreaterThan(total_pago, zero), then=models.Value('parcial')),
+        models.When(data_vencimento__lt=timezone.now().date(), then=models.Value('atrasada')),
+        default=models.Value('pendente'),
+        output_field=models.CharField()
+    )
+
+
+class FaturaQuerySet(models.QuerySet):
+    """
+    Consultas de faturas com o status calculado na própria consulta.
+    """
+    
+    def com_status_atual(self):
+        """Anota status_atual, tratando como atrasadas as faturas pendentes já vencidas."""
+        hoje = timezone.now().date()
+        return self.annotate(
+            status_atual=models.Case(
+                models.When(status='pendente', data_vencimento__lt=hoje, then=models.Value('atrasada')),
+                models.When(status='atrasada', data_vencimento__gte=hoje, then=models.Value('pendente')),
+                default=models.F('status'),
+                output_field=models.CharField()
+            )
+        )
+    
+    def atrasadas(self):
+        """Faturas pendentes ou atrasadas com vencimento passado."""
+        return self.filter(status__in=['pendente', 'atrasada'], data_vencimento__lt=timezone.now().date())
+    
+    def reconciliar_valor_pago(self):
+        """
+        Recalcula valor_pago e status a partir dos pagamentos registrados.
+        
+        São dois UPDATEs para todo o queryset, independente da quantidade de faturas.
+        Retorna a quantidade de faturas atualizadas.
+        """
+        total_pagamentos = Pagamento.objects.filter(
+            fatura=models.OuterRef('pk')
+        ).values('fatura').annotate(
+            total=models.Sum('valor_pago')
+        ).values('total')
+        
+        agora = timezone.now()
+        with transaction.atomic():
+            atualizadas = self.update(
+                valor_pago=Coalesce(
+                    models.Subquery(total_pagamentos, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+                    models.Value(Decimal('0.00'))
+                ),
+                data_atualizacao=agora
+            )
+            self.update(status=_status_pelo_total_pago(models.F('valor_pago')))
+            Cobranca.sincronizar(faturas=self)
+        
+        return atualizadas
+
+
 class Fatura(models.Model):
     """
     Faturas mensais dos alunos.
@@ -74,13 +162,27 @@ class Fatura(models.Model):
     valor_original = models.DecimalField(max_digits=8, decimal_places=2)
     desconto = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
     acrescimo = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    encargos = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Parte do acréscimo referente a multa e juros por atraso, mantida pela apuração diária"
+    )
     valor_final = models.DecimalField(max_digits=8, decimal_places=2)
+    valor_pago = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Total pago, mantido pelos pagamentos registrados"
+    )
     data_vencimento = models.DateField()
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendente')
     observacoes = models.TextField(blank=True)
     data_criacao = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
     
+    objects = FaturaQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Fatura'
         verbose_name_plural = 'Faturas'
@@ -95,10 +197,98 @@ class Fatura(models.Model):
         }
         return f"{self.aluno.nome} - {meses[self.mes_referencia]}/{self.ano_referencia} - R$ {self.valor_final}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mês gravado, para recalcular também o relatório anterior se ele mudar
+        if {'ano_referencia', 'mes_referencia'}.issubset(field_names):
+            instance._mes_ano_salvo = (instance.ano_referencia, instance.mes_referencia)
+        return instance
+    
     def save(self, *args, **kwargs):
         """Calcula o valor final antes de salvar."""
         self.valor_final = self.valor_original - self.desconto + self.acrescimo
-        super().save(*args, **kwargs)
+        
+        # valor_pago é atualizado pelos pagamentos direto no banco; uma instância
+        # carregada antes deles não pode sobrescrever o total com o valor antigo
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'valor_pago'
+            ]
+        
+        personal_trainer_id = self.aluno.personal_trainer_id
+        chaves = {(personal_trainer_id, self.ano_referencia, self.mes_referencia)}
+        if hasattr(self, '_mes_ano_salvo'):
+            chaves.add((personal_trainer_id, *self._mes_ano_salvo))
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Cobranca.sincronizar(faturas=[self.pk])
+            RelatorioFinanceiro.atualizar_faturas(chaves)
+            # O mês novo já foi recalculado pelo sincronizar; falta o anterior, se mudou
+            ReceitaMensal.recalcular(chaves - {(personal_trainer_id, self.ano_referencia, self.mes_referencia)},
+                                     recebimentos=False)
+        
+        self._mes_ano_salvo = (self.ano_referencia, self.mes_referencia)
+        invalidar_cache_financeiro(personal_trainer_id)
+    
+    def delete(self, *args, **kwargs):
+        personal_trainer_id = self.aluno.personal_trainer_id
+        
+        # Os pagamentos são excluídos em cascata, sem passar por Pagamento.delete()
+        recebimentos = list(_recebimentos_agrupados(models.Q(fatura=self)))
+        
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            RelatorioFinanceiro.atualizar_faturas({(personal_trainer_id, self.ano_referencia, self.mes_referencia)})
+            
+            for total in recebimentos:
+                RelatorioFinanceiro.acumular_recebimento(
+                    personal_trainer_id,
+                    date(total['ano'], total['mes'], 1),
+                    -total['total_recebido']
+                )
+            ReceitaMensal.recalcular(
+                {(personal_trainer_id, total['ano'], total['mes']) for total in recebimentos},
+                faturamento=False
+            )
+            # A cobrança saiu do livro em cascata
+            ReceitaMensal.recalcular(
+                {(personal_trainer_id, self.ano_referencia, self.mes_referencia)},
+                recebimentos=False
+            )
+        
+        invalidar_cache_financeiro(personal_trainer_id)
+        return resultado
+    
+    @classmethod
+    def acumular_pagamento(cls, fatura_id, valor):
+        """
+        Soma valor (negativo para estornos) ao total pago da fatura.
+        
+        Total e status são atualizados em um único UPDATE com F-expressions,
+        sem recarregar os demais pagamentos da fatura.
+        """
+        novo_total = models.F('valor_pago') + models.Value(valor)
+        cls.objects.filter(pk=fatura_id).update(
+            valor_pago=novo_total,
+            status=_status_pelo_total_pago(novo_total),
+            data_atualizacao=timezone.now()
+        )
+        Cobranca.sincronizar(faturas=[fatura_id])
+        
+        chave = cls.objects.filter(pk=fatura_id).values_list(
+            'aluno__personal_trainer_id', 'ano_referencia', 'mes_referencia'
+        ).first()
+        if chave is not None:
+            RelatorioFinanceiro.atualizar_faturas({chave})
+            invalidar_cache_financeiro(chave[0])
+    
+    @property
+    def saldo_devedor(self):
+        """Valor que ainda falta pagar."""
+        return max(self.valor_final - self.valor_pago, Decimal('0.00'))
     
     @property
     def esta_atrasada(self):
@@ -143,27 +333,118 @@ class Pagamento(models.Model):
     def __str__(self):
         return f"Pagamento - {self.fatura.aluno.nome} - R$ {self.valor_pago} - {self.data_pagamento.strftime('%d/%m/%Y')}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores gravados, para calcular a diferença ao editar ou excluir; a exclusão
+        # em cascata carrega só alguns campos, e ler um campo adiado aqui recursaria
+        if {'valor_pago', 'fatura_id', 'data_pagamento'} <= set(field_names):
+            instance._valor_pago_salvo = instance.valor_pago
+            instance._fatura_id_salvo = instance.fatura_id
+            instance._data_pagamento_salva = instance.data_pagamento
+        return instance
+    
+    def _carregar_valores_salvos(self):
+        """Lê do banco os valores gravados quando a instância foi carregada com campos adiados."""
+        if self._state.adding or hasattr(self, '_valor_pago_salvo'):
+            return
+        gravado = Pagamento.objects.filter(pk=self.pk).values('valor_pago', 'fatura_id', 'data_pagamento').first()
+        if gravado:
+            self._valor_pago_salvo = gravado['valor_pago']
+            self._fatura_id_salvo = gravado['fatura_id']
+            self._data_pagamento_salva = gravado['data_pagamento']
+    
     def save(self, *args, **kwargs):
-        """Atualiza o status da fatura após o pagamento."""
-        super().save(*args, **kwargs)
+        """Atualiza o total pago e o status da fatura após o pagamento."""
+        self._carregar_valores_salvos()
+        valor_anterior = getattr(self, '_valor_pago_salvo', None)
+        fatura_anterior_id = getattr(self, '_fatura_id_salvo', None)
         
-        # Recalcular o status da fatura
-        total_pago = sum(pagamento.valor_pago for pagamento in self.fatura.pagamentos.all())
+        anterior = None
+        if fatura_anterior_id is not None:
+            anterior = (fatura_anterior_id, self._data_pagamento_salva, valor_anterior)
         
-        if total_pago >= self.fatura.valor_final:
-            self.fatura.status = 'paga'
-        elif total_pago > 0:
-            self.fatura.status = 'parcial'
-        else:
-            self.fatura.status = 'pendente'
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            if fatura_anterior_id is not None and fatura_anterior_id != self.fatura_id:
+                # Pagamento movido para outra fatura: estornar da anterior
+                Fatura.acumular_pagamento(fatura_anterior_id, -valor_anterior)
+                valor_anterior = None
+            
+            diferenca = self.valor_pago - (valor_anterior or Decimal('0.00'))
+            if valor_anterior is None or diferenca:
+                Fatura.acumular_pagamento(self.fatura_id, diferenca)
+            
+            self._atualizar_consolidados(anterior, (self.fatura_id, self.data_pagamento, self.valor_pago))
+        
+        self._valor_pago_salvo = self.valor_pago
+        self._fatura_id_salvo = self.fatura_id
+        self._data_pagamento_salva = self.data_pagamento
+    
+    def delete(self, *args, **kwargs):
+        """Estorna o valor do total pago da fatura."""
+        self._carregar_valores_salvos()
+        valor = getattr(self, '_valor_pago_salvo', self.valor_pago)
+        fatura_id = getattr(self, '_fatura_id_salvo', self.fatura_id)
+        data_pagamento = getattr(self, '_data_pagamento_salva', self.data_pagamento)
+        
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            Fatura.acumular_pagamento(fatura_id, -valor)
+            self._atualizar_consolidados((fatura_id, data_pagamento, valor), None)
+        
+        return resultado
+    
+    @staticmethod
+    def _atualizar_consolidados(anterior, atual):
+        """
+        Leva a alteração de um pagamento para a receita mensal e os relatórios financeiros.
         
-        self.fatura.save()
+        `anterior` e `atual` são (fatura_id, data_pagamento, valor) como estava gravado
+        e como ficou; None quando o pagamento é novo ou foi excluído.
+        """
+        pagamentos = [pagamento for pagamento in (anterior, atual) if pagamento and pagamento[0] and pagamento[1]]
+        trainers = dict(
+            Fatura.objects.filter(
+                pk__in={fatura_id for fatura_id, _, _ in pagamentos}
+            ).values_list('pk', 'aluno__personal_trainer_id')
+        )
+        
+        if anterior != atual:
+            for pagamento, sinal in ((anterior, -1), (atual, 1)):
+                if pagamento in pagamentos:
+                    fatura_id, data, valor = pagamento
+                    RelatorioFinanceiro.acumular_recebimento(trainers.get(fatura_id), data, sinal * valor)
+        
+        ReceitaMensal.recalcular(
+            {(trainers.get(fatura_id), data.year, data.month) for fatura_id, data, _ in pagamentos},
+            faturamento=False
+        )
 
 
 class RelatorioFinanceiro(models.Model):
     """
-    Relatórios financeiros mensais.
+    Relatórios financeiros mensais de cada personal trainer.
+    
+    Os totais de faturas vêm de Fatura pelo mês de referência e total_recebido vem
+    de Pagamento pelo mês do pagamento. Pagamentos ajustam total_recebido por
+    diferença; alterações em faturas recalculam os totais de faturas do mês.
     """
+    CAMPOS_FATURAS = [
+        'total_faturado', 'total_pendente', 'total_atrasado',
+        'numero_faturas_pagas', 'numero_faturas_pendentes',
+    ]
+    STATUS_EM_ABERTO = ['pendente', 'parcial', 'atrasada']
+    
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='relatorios_financeiros',
+        null=True,
+        blank=True,
+        help_text="Vazio apenas em relatórios antigos, gerados para todos os personal trainers"
+    )
     mes = models.IntegerField(choices=[(i, i) for i in range(1, 13)])
     ano = models.IntegerField()
     total_faturado = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
@@ -179,7 +460,7 @@ class RelatorioFinanceiro(models.Model):
         verbose_name = 'Relatório Financeiro'
         verbose_name_plural = 'Relatórios Financeiros'
         ordering = ['-ano', '-mes']
-        unique_together = ['mes', 'ano']
+        unique_together = ['personal_trainer', 'mes', 'ano']
     
     def __str__(self):
         meses = {
@@ -190,51 +471,239 @@ class RelatorioFinanceiro(models.Model):
         return f"Relatório Financeiro - {meses[self.mes]}/{self.ano}"
     
     @classmethod
-    def gerar_relatorio_mensal(cls, mes, ano):
+    def gerar_relatorio_mensal(cls, mes, ano, personal_trainer):
         """
-        Gera ou atualiza o relatório financeiro mensal.
+        Gera ou atualiza o relatório financeiro mensal do personal trainer.
+        """
+        cls.gerar_relatorios((ano, mes), (ano, mes), personal_trainer)
+        return cls.objects.get(personal_trainer=personal_trainer, mes=mes, ano=ano)
+    
+    @classmethod
+    def gerar_relatorios(cls, inicio, fim, personal_trainer=None):
+        """
+        Gera ou atualiza os relatórios dos meses entre inicio e fim, ambos (ano, mes).
+        
+        Faturas, pagamentos e alunos são lidos com uma consulta agrupada cada, para
+        todo o intervalo e todos os personal trainers (ou apenas o informado).
+        Retorna a quantidade de relatórios gravados.
         """
-        from django.db.models import Sum, Count
+        (ano_inicio, mes_inicio), (ano_fim, mes_fim) = inicio, fim
+        data_inicio = date(ano_inicio, mes_inicio, 1)
+        data_fim = _primeiro_dia_mes_seguinte(ano_fim, mes_fim)
         
-        faturas_mes = Fatura.objects.filter(mes_referencia=mes, ano_referencia=ano)
-        pagamentos_mes = Pagamento.objects.filter(
-            data_pagamento__month=mes,
-            data_pagamento__year=ano
+        filtro_faturas = (
+            (models.Q(ano_referencia__gt=ano_inicio) | models.Q(ano_referencia=ano_inicio, mes_referencia__gte=mes_inicio))
+            & (models.Q(ano_referencia__lt=ano_fim) | models.Q(ano_referencia=ano_fim, mes_referencia__lte=mes_fim))
         )
+        filtro_pagamentos = models.Q(data_pagamento__gte=data_inicio, data_pagamento__lt=data_fim)
+        relatorios = cls.objects.filter(
+            (models.Q(ano__gt=ano_inicio) | models.Q(ano=ano_inicio, mes__gte=mes_inicio))
+            & (models.Q(ano__lt=ano_fim) | models.Q(ano=ano_fim, mes__lte=mes_fim)),
+            personal_trainer__isnull=False
+        )
+        alunos = Aluno.objects.filter(ativo=True, data_inicio__lt=data_fim)
+        
+        if personal_trainer is not None:
+            filtro_faturas &= models.Q(aluno__personal_trainer=personal_trainer)
+            filtro_pagamentos &= models.Q(fatura__aluno__personal_trainer=personal_trainer)
+            relatorios = relatorios.filter(personal_trainer=personal_trainer)
+            alunos = alunos.filter(personal_trainer=personal_trainer)
+        
+        linhas = {
+            chave: cls(personal_trainer_id=chave[0], ano=chave[1], mes=chave[2])
+            for chave in relatorios.values_list('personal_trainer_id', 'ano', 'mes')
+        }
+        
+        def linha(trainer_id, ano, mes):
+            if (trainer_id, ano, mes) not in linhas:
+                linhas[(trainer_id, ano, mes)] = cls(personal_trainer_id=trainer_id, ano=ano, mes=mes)
+            return linhas[(trainer_id, ano, mes)]
+        
+        if personal_trainer is not None:
+            trainer_id = getattr(personal_trainer, 'pk', personal_trainer)
+            for indice in range(ano_inicio * 12 + mes_inicio - 1, ano_fim * 12 + mes_fim):
+                linha(trainer_id, indice // 12, indice % 12 + 1)
         
-        total_faturado = faturas_mes.aggregate(total=Sum('valor_final'))['total'] or Decimal('0.00')
-        total_recebido = pagamentos_mes.aggregate(total=Sum('valor_pago'))['total'] or Decimal('0.00')
+        for total in _faturas_agrupadas(filtro_faturas):
+            relatorio = linha(total['trainer_id'], total['ano_referencia'], total['mes_referencia'])
+            for campo in cls.CAMPOS_FATURAS:
+                setattr(relatorio, campo, total[campo] or 0)
         
-        faturas_pendentes = faturas_mes.filter(status__in=['pendente', 'parcial'])
-        total_pendente = faturas_pendentes.aggregate(total=Sum('valor_final'))['total'] or Decimal('0.00')
+        for total in _recebimentos_agrupados(filtro_pagamentos):
+            linha(total['trainer_id'], total['ano'], total['mes']).total_recebido = total['total_recebido'] or 0
         
-        faturas_atrasadas = faturas_mes.filter(
-            status__in=['pendente', 'parcial'],
-            data_vencimento__lt=timezone.now().date()
+        # Alunos ativos que começaram até o fim de cada mês (acumulado dos inícios por mês)
+        inicios = {}
+        for grupo in alunos.annotate(
+            ano=ExtractYear('data_inicio'),
+            mes=ExtractMonth('data_inicio')
+        ).order_by().values('personal_trainer_id', 'ano', 'mes').annotate(quantidade=models.Count('id')):
+            inicios.setdefault(grupo['personal_trainer_id'], []).append(
+                (grupo['ano'] * 12 + grupo['mes'], grupo['quantidade'])
+            )
+        
+        for (trainer_id, ano, mes), relatorio in linhas.items():
+            indice = ano * 12 + mes
+            relatorio.numero_alunos_ativos = sum(
+                quantidade for inicio_aluno, quantidade in inicios.get(trainer_id, []) if inicio_aluno <= indice
+            )
+        
+        cls.objects.bulk_create(
+            linhas.values(),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['personal_trainer', 'mes', 'ano'],
+            update_fields=cls.CAMPOS_FATURAS + ['total_recebido', 'numero_alunos_ativos']
         )
-        total_atrasado = faturas_atrasadas.aggregate(total=Sum('valor_final'))['total'] or Decimal('0.00')
-        
-        # Contar alunos ativos no mês
-        alunos_ativos = Aluno.objects.filter(
-            ativo=True,
-            data_inicio__lte=timezone.date(ano, mes, 1)
-        ).count()
-        
-        relatorio, created = cls.objects.update_or_create(
-            mes=mes,
-            ano=ano,
-            defaults={
-                'total_faturado': total_faturado,
-                'total_recebido': total_recebido,
-                'total_pendente': total_pendente,
-                'total_atrasado': total_atrasado,
-                'numero_alunos_ativos': alunos_ativos,
-                'numero_faturas_pagas': faturas_mes.filter(status='paga').count(),
-                'numero_faturas_pendentes': faturas_pendentes.count(),
-            }
+        
+        return len(linhas)
+    
+    @classmethod
+    def atualizar_faturas(cls, chaves, apenas_existentes=False):
+        """
+        Recalcula os totais de faturas das chaves (personal_trainer_id, ano, mes).
+        
+        Meses ainda sem relatório são gerados por completo, a menos que
+        apenas_existentes seja informado.
+        """
+        chaves = sorted({chave for chave in chaves if None not in chave})
+        if not chaves:
+            return
+        
+        if len(chaves) > TAMANHO_LOTE_CHAVES:
+            for inicio in range(0, len(chaves), TAMANHO_LOTE_CHAVES):
+                cls.atualizar_faturas(chaves[inicio:inicio + TAMANHO_LOTE_CHAVES], apenas_existentes)
+            return
+        
+        filtro_relatorios = models.Q()
+        for trainer_id, ano, mes in chaves:
+            filtro_relatorios |= models.Q(personal_trainer_id=trainer_id, ano=ano, mes=mes)
+        existentes = set(
+            cls.objects.filter(filtro_relatorios).values_list('personal_trainer_id', 'ano', 'mes')
         )
         
-        return relatorio
+        if not apenas_existentes:
+            for trainer_id, ano, mes in set(chaves) - existentes:
+                cls.gerar_relatorios((ano, mes), (ano, mes), trainer_id)
+        
+        if not existentes:
+            return
+        
+        linhas = {
+            chave: cls(personal_trainer_id=chave[0], ano=chave[1], mes=chave[2])
+            for chave in existentes
+        }
+        filtro = models.Q()
+        for trainer_id, ano, mes in existentes:
+            filtro |= models.Q(aluno__personal_trainer_id=trainer_id, ano_referencia=ano, mes_referencia=mes)
+        
+        for total in _faturas_agrupadas(filtro):
+            relatorio = linhas[(total['trainer_id'], total['ano_referencia'], total['mes_referencia'])]
+            for campo in cls.CAMPOS_FATURAS:
+                setattr(relatorio, campo, total[campo] or 0)
+        
+        cls.objects.bulk_create(
+            linhas.values(),
+            update_conflicts=True,
+            unique_fields=['personal_trainer', 'mes', 'ano'],
+            update_fields=cls.CAMPOS_FATURAS
+        )
+    
+    @classmethod
+    def acumular_recebimento(cls, personal_trainer_id, data, valor):
+        """Soma valor (negativo para estornos) ao total recebido do mês de data."""
+        if personal_trainer_id is None or not valor:
+            return
+        
+        atualizados = cls.objects.filter(
+            personal_trainer_id=personal_trainer_id,
+            ano=data.year,
+            mes=data.month
+        ).update(total_recebido=models.F('total_recebido') + valor)
+        
+        if not atualizados:
+            cls.gerar_relatorios((data.year, data.month), (data.year, data.month), personal_trainer_id)
+
+
+class FaturaSimplesQuerySet(models.QuerySet):
+    """
+    Consultas de faturas simples com o status calculado na própria consulta.
+    
+    O status gravado só é corrigido no save() ou pela varredura periódica
+    (atualizar_status_faturas); estes filtros usam a data de vencimento e
+    ficam corretos entre uma varredura e outra.
+    """
+    
+    def com_status_atual(self):
+        """Anota status_atual com a mesma regra de FaturaSimples.save()."""
+        hoje = timezone.now().date()
+        return self.annotate(
+            status_atual=models.Case(
+                models.When(status='paga', then=models.Value('paga')),
+                models.When(data_vencimento__lt=hoje, then=models.Value('atrasada')),
+                default=models.Value('pendente'),
+                output_field=models.CharField()
+            )
+        )
+    
+    def pagas(self):
+        return self.filter(status='paga')
+    
+    def pendentes(self):
+        """Faturas não pagas que ainda não venceram."""
+        return self.exclude(status='paga').filter(data_vencimento__gte=timezone.now().date())
+    
+    def atrasadas(self):
+        """Faturas não pagas com vencimento passado."""
+        return self.exclude(status='paga').filter(data_vencimento__lt=timezone.now().date())
+    
+    def com_atraso(self):
+        """Anota atraso (timedelta) entre o vencimento e hoje."""
+        hoje = timezone.now().date()
+        return self.annotate(
+            atraso=models.ExpressionWrapper(
+                models.Value(hoje, output_field=models.DateField()) - models.F('data_vencimento'),
+                output_field=models.DurationField()
+            )
+        )
+    
+    def resumo_inadimplencia(self):
+        """Totais de inadimplência calculados em uma única consulta."""
+        atrasada = ~models.Q(status='paga') & models.Q(data_vencimento__lt=timezone.now().date())
+        
+        resumo = self.com_atraso().aggregate(
+            total_faturas=models.Count('id'),
+            faturas_vencidas=models.Count('id', filter=atrasada),
+            total_em_atraso=models.Sum('valor', filter=atrasada),
+            clientes_inadimplentes=models.Count('aluno', distinct=True, filter=atrasada),
+            media_atraso=models.Avg('atraso', filter=atrasada),
+        )
+        
+        resumo['total_em_atraso'] = resumo['total_em_atraso'] or Decimal('0.00')
+        resumo['media_dias_atraso'] = resumo.pop('media_atraso').days if resumo['faturas_vencidas'] else 0
+        return resumo
+    
+    def filtrar_status(self, status):
+        """Filtra pelo status atual ('paga', 'pendente' ou 'atrasada')."""
+        filtros = {
+            'paga': self.pagas,
+            'pendente': self.pendentes,
+            'atrasada': self.atrasadas,
+        }
+        return filtros[status]() if status in filtros else self.filter(status=status)
+    
+    def filtrar(self, status=None, aluno=None, mes=None, ano=None):
+        """Filtros das listas de faturas; valores vazios são ignorados."""
+        queryset = self
+        if status:
+            queryset = queryset.filtrar_status(status)
+        if aluno:
+            queryset = queryset.filter(aluno=aluno)
+        if mes:
+            queryset = queryset.filter(mes_referencia=mes)
+        if ano:
+            queryset = queryset.filter(ano_referencia=ano)
+        return queryset
 
 
 class FaturaSimples(models.Model):
@@ -290,6 +759,8 @@ class FaturaSimples(models.Model):
     data_criacao = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
     
+    objects = FaturaSimplesQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Fatura Simples'
         verbose_name_plural = 'Faturas Simples'
@@ -299,6 +770,19 @@ class FaturaSimples(models.Model):
     def __str__(self):
         return f"{self.aluno.nome} - {self.mes_nome}/{self.ano_referencia} - R$ {self.valor}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mês gravado, para recalcular também a receita mensal anterior se ele mudar
+        if {'personal_trainer_id', 'ano_referencia', 'mes_referencia'}.issubset(field_names):
+            instance._chave_receita_salva = instance.chave_receita
+        return instance
+    
+    @property
+    def chave_receita(self):
+        """Chave da linha de ReceitaMensal em que a fatura entra."""
+        return (self.personal_trainer_id, self.ano_referencia, self.mes_referencia)
+    
     def save(self, *args, **kwargs):
         """Atualiza automaticamente o status baseado na data de vencimento."""
         if self.status != 'paga':
@@ -307,7 +791,28 @@ class FaturaSimples(models.Model):
                 self.status = 'atrasada'
             else:
                 self.status = 'pendente'
-        super().save(*args, **kwargs)
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Cobranca.sincronizar(faturas_simples=[self.pk])
+            # O mês novo já foi recalculado pelo sincronizar; falta o anterior, se mudou
+            ReceitaMensal.recalcular(
+                {getattr(self, '_chave_receita_salva', self.chave_receita)} - {self.chave_receita},
+                recebimentos=False
+            )
+        
+        self._chave_receita_salva = self.chave_receita
+        invalidar_cache_financeiro(self.personal_trainer_id)
+    
+    def delete(self, *args, **kwargs):
+        chave = getattr(self, '_chave_receita_salva', self.chave_receita)
+        
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            ReceitaMensal.recalcular({chave}, recebimentos=False)
+        
+        invalidar_cache_financeiro(self.personal_trainer_id)
+        return resultado
     
     @property
     def mes_nome(self):
@@ -332,3 +837,740 @@ class FaturaSimples(models.Model):
             return 0
         hoje = timezone.now().date()
         return (hoje - self.data_vencimento).days
+
+
+class CheckpointFaturamento(models.Model):
+    """
+    Ponto de retomada da geração em lote de faturas simples de um personal trainer.
+    """
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='checkpoints_faturamento'
+    )
+    mes_referencia = models.IntegerField(choices=[(i, f'{i:02d}') for i in range(1, 13)])
+    ano_referencia = models.IntegerField()
+    ultimo_aluno_id = models.BigIntegerField(
+        default=0,
+        help_text="Último aluno processado; a próxima execução continua a partir dele"
+    )
+    faturas_criadas = models.IntegerField(default=0)
+    concluido = models.BooleanField(default=False)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Checkpoint de Faturamento'
+        verbose_name_plural = 'Checkpoints de Faturamento'
+        unique_together = ['personal_trainer', 'mes_referencia', 'ano_referencia']
+    
+    def __str__(self):
+        situacao = 'concluído' if self.concluido else f'aluno #{self.ultimo_aluno_id}'
+        return f"Faturamento {self.mes_referencia:02d}/{self.ano_referencia} - {self.personal_trainer} ({situacao})"
+
+
+class CobrancaQuerySet(models.QuerySet):
+    """
+    Consultas do livro de cobranças, com a mesma interface de FaturaSimplesQuerySet.
+    
+    Permite trocar FaturaSimples.objects (ou Fatura.objects) por Cobranca.objects
+    nas views sem mudar os filtros e anotações que elas já usam.
+    """
+    STATUS_EM_ABERTO = ['pendente', 'atrasada', 'parcial']
+    
+    def com_status_atual(self):
+        """Anota status_atual, tratando como atrasadas as cobranças em aberto já vencidas."""
+        hoje = timezone.now().date()
+        return self.annotate(
+            status_atual=models.Case(
+                models.When(status__in=['paga', 'cancelada'], then=models.F('status')),
+                models.When(data_vencimento__lt=hoje, then=models.Value('atrasada')),
+                models.When(status='parcial', then=models.Value('parcial')),
+                default=models.Value('pendente'),
+                output_field=models.CharField()
+            )
+        )
+    
+    def em_aberto(self):
+        return self.filter(status__in=self.STATUS_EM_ABERTO)
+    
+    def pagas(self):
+        return self.filter(status='paga')
+    
+    def pendentes(self):
+        """Cobranças em aberto que ainda não venceram."""
+        return self.em_aberto().filter(data_vencimento__gte=timezone.now().date())
+    
+    def atrasadas(self):
+        """Cobranças em aberto com vencimento passado."""
+        return self.em_aberto().filter(data_vencimento__lt=timezone.now().date())
+    
+    def com_atraso(self):
+        """Anota atraso (timedelta) entre o vencimento e hoje."""
+        hoje = timezone.now().date()
+        return self.annotate(
+            atraso=models.ExpressionWrapper(
+                models.Value(hoje, output_field=models.DateField()) - models.F('data_vencimento'),
+                output_field=models.DurationField()
+            )
+        )
+    
+    def resumo_inadimplencia(self):
+        """Totais de inadimplência calculados em uma única consulta."""
+        atrasada = models.Q(status__in=self.STATUS_EM_ABERTO, data_vencimento__lt=timezone.now().date())
+        
+        resumo = self.exclude(status='cancelada').com_atraso().aggregate(
+            total_faturas=models.Count('id'),
+            faturas_vencidas=models.Count('id', filter=atrasada),
+            total_em_atraso=models.Sum(models.F('valor') - models.F('valor_pago'), filter=atrasada),
+            clientes_inadimplentes=models.Count('aluno', distinct=True, filter=atrasada),
+            media_atraso=models.Avg('atraso', filter=atrasada),
+        )
+        
+        resumo['total_em_atraso'] = resumo['total_em_atraso'] or Decimal('0.00')
+        resumo['media_dias_atraso'] = resumo.pop('media_atraso').days if resumo['faturas_vencidas'] else 0
+        return resumo
+    
+    def filtrar_status(self, status):
+        """Filtra pelo status atual ('paga', 'pendente' ou 'atrasada')."""
+        filtros = {
+            'paga': self.pagas,
+            'pendente': self.pendentes,
+            'atrasada': self.atrasadas,
+        }
+        return filtros[status]() if status in filtros else self.filter(status=status)
+    
+    def filtrar(self, status=None, aluno=None, mes=None, ano=None):
+        """Filtros das listas de faturas; valores vazios são ignorados."""
+        queryset = self
+        if status:
+            queryset = queryset.filtrar_status(status)
+        if aluno:
+            queryset = queryset.filter(aluno=aluno)
+        if mes:
+            queryset = queryset.filter(mes_referencia=mes)
+        if ano:
+            queryset = queryset.filter(ano_referencia=ano)
+        return queryset
+
+
+class Cobranca(models.Model):
+    """
+    Livro único de cobranças: uma linha para cada Fatura e cada FaturaSimples.
+    
+    Fatura e FaturaSimples continuam sendo onde as cobranças são gravadas; toda
+    escrita nelas copia a linha correspondente para cá (sincronizar), na mesma
+    transação. As views de leitura consultam só esta tabela, com um único
+    conjunto de índices. O histórico é copiado com o comando sincronizar_cobrancas.
+    """
+    ORIGEM_CHOICES = [
+        ('fatura', 'Fatura com contrato'),
+        ('simples', 'Fatura simples'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('atrasada', 'Atrasada'),
+        ('parcial', 'Paga Parcialmente'),
+        ('paga', 'Paga'),
+        ('cancelada', 'Cancelada'),
+    ]
+    STATUS_EM_ABERTO = CobrancaQuerySet.STATUS_EM_ABERTO
+    CAMPOS_SINCRONIZADOS = [
+        'personal_trainer', 'aluno', 'origem', 'mes_referencia', 'ano_referencia',
+        'valor', 'valor_pago', 'data_vencimento', 'data_pagamento', 'status', 'data_atualizacao',
+    ]
+    
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='cobrancas'
+    )
+    aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, related_name='cobrancas')
+    origem = models.CharField(max_length=10, choices=ORIGEM_CHOICES)
+    fatura = models.OneToOneField(
+        Fatura,
+        on_delete=models.CASCADE,
+        related_name='cobranca',
+        blank=True,
+        null=True
+    )
+    fatura_simples = models.OneToOneField(
+        FaturaSimples,
+        on_delete=models.CASCADE,
+        related_name='cobranca',
+        blank=True,
+        null=True
+    )
+    mes_referencia = models.IntegerField(choices=[(i, f'{i:02d}') for i in range(1, 13)])
+    ano_referencia = models.IntegerField()
+    valor = models.DecimalField(max_digits=10, decimal_places=2, help_text="Valor final da cobrança")
+    valor_pago = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    data_vencimento = models.DateField()
+    data_pagamento = models.DateField(blank=True, null=True, help_text="Data do último pagamento")
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+    
+    objects = CobrancaQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Cobrança'
+        verbose_name_plural = 'Cobranças'
+        ordering = ['-ano_referencia', '-mes_referencia']
+        indexes = [
+            models.Index(fields=['personal_trainer', 'status', 'data_vencimento']),
+            models.Index(fields=['personal_trainer', 'ano_referencia', 'mes_referencia']),
+            models.Index(fields=['personal_trainer', 'data_pagamento']),
+            models.Index(fields=['aluno', 'status']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(origem='fatura', fatura__isnull=False, fatura_simples__isnull=True)
+                    | models.Q(origem='simples', fatura__isnull=True, fatura_simples__isnull=False)
+                ),
+                name='cobranca_origem_unica'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.aluno.nome} - {self.mes_nome}/{self.ano_referencia} - R$ {self.valor}"
+    
+    @property
+    def documento(self):
+        """Fatura ou FaturaSimples de origem."""
+        return self.fatura if self.origem == 'fatura' else self.fatura_simples
+    
+    @property
+    def mes_nome(self):
+        """Retorna o nome do mês de referência."""
+        meses = {
+            1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
+            5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
+            9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
+        }
+        return meses.get(self.mes_referencia, 'Mês inválido')
+    
+    @property
+    def saldo_devedor(self):
+        """Valor que ainda falta pagar."""
+        return max(self.valor - self.valor_pago, Decimal('0.00'))
+    
+    @property
+    def esta_atrasada(self):
+        """Verifica se a cobrança está atrasada."""
+        return self.status in self.STATUS_EM_ABERTO and self.data_vencimento < timezone.now().date()
+    
+    @property
+    def dias_atraso(self):
+        """Calcula quantos dias de atraso a cobrança possui."""
+        if not self.esta_atrasada:
+            return 0
+        return (timezone.now().date() - self.data_vencimento).days
+    
+    @classmethod
+    def sincronizar(cls, faturas=None, faturas_simples=None, tamanho_lote=500):
+        """
+        Copia para o livro as faturas e faturas simples informadas (querysets ou ids).
+        
+        As linhas de origem são lidas com values() e gravadas com upserts em lote,
+        então a cópia pode ser repetida sem duplicar cobranças. Retorna a quantidade
+        de linhas gravadas.
+        """
+        gravadas = 0
+        
+        if faturas is not None:
+            if not isinstance(faturas, models.QuerySet):
+                faturas = Fatura.objects.filter(pk__in=list(faturas))
+            ultimo_pagamento = Pagamento.objects.filter(
+                fatura=models.OuterRef('pk')
+            ).order_by('-data_pagamento').values('data_pagamento')[:1]
+            linhas = (
+                cls(
+                    fatura_id=fatura['id'],
+                    personal_trainer_id=fatura['aluno__personal_trainer_id'],
+                    aluno_id=fatura['aluno_id'],
+                    origem='fatura',
+                    mes_referencia=fatura['mes_referencia'],
+                    ano_referencia=fatura['ano_referencia'],
+                    valor=fatura['valor_final'],
+                    valor_pago=fatura['valor_pago'],
+                    data_vencimento=fatura['data_vencimento'],
+                    data_pagamento=fatura['ultimo_pagamento'],
+                    status=fatura['status'],
+                )
+                for fatura in faturas.annotate(ultimo_pagamento=models.Subquery(ultimo_pagamento)).order_by().values(
+                    'id', 'aluno_id', 'aluno__personal_trainer_id', 'mes_referencia', 'ano_referencia',
+                    'valor_final', 'valor_pago', 'data_vencimento', 'status', 'ultimo_pagamento'
+                ).iterator(chunk_size=tamanho_lote)
+            )
+            gravadas += cls._gravar(linhas, 'fatura', tamanho_lote)
+        
+        if faturas_simples is not None:
+            if not isinstance(faturas_simples, models.QuerySet):
+                faturas_simples = FaturaSimples.objects.filter(pk__in=list(faturas_simples))
+            linhas = (
+                cls(
+                    fatura_simples_id=fatura['id'],
+                    personal_trainer_id=fatura['personal_trainer_id'],
+                    aluno_id=fatura['aluno_id'],
+                    origem='simples',
+                    mes_referencia=fatura['mes_referencia'],
+                    ano_referencia=fatura['ano_referencia'],
+                    valor=fatura['valor'],
+                    valor_pago=fatura['valor'] if fatura['status'] == 'paga' else Decimal('0.00'),
+                    data_vencimento=fatura['data_vencimento'],
+                    data_pagamento=fatura['data_pagamento'],
+                    status=fatura['status'],
+                )
+                for fatura in faturas_simples.order_by().values(
+                    'id', 'aluno_id', 'personal_trainer_id', 'mes_referencia', 'ano_referencia',
+                    'valor', 'data_vencimento', 'data_pagamento', 'status'
+                ).iterator(chunk_size=tamanho_lote)
+            )
+            gravadas += cls._gravar(linhas, 'fatura_simples', tamanho_lote)
+        
+        return gravadas
+    
+    @classmethod
+    def _gravar(cls, linhas, campo_origem, tamanho_lote):
+        gravadas = 0
+        lote = []
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) == tamanho_lote:
+                gravadas += cls._upsert(lote, campo_origem)
+                lote = []
+        if lote:
+            gravadas += cls._upsert(lote, campo_origem)
+        return gravadas
+    
+    @classmethod
+    def _upsert(cls, lote, campo_origem):
+        cls.objects.bulk_create(
+            lote,
+            update_conflicts=True,
+            unique_fields=[campo_origem],
+            update_fields=cls.CAMPOS_SINCRONIZADOS
+        )
+        # O faturamento da receita mensal sai do livro; meses de onde uma cobrança
+        # saiu (troca de referência ou exclusão) ficam a cargo de quem a alterou
+        ReceitaMensal.recalcular(
+            {(linha.personal_trainer_id, linha.ano_referencia, linha.mes_referencia) for linha in lote},
+            recebimentos=False
+        )
+        return len(lote)
+
+
+# Chaves (personal trainer, ano, mês) por consulta ao recalcular os consolidados;
+# cada chave vira um termo do filtro OR, e o SQLite limita a profundidade da expressão
+TAMANHO_LOTE_CHAVES = 200
+
+
+def _primeiro_dia_mes_seguinte(ano, mes):
+    return date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+
+
+def _faturas_agrupadas(filtro):
+    """Totais de Fatura agrupados por (personal trainer, ano, mês de referência)."""
+    em_aberto = models.Q(status__in=RelatorioFinanceiro.STATUS_EM_ABERTO)
+    return Fatura.objects.filter(filtro).annotate(
+        trainer_id=models.F('aluno__personal_trainer_id')
+    ).order_by().values('trainer_id', 'ano_referencia', 'mes_referencia').annotate(
+        total_faturado=models.Sum('valor_final'),
+        total_pendente=models.Sum('valor_final', filter=em_aberto),
+        total_atrasado=models.Sum('valor_final', filter=models.Q(status='atrasada')),
+        numero_faturas_pagas=models.Count('id', filter=models.Q(status='paga')),
+        numero_faturas_pendentes=models.Count('id', filter=em_aberto),
+    )
+
+
+def _faturamento_agrupado(filtro):
+    """Totais do livro de cobranças (Fatura e FaturaSimples) agrupados por (personal trainer, ano, mês de referência)."""
+    saldo = models.F('valor') - models.F('valor_pago')
+    return Cobranca.objects.filter(filtro).exclude(status='cancelada').order_by().values(
+        'personal_trainer_id', 'ano_referencia', 'mes_referencia'
+    ).annotate(
+        total_faturado=models.Sum('valor'),
+        total_pago=models.Sum('valor_pago'),
+        total_pendente=models.Sum(saldo, filter=models.Q(status__in=['pendente', 'parcial'])),
+        total_atrasado=models.Sum(saldo, filter=models.Q(status='atrasada')),
+        quantidade_faturas=models.Count('id'),
+    )
+
+
+def _recebimentos_agrupados(filtro):
+    """Totais de Pagamento agrupados por (personal trainer, ano, mês do pagamento)."""
+    return Pagamento.objects.filter(filtro).annotate(
+        trainer_id=models.F('fatura__aluno__personal_trainer_id'),
+        ano=ExtractYear('data_pagamento'),
+        mes=ExtractMonth('data_pagamento'),
+    ).order_by().values('trainer_id', 'ano', 'mes').annotate(
+        total_recebido=models.Sum('valor_pago')
+    )
+
+
+class ReceitaMensalQuerySet(models.QuerySet):
+    
+    def serie(self, personal_trainer, ano, mes, meses=12):
+        """
+        Retorna os `meses` meses terminados em mes/ano, do mais antigo ao mais recente.
+        
+        Meses sem movimento entram como registros zerados (não salvos).
+        """
+        fim = ano * 12 + mes - 1
+        periodos = [divmod(indice, 12) for indice in range(fim - meses + 1, fim + 1)]
+        periodos = [(ano_periodo, mes_periodo + 1) for ano_periodo, mes_periodo in periodos]
+        
+        filtro = models.Q()
+        for ano_periodo, mes_periodo in periodos:
+            filtro |= models.Q(ano=ano_periodo, mes=mes_periodo)
+        
+        existentes = {
+            (receita.ano, receita.mes): receita
+            for receita in self.filter(filtro, personal_trainer=personal_trainer)
+        }
+        
+        return [
+            existentes.get((ano_periodo, mes_periodo))
+            or self.model(personal_trainer=personal_trainer, ano=ano_periodo, mes=mes_periodo)
+            for ano_periodo, mes_periodo in periodos
+        ]
+
+
+class ReceitaMensal(models.Model):
+    """
+    Totais mensais consolidados de cada personal trainer, usados pelos gráficos de receita.
+    
+    Os campos de faturamento vêm do livro de cobranças (Fatura e FaturaSimples) pelo
+    mês de referência; total_recebido vem de Pagamento pelo mês do pagamento. O
+    faturamento é recalculado a cada gravação no livro (Cobranca.sincronizar) e o
+    recebimento a cada pagamento; tudo pode ser reconstruído com o comando
+    reconstruir_receitas_mensais.
+    """
+    CAMPOS_FATURAMENTO = ['total_faturado', 'total_pago', 'total_pendente', 'total_atrasado', 'quantidade_faturas']
+    CAMPOS_RECEBIMENTO = ['total_recebido']
+    
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='receitas_mensais'
+    )
+    ano = models.IntegerField()
+    mes = models.IntegerField(choices=[(i, f'{i:02d}') for i in range(1, 13)])
+    total_faturado = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_pago = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_pendente = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_atrasado = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    quantidade_faturas = models.IntegerField(default=0)
+    total_recebido = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Pagamentos registrados no mês"
+    )
+    data_atualizacao = models.DateTimeField(auto_now=True)
+    
+    objects = ReceitaMensalQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Receita Mensal'
+        verbose_name_plural = 'Receitas Mensais'
+        ordering = ['-ano', '-mes']
+        unique_together = ['personal_trainer', 'ano', 'mes']
+    
+    def __str__(self):
+        return f"Receita {self.mes:02d}/{self.ano} - {self.personal_trainer}"
+    
+    @classmethod
+    def recalcular(cls, chaves, faturamento=True, recebimentos=True):
+        """
+        Recalcula as linhas das chaves (personal_trainer_id, ano, mes) informadas.
+        
+        Cada origem é lida com uma consulta agrupada e todas as linhas são gravadas
+        com um único upsert; meses que ficaram sem movimento voltam a zero.
+        """
+        chaves = sorted({chave for chave in chaves if None not in chave})
+        if not chaves:
+            return
+        
+        if len(chaves) > TAMANHO_LOTE_CHAVES:
+            for inicio in range(0, len(chaves), TAMANHO_LOTE_CHAVES):
+                cls.recalcular(chaves[inicio:inicio + TAMANHO_LOTE_CHAVES], faturamento, recebimentos)
+            return
+        
+        linhas = {
+            (trainer_id, ano, mes): cls(personal_trainer_id=trainer_id, ano=ano, mes=mes)
+            for trainer_id, ano, mes in chaves
+        }
+        campos = []
+        
+        if faturamento:
+            filtro = models.Q()
+            for trainer_id, ano, mes in chaves:
+                filtro |= models.Q(personal_trainer_id=trainer_id, ano_referencia=ano, mes_referencia=mes)
+            cls._aplicar_faturamento(linhas, _faturamento_agrupado(filtro))
+            campos += cls.CAMPOS_FATURAMENTO
+        
+        if recebimentos:
+            filtro = models.Q()
+            for trainer_id, ano, mes in chaves:
+                filtro |= models.Q(
+                    fatura__aluno__personal_trainer_id=trainer_id,
+                    data_pagamento__gte=date(ano, mes, 1),
+                    data_pagamento__lt=_primeiro_dia_mes_seguinte(ano, mes)
+                )
+            cls._aplicar_recebimentos(linhas, _recebimentos_agrupados(filtro))
+            campos += cls.CAMPOS_RECEBIMENTO
+        
+        cls.objects.bulk_create(
+            linhas.values(),
+            update_conflicts=True,
+            unique_fields=['personal_trainer', 'ano', 'mes'],
+            update_fields=campos + ['data_atualizacao']
+        )
+    
+    @classmethod
+    def reconstruir(cls, personal_trainer=None, tamanho_lote=500):
+        """Reconstrói todo o histórico (de um personal trainer ou de todos). Retorna as linhas gravadas."""
+        filtro_faturas = models.Q()
+        filtro_pagamentos = models.Q()
+        receitas = cls.objects.all()
+        
+        if personal_trainer is not None:
+            filtro_faturas = models.Q(personal_trainer=personal_trainer)
+            filtro_pagamentos = models.Q(fatura__aluno__personal_trainer=personal_trainer)
+            receitas = receitas.filter(personal_trainer=personal_trainer)
+        
+        linhas = {}
+        cls._aplicar_faturamento(linhas, _faturamento_agrupado(filtro_faturas))
+        cls._aplicar_recebimentos(linhas, _recebimentos_agrupados(filtro_pagamentos))
+        
+        with transaction.atomic():
+            receitas.delete()
+            cls.objects.bulk_create(linhas.values(), batch_size=tamanho_lote)
+        
+        return len(linhas)
+    
+    @classmethod
+    def _linha(cls, linhas, trainer_id, ano, mes):
+        chave = (trainer_id, ano, mes)
+        if chave not in linhas:
+            linhas[chave] = cls(personal_trainer_id=trainer_id, ano=ano, mes=mes)
+        return linhas[chave]
+    
+    @classmethod
+    def _aplicar_faturamento(cls, linhas, totais):
+        for total in totais:
+            linha = cls._linha(linhas, total['personal_trainer_id'], total['ano_referencia'], total['mes_referencia'])
+            for campo in cls.CAMPOS_FATURAMENTO:
+                setattr(linha, campo, total[campo] or 0)
+    
+    @classmethod
+    def _aplicar_recebimentos(cls, linhas, totais):
+        for total in totais:
+            linha = cls._linha(linhas, total['trainer_id'], total['ano'], total['mes'])
+            linha.total_recebido = total['total_recebido'] or Decimal('0.00')
+
+
+class RelatorioFinanceiroPDF(models.Model):
+    """
+    Geração em segundo plano do relatório financeiro em PDF.
+    
+    O arquivo fica em relatorios_financeiros/<personal trainer>/<chave>.pdf, onde a
+    chave é o hash dos dados do relatório; pedidos com os mesmos dados reaproveitam
+    o PDF já gerado.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Na fila'),
+        ('gerando', 'Gerando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro na Geração'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='relatorios_financeiros_pdf'
+    )
+    periodo_inicio = models.DateField()
+    periodo_fim = models.DateField()
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendente')
+    chave_conteudo = models.CharField(max_length=64, blank=True, help_text="Hash dos dados usados no PDF")
+    arquivo_pdf = models.FileField(upload_to='relatorios_financeiros/', blank=True, null=True)
+    erro = models.TextField(blank=True)
+    data_solicitacao = models.DateTimeField(auto_now_add=True)
+    data_conclusao = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = 'Relatório Financeiro em PDF'
+        verbose_name_plural = 'Relatórios Financeiros em PDF'
+        ordering = ['-data_solicitacao']
+    
+    def __str__(self):
+        return (
+            f"Relatório financeiro {self.periodo_inicio.strftime('%d/%m/%Y')} a "
+            f"{self.periodo_fim.strftime('%d/%m/%Y')} - {self.get_status_display()}"
+        )
+    
+    @property
+    def url_download(self):
+        """URL para download do relatório."""
+        if self.arquivo_pdf:
+            return self.arquivo_pdf.url
+        return None
+
+
+class ExtratoBancario(models.Model):
+    """
+    Extrato bancário ou de PIX importado para conciliação automática com as faturas.
+    """
+    FORMATO_CHOICES = [
+        ('csv', 'CSV'),
+        ('ofx', 'OFX'),
+    ]
+    
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='extratos_bancarios'
+    )
+    nome_arquivo = models.CharField(max_length=255)
+    formato = models.CharField(max_length=5, choices=FORMATO_CHOICES)
+    total_linhas = models.IntegerField(default=0)
+    linhas_conciliadas = models.IntegerField(default=0)
+    linhas_em_revisao = models.IntegerField(default=0)
+    linhas_sem_correspondencia = models.IntegerField(default=0)
+    linhas_duplicadas = models.IntegerField(
+        default=0,
+        help_text="Lançamentos ignorados por já constarem em extratos anteriores"
+    )
+    data_importacao = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Extrato Bancário'
+        verbose_name_plural = 'Extratos Bancários'
+        ordering = ['-data_importacao']
+    
+    def __str__(self):
+        return f"{self.nome_arquivo} - {self.data_importacao.strftime('%d/%m/%Y %H:%M')}"
+
+
+class LinhaExtrato(models.Model):
+    """
+    Lançamento de crédito de um extrato importado e o resultado da sua conciliação.
+    
+    Linhas ambíguas ficam em revisão com as faturas candidatas guardadas em
+    `candidatos`, para o personal trainer escolher a correta.
+    """
+    STATUS_CHOICES = [
+        ('conciliada', 'Conciliada'),
+        ('revisao', 'Em Revisão'),
+        ('sem_correspondencia', 'Sem Correspondência'),
+        ('ignorada', 'Ignorada'),
+    ]
+    
+    extrato = models.ForeignKey(ExtratoBancario, on_delete=models.CASCADE, related_name='linhas')
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='linhas_extrato'
+    )
+    data = models.DateField()
+    valor = models.DecimalField(max_digits=10, decimal_places=2)
+    descricao = models.CharField(max_length=255, blank=True)
+    identificador = models.CharField(
+        max_length=64,
+        help_text="FITID do OFX ou hash do lançamento; evita importar o mesmo lançamento duas vezes"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    fatura_simples = models.ForeignKey(
+        FaturaSimples,
+        on_delete=models.SET_NULL,
+        related_name='linhas_extrato',
+        blank=True,
+        null=True
+    )
+    pagamento = models.ForeignKey(
+        Pagamento,
+        on_delete=models.SET_NULL,
+        related_name='linhas_extrato',
+        blank=True,
+        null=True
+    )
+    candidatos = models.JSONField(default=list, blank=True)
+    
+    class Meta:
+        verbose_name = 'Linha de Extrato'
+        verbose_name_plural = 'Linhas de Extrato'
+        ordering = ['data', 'id']
+        unique_together = ['personal_trainer', 'identificador']
+        indexes = [
+            models.Index(fields=['personal_trainer', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.data.strftime('%d/%m/%Y')} - R$ {self.valor} - {self.get_status_display()}"
+
+
+class RegistroIdempotencia(models.Model):
+    """
+    Resultado de uma operação de pagamento identificada por uma chave enviada pelo cliente.
+    
+    Repetições da mesma requisição (clique duplo, reenvio após falha de rede)
+    devolvem o resultado gravado aqui em vez de registrar o pagamento de novo.
+    """
+    OPERACAO_CHOICES = [
+        ('registrar_pagamento', 'Registrar Pagamento'),
+        ('marcar_como_paga', 'Marcar Fatura Simples como Paga'),
+    ]
+    
+    personal_trainer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='registros_idempotencia'
+    )
+    chave = models.CharField(max_length=64)
+    operacao = models.CharField(max_length=30, choices=OPERACAO_CHOICES)
+    objeto_id = models.PositiveIntegerField(null=True, help_text="Fatura alvo da operação")
+    resultado = models.JSONField(default=dict)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Registro de Idempotência'
+        verbose_name_plural = 'Registros de Idempotência'
+        unique_together = ['personal_trainer', 'chave']
+    
+    def __str__(self):
+        return f"{self.get_operacao_display()} - {self.chave}"
+
+
+class LancamentoEncargo(models.Model):
+    """
+    Auditoria da apuração diária de multa e juros de uma fatura.
+    
+    Guarda os encargos antes e depois de cada apuração, o que permite estornar
+    uma rodada inteira voltando cada fatura aos encargos anteriores.
+    """
+    fatura = models.ForeignKey(Fatura, on_delete=models.CASCADE, related_name='lancamentos_encargo')
+    data_referencia = models.DateField(help_text="Dia da apuração")
+    dias_atraso = models.IntegerField()
+    multa_percentual = models.DecimalField(max_digits=5, decimal_places=2)
+    juros_mensal_percentual = models.DecimalField(max_digits=5, decimal_places=2)
+    encargos_anteriores = models.DecimalField(max_digits=8, decimal_places=2)
+    encargos_novos = models.DecimalField(max_digits=8, decimal_places=2)
+    estornado = models.BooleanField(default=False)
+    data_estorno = models.DateTimeField(blank=True, null=True)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Lançamento de Encargo'
+        verbose_name_plural = 'Lançamentos de Encargos'
+        ordering = ['-data_referencia', 'fatura']
+        indexes = [
+            models.Index(fields=['data_referencia', 'estornado']),
+            models.Index(fields=['fatura', 'data_referencia']),
+        ]
+    
+    def __str__(self):
+        return f"Fatura {self.fatura_id} - {self.data_referencia.strftime('%d/%m/%Y')} - R$ {self.encargos_novos}"
@@ -0,0 +1,107 @@
+"""
+Paginação por cursor (keyset) para listas longas.
+
+Em vez de OFFSET, cada página guarda os valores de ordenação da sua primeira e da
+sua última linha; a página vizinha filtra a partir desses valores, então o custo
+de uma página não cresce com a posição dela na lista.
+"""
+from functools import reduce
+from operator import attrgetter
+
+from django.core import signing
+from django.db.models import Q
+
+SALT_CURSOR = 'financeiro.paginacao'
+
+
+class PaginaCursor:
+    """Uma página de resultados com os cursores das páginas vizinhas."""
+
+    def __init__(self, itens, cursor_anterior=None, cursor_proximo=None):
+        self.itens = itens
+        self.cursor_anterior = cursor_anterior
+        self.cursor_proximo = cursor_proximo
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def has_next(self):
+        return self.cursor_proximo is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+
+def _campos(ordenacao):
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in ordenacao]
+
+
+def _valores(objeto, campos):
+    # str() mantém o cursor serializável; o ORM converte de volta ao filtrar
+    return [str(attrgetter(nome.replace('__', '.'))(objeto)) for nome, _ in campos]
+
+
+def _filtro_apos(campos, valores):
+    """Linhas posteriores a `valores` na ordenação informada."""
+    condicoes = []
+    for indice, (nome, decrescente) in enumerate(campos):
+        iguais = {campo: valor for (campo, _), valor in zip(campos[:indice], valores)}
+        lookup = f"{nome}__{'lt' if decrescente else 'gt'}"
+        condicoes.append(Q(**iguais, **{lookup: valores[indice]}))
+    return reduce(lambda a, b: a | b, condicoes)
+
+
+def _ler_cursor(token):
+    try:
+        return signing.loads(token, salt=SALT_CURSOR)
+    except signing.BadSignature:
+        return None
+
+
+def paginar_por_cursor(queryset, ordenacao, apos=None, antes=None, por_pagina=20):
+    """
+    Retorna uma PaginaCursor do queryset.
+
+    `ordenacao` segue a sintaxe de order_by() e deve terminar em um campo único
+    (normalmente 'id'); os campos não podem ser nulos. `apos` e `antes` são os
+    cursores recebidos de uma página anterior (cursor_proximo / cursor_anterior).
+    """
+    campos = _campos(ordenacao)
+    valores_apos = _ler_cursor(apos) if apos else None
+    valores_antes = _ler_cursor(antes) if antes and not valores_apos else None
+
+    if valores_antes:
+        # Percorre a ordenação invertida e desfaz a inversão no fim
+        invertidos = [(nome, not decrescente) for nome, decrescente in campos]
+        ordem_invertida = [f"{'-' if decrescente else ''}{nome}" for nome, decrescente in invertidos]
+        itens = list(
+            queryset.filter(_filtro_apos(invertidos, valores_antes)).order_by(*ordem_invertida)[:por_pagina + 1]
+        )
+        tem_anterior = len(itens) > por_pagina
+        itens = itens[:por_pagina][::-1]
+        tem_proxima = True
+    else:
+        if valores_apos:
+            queryset = queryset.filter(_filtro_apos(campos, valores_apos))
+        itens = list(queryset.order_by(*ordenacao)[:por_pagina + 1])
+        tem_proxima = len(itens) > por_pagina
+        itens = itens[:por_pagina]
+        tem_anterior = bool(valores_apos)
+
+    if not itens:
+        return PaginaCursor(itens)
+
+    return PaginaCursor(
+        itens,
+        cursor_anterior=signing.dumps(_valores(itens[0], campos), salt=SALT_CURSOR) if tem_anterior else None,
+        cursor_proximo=signing.dumps(_valores(itens[-1], campos), salt=SALT_CURSOR) if tem_proxima else None,
+    )
@@ -0,0 +1,230 @@
+"""
+Previsão de recebimentos a partir dos contratos ativos e das faturas em aberto.
+
+Todos os contratos são projetados de uma vez: a grade contratos × meses é montada
+com arrays do NumPy e o restante (atraso e taxa de pagamento de cada aluno, série
+diária e mensal) é calculado com operações vetorizadas do pandas.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.db.models import DecimalField, F
+from django.db.models.functions import Coalesce
+
+from .models import ContratoAluno, Fatura, FaturaSimples, Pagamento
+
+# Histórico considerado para o atraso médio e a taxa de pagamento de cada aluno
+DIAS_HISTORICO = 365
+
+# Limites do atraso médio usado na projeção (pagamentos adiantados ou muito atrasados)
+ATRASO_MINIMO = -31
+ATRASO_MAXIMO = 90
+
+
+def _dataframe(linhas, colunas):
+    return pd.DataFrame(list(linhas), columns=colunas)
+
+
+def _concatenar(quadros, **kwargs):
+    """pd.concat sem os quadros vazios (o pandas vai mudar os tipos resultantes quando eles entram)."""
+    preenchidos = [quadro for quadro in quadros if not quadro.empty]
+    return pd.concat(preenchidos or quadros[:1], **kwargs)
+
+
+def _comportamento_alunos(personal_trainer, desde, hoje):
+    """
+    Atraso médio (dias após o vencimento) e taxa de pagamento de cada aluno.
+
+    Retorna (DataFrame indexado por aluno_id, atraso geral, taxa geral); os valores
+    gerais valem para alunos sem histórico.
+    """
+    pagamentos = _concatenar([
+        _dataframe(
+            Pagamento.objects.filter(
+                fatura__aluno__personal_trainer=personal_trainer,
+                fatura__data_vencimento__gte=desde
+            ).values_list('fatura__aluno_id', 'data_pagamento', 'fatura__data_vencimento'),
+            ['aluno_id', 'data_pagamento', 'data_vencimento']
+        ),
+        _dataframe(
+            FaturaSimples.objects.filter(
+                personal_trainer=personal_trainer,
+                status='paga',
+                data_pagamento__isnull=False,
+                data_vencimento__gte=desde
+            ).values_list('aluno_id', 'data_pagamento', 'data_vencimento'),
+            ['aluno_id', 'data_pagamento', 'data_vencimento']
+        ),
+    ])
+    pagamentos['atraso'] = (
+        pd.to_datetime(pagamentos['data_pagamento']) - pd.to_datetime(pagamentos['data_vencimento'])
+    ).dt.days.clip(ATRASO_MINIMO, ATRASO_MAXIMO)
+
+    # Fração paga de cada fatura vencida no período
+    faturas = _dataframe(
+        Fatura.objects.filter(
+            aluno__personal_trainer=personal_trainer,
+            data_vencimento__gte=desde,
+            data_vencimento__lt=hoje
+        ).exclude(status='cancelada').values_list('aluno_id', 'valor_pago', 'valor_final'),
+        ['aluno_id', 'valor_pago', 'valor_final']
+    )
+    faturas['pago'] = (
+        faturas['valor_pago'].astype(float) / faturas['valor_final'].astype(float).replace(0, np.nan)
+    ).clip(0, 1).fillna(1)
+    faturas_simples = _dataframe(
+        FaturaSimples.objects.filter(
+            personal_trainer=personal_trainer,
+            data_vencimento__gte=desde,
+            data_vencimento__lt=hoje
+        ).values_list('aluno_id', 'status'),
+        ['aluno_id', 'status']
+    )
+    faturas_simples['pago'] = (faturas_simples['status'] == 'paga').astype(float)
+    vencidas = _concatenar([faturas[['aluno_id', 'pago']], faturas_simples[['aluno_id', 'pago']]])
+
+    # join em vez de concat(axis=1): um dos lados costuma vir vazio para quem tem pouco histórico
+    comportamento = (
+        pagamentos.groupby('aluno_id')['atraso'].mean().astype(float).rename('atraso').to_frame()
+        .join(vencidas.groupby('aluno_id')['pago'].mean().rename('taxa'), how='outer')
+    )
+
+    atraso_geral = float(pagamentos['atraso'].median()) if len(pagamentos) else 0.0
+    taxa_geral = float(vencidas['pago'].mean()) if len(vencidas) else 1.0
+    return comportamento, atraso_geral, taxa_geral
+
+
+def _faturas_em_aberto(personal_trainer):
+    """Saldo das faturas já emitidas e ainda não pagas."""
+    faturas = _dataframe(
+        Fatura.objects.filter(
+            aluno__personal_trainer=personal_trainer,
+            status__in=['pendente', 'atrasada', 'parcial'],
+            valor_final__gt=F('valor_pago')
+        ).annotate(saldo=F('valor_final') - F('valor_pago')).values_list('aluno_id', 'saldo', 'data_vencimento'),
+        ['aluno_id', 'valor', 'data_vencimento']
+    )
+    faturas_simples = _dataframe(
+        FaturaSimples.objects.filter(
+            personal_trainer=personal_trainer
+        ).exclude(status='paga').values_list('aluno_id', 'valor', 'data_vencimento'),
+        ['aluno_id', 'valor', 'data_vencimento']
+    )
+    return _concatenar([faturas, faturas_simples], ignore_index=True)
+
+
+def _parcelas_contratos(personal_trainer, hoje, fim):
+    """
+    Mensalidades dos contratos ativos com vencimento entre hoje e fim que ainda
+    não têm fatura emitida.
+    """
+    contratos = _dataframe(
+        ContratoAluno.objects.filter(
+            aluno__personal_trainer=personal_trainer,
+            aluno__ativo=True,
+            ativo=True
+        ).annotate(
+            valor=Coalesce('valor_personalizado', 'plano_mensalidade__valor', output_field=DecimalField())
+        ).values_list('aluno_id', 'valor', 'dia_vencimento', 'data_inicio', 'data_fim'),
+        ['aluno_id', 'valor', 'dia_vencimento', 'data_inicio', 'data_fim']
+    )
+    if contratos.empty:
+        return pd.DataFrame(columns=['aluno_id', 'valor', 'data_vencimento'])
+
+    meses = pd.date_range(pd.Timestamp(hoje).replace(day=1), pd.Timestamp(fim), freq='MS')
+    inicio_mes = meses.values.astype('datetime64[D]')
+    dias_no_mes = meses.days_in_month.values
+
+    # Grade contratos × meses: vencimento no dia do contrato (ou no último dia do mês)
+    dias = np.clip(contratos['dia_vencimento'].to_numpy(dtype=int), 1, 31)
+    dias = np.minimum(dias[:, None], dias_no_mes[None, :])
+    vencimentos = inicio_mes[None, :] + (dias - 1).astype('timedelta64[D]')
+
+    data_inicio = pd.to_datetime(contratos['data_inicio']).values.astype('datetime64[D]')
+    data_fim = pd.to_datetime(contratos['data_fim']).values.astype('datetime64[D]')
+    validas = (
+        (vencimentos >= np.datetime64(hoje))
+        & (vencimentos <= np.datetime64(fim))
+        & (vencimentos >= data_inicio[:, None])
+        & (np.isnat(data_fim)[:, None] | (vencimentos <= data_fim[:, None]))
+    )
+
+    linhas, colunas = np.nonzero(validas)
+    parcelas = pd.DataFrame({
+        'aluno_id': contratos['aluno_id'].to_numpy()[linhas],
+        'valor': contratos['valor'].to_numpy()[linhas],
+        'data_vencimento': vencimentos[linhas, colunas],
+        'ano': meses.year.values[colunas],
+        'mes': meses.month.values[colunas],
+    })
+
+    # Meses que já têm fatura emitida (paga ou não) entram pelas faturas
+    emitidas = _concatenar([
+        _dataframe(
+            Fatura.objects.filter(
+                aluno__personal_trainer=personal_trainer,
+                data_vencimento__gte=meses[0].date()
+            ).values_list('aluno_id', 'ano_referencia', 'mes_referencia'),
+            ['aluno_id', 'ano', 'mes']
+        ),
+        _dataframe(
+            FaturaSimples.objects.filter(
+                personal_trainer=personal_trainer,
+                data_vencimento__gte=meses[0].date()
+            ).values_list('aluno_id', 'ano_referencia', 'mes_referencia'),
+            ['aluno_id', 'ano', 'mes']
+        ),
+    ]).drop_duplicates()
+    parcelas = parcelas.merge(emitidas, on=['aluno_id', 'ano', 'mes'], how='left', indicator=True)
+    return parcelas.loc[parcelas['_merge'] == 'left_only', ['aluno_id', 'valor', 'data_vencimento']]
+
+
+def calcular_previsao(personal_trainer, hoje, meses=3):
+    """
+    Projeta os recebimentos esperados, dia a dia, de hoje até `meses` meses à frente.
+
+    Cada valor a receber (fatura em aberto ou mensalidade futura de contrato) é
+    deslocado pelo atraso médio do aluno e ponderado pela sua taxa de pagamento.
+    Faturas vencidas cuja data prevista já passou entram como esperadas para hoje.
+    """
+    fim = (pd.Timestamp(hoje) + pd.DateOffset(months=meses)).date()
+    comportamento, atraso_geral, taxa_geral = _comportamento_alunos(
+        personal_trainer, hoje - timedelta(days=DIAS_HISTORICO), hoje
+    )
+
+    em_aberto = _faturas_em_aberto(personal_trainer)
+    parcelas = _parcelas_contratos(personal_trainer, hoje, fim)
+    recebiveis = _concatenar([em_aberto.assign(origem='fatura'), parcelas.assign(origem='contrato')], ignore_index=True)
+    recebiveis['valor'] = recebiveis['valor'].astype(float)
+
+    recebiveis = recebiveis.join(comportamento, on='aluno_id')
+    recebiveis['atraso'] = recebiveis['atraso'].fillna(atraso_geral).round()
+    recebiveis['taxa'] = recebiveis['taxa'].fillna(taxa_geral)
+
+    previstas = pd.to_datetime(recebiveis['data_vencimento']) + pd.to_timedelta(recebiveis['atraso'], unit='D')
+    recebiveis['data_prevista'] = previstas.clip(lower=pd.Timestamp(hoje))
+    recebiveis['esperado'] = recebiveis['valor'] * recebiveis['taxa']
+    recebiveis = recebiveis[recebiveis['data_prevista'] <= pd.Timestamp(fim)]
+
+    dias = pd.date_range(hoje, fim, freq='D')
+    diario = recebiveis.groupby('data_prevista')['esperado'].sum().reindex(dias, fill_value=0.0)
+    mensal = diario.resample('MS').sum()
+
+    return {
+        'data_base': hoje.isoformat(),
+        'data_fim': fim.isoformat(),
+        'meses': meses,
+        'total_previsto': round(float(diario.sum()), 2),
+        'total_em_aberto': round(float(em_aberto['valor'].astype(float).sum()), 2),
+        'total_contratos': round(float(parcelas['valor'].astype(float).sum()), 2),
+        'diario': {
+            'datas': [dia.date().isoformat() for dia in dias],
+            'valores': diario.round(2).tolist(),
+            'acumulado': diario.cumsum().round(2).tolist(),
+        },
+        'mensal': [
+            {'ano': mes.year, 'mes': mes.month, 'valor': round(float(valor), 2)}
+            for mes, valor in mensal.items()
+        ],
+    }
@@ -2,18 +2,26 @@
 Serviços para operações financeiras.
 """
 import os
-from datetime import datetime, timedelta
+import calendar
+import hashlib
+import json
+from collections import Counter
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from django.utils import timezone
-from django.db.models import Sum, Count, Q, Avg
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Count, Q, Avg, F, Value, Case, When, DecimalField, FloatField, Exists, OuterRef
+from django.db.models.functions import Cast, Coalesce, Greatest, Round
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.template.loader import get_template
 from django.http import HttpResponse
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.lib.colors import HexColor
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.lib import colors
@@ -26,13 +34,33 @@ import pandas as pd
 from io import BytesIO
 import base64
 
-from .models import PlanoMensalidade, ContratoAluno, Fatura, Pagamento, FaturaSimples
+from .cache import invalidar_cache_financeiro, obter_ou_calcular
+from .models import (
+    PlanoMensalidade, ContratoAluno, Fatura, Pagamento, FaturaSimples, CheckpointFaturamento,
+    ReceitaMensal, RelatorioFinanceiro, RelatorioFinanceiroPDF, ExtratoBancario, LinhaExtrato, Cobranca,
+    RegistroIdempotencia, LancamentoEncargo, TAMANHO_LOTE_CHAVES,
+)
+from .conciliacao import Conciliador, ler_extrato
+from .previsao import calcular_previsao
+from .coortes import calcular_coortes
 from alunos.models import Aluno
 
 
+def calcular_data_vencimento(ano, mes, dia):
+    """Retorna a data de vencimento, usando o último dia do mês quando o dia não existe (ex: 31 de fevereiro)."""
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    return date(ano, mes, min(dia, ultimo_dia))
+
+
 class FinanceiroService:
     """Serviço para operações financeiras."""
     
+    # Quantidade de faturas inseridas por transação nas gerações em lote
+    TAMANHO_LOTE_FATURAMENTO = 500
+    
+    # Resolução dos gráficos embutidos no PDF (suficiente para impressão em A4)
+    DPI_GRAFICOS = 150
+    
     def __init__(self):
         self.styles = getSampleStyleSheet()
         self._setup_custom_styles()
@@ -69,175 +97,441 @@ class FinanceiroService:
     
     def gerar_faturas_automaticas(self, mes, ano, personal_trainer):
         """Gera faturas automáticas para um mês específico."""
-        faturas_criadas = []
+        faturas_criadas, _ = self._gerar_faturas_mensais(mes, ano, personal_trainer)
+        return faturas_criadas
+    
+    def gerar_faturas_mensais(self, mes, ano, personal_trainer=None, tamanho_lote=None):
+        """
+        Gera as faturas do mês para todos os contratos ativos, de um ou de todos os personal trainers.
+        
+        Retorna um resumo por personal trainer (id) com as faturas criadas, as já existentes e o valor total.
+        """
+        _, resumo = self._gerar_faturas_mensais(mes, ano, personal_trainer, tamanho_lote)
+        return resumo
+    
+    def _gerar_faturas_mensais(self, mes, ano, personal_trainer=None, tamanho_lote=None):
+        """Monta em memória as faturas que faltam no mês e as insere em lotes."""
+        tamanho_lote = tamanho_lote or self.TAMANHO_LOTE_FATURAMENTO
+        inicio_mes = date(ano, mes, 1)
+        fim_mes = calcular_data_vencimento(ano, mes, 31)
         
-        # Buscar contratos ativos (aluno e contrato devem estar ativos)
+        # Contratos vigentes no mês de referência (aluno e contrato devem estar ativos)
         contratos = ContratoAluno.objects.filter(
-            aluno__personal_trainer=personal_trainer,
-            aluno__ativo=True,  # Aluno deve estar ativo
-            ativo=True,  # Contrato deve estar ativo
-            data_inicio__lte=timezone.now().date()
+            aluno__ativo=True,
+            ativo=True,
+            data_inicio__lte=fim_mes
         ).filter(
-            Q(data_fim__isnull=True) | Q(data_fim__gte=timezone.now().date())
+            Q(data_fim__isnull=True) | Q(data_fim__gte=inicio_mes)
+        )
+        
+        # Chaves (aluno, mês, ano) já faturadas, carregadas em uma única consulta
+        faturas_existentes = Fatura.objects.filter(mes_referencia=mes, ano_referencia=ano)
+        
+        if personal_trainer is not None:
+            contratos = contratos.filter(aluno__personal_trainer=personal_trainer)
+            faturas_existentes = faturas_existentes.filter(aluno__personal_trainer=personal_trainer)
+        
+        chaves_faturadas = set(
+            faturas_existentes.values_list('aluno_id', 'mes_referencia', 'ano_referencia')
         )
         
-        for contrato in contratos:
-            # Verificar se já existe fatura para o período
-            fatura_existente = Fatura.objects.filter(
-                aluno=contrato.aluno,
+        novas_faturas = []
+        resumo = {}
+        
+        for contrato_id, aluno_id, trainer_id, dia_vencimento, valor_personalizado, valor_plano in contratos.values_list(
+            'id', 'aluno_id', 'aluno__personal_trainer_id', 'dia_vencimento',
+            'valor_personalizado', 'plano_mensalidade__valor'
+        ).order_by('id'):
+            resumo_trainer = resumo.setdefault(trainer_id, {
+                'faturas_criadas': 0,
+                'faturas_existentes': 0,
+                'valor_total': Decimal('0.00'),
+            })
+            
+            if (aluno_id, mes, ano) in chaves_faturadas:
+                resumo_trainer['faturas_existentes'] += 1
+                continue
+            
+            valor = valor_personalizado or valor_plano
+            
+            # bulk_create não chama save(), então o valor final é calculado aqui
+            novas_faturas.append(Fatura(
+                aluno_id=aluno_id,
+                contrato_id=contrato_id,
                 mes_referencia=mes,
-                ano_referencia=ano
-            ).exists()
+                ano_referencia=ano,
+                valor_original=valor,
+                valor_final=valor,
+                data_vencimento=calcular_data_vencimento(ano, mes, dia_vencimento),
+                status='pendente'
+            ))
             
-            if not fatura_existente:
-                # Calcular data de vencimento
-                try:
-                    data_vencimento = datetime(ano, mes, contrato.dia_vencimento).date()
-                except ValueError:
-                    # Caso o dia não exista no mês (ex: 31 de fevereiro)
-                    data_vencimento = datetime(ano, mes, 28).date()
-                
-                # Criar fatura
-                fatura = Fatura.objects.create(
-                    aluno=contrato.aluno,
-                    contrato=contrato,
-                    mes_referencia=mes,
-                    ano_referencia=ano,
-                    valor_original=contrato.valor_mensalidade,
-                    data_vencimento=data_vencimento,
-                    status='pendente'
-                )
-                
-                faturas_criadas.append(fatura)
+            resumo_trainer['faturas_criadas'] += 1
+            resumo_trainer['valor_total'] += valor
         
-        return faturas_criadas
+        for inicio in range(0, len(novas_faturas), tamanho_lote):
+            with transaction.atomic():
+                lote = Fatura.objects.bulk_create(novas_faturas[inicio:inicio + tamanho_lote])
+                Cobranca.sincronizar(faturas=[fatura.pk for fatura in lote])
+        
+        if novas_faturas:
+            # Uma passada agrupada para o mês, em vez de uma por personal trainer
+            RelatorioFinanceiro.gerar_relatorios((ano, mes), (ano, mes), personal_trainer)
+        
+        for trainer_id, dados in resumo.items():
+            if dados['faturas_criadas']:
+                invalidar_cache_financeiro(trainer_id)
+        
+        return novas_faturas, resumo
     
     def gerar_faturas_automaticas_simples(self, mes, ano, valor_fatura, personal_trainer):
         """Gera faturas automáticas simples para todos os alunos ativos."""
-        faturas_criadas = []
-        
-        # Buscar todos os alunos ativos do personal trainer
-        alunos = Aluno.objects.filter(
-            personal_trainer=personal_trainer,
-            ativo=True
+        alunos_ids = list(
+            Aluno.objects.filter(
+                personal_trainer=personal_trainer,
+                ativo=True
+            ).values_list('id', flat=True)
         )
         
-        for aluno in alunos:
-            # Verificar se já existe fatura para o período
-            fatura_existente = FaturaSimples.objects.filter(
-                aluno=aluno,
+        # Alunos que já possuem fatura para o período
+        alunos_faturados = set(
+            FaturaSimples.objects.filter(
+                personal_trainer=personal_trainer,
                 mes_referencia=mes,
                 ano_referencia=ano
-            ).exists()
-            
-            if not fatura_existente:
-                # Calcular data de vencimento (último dia do mês)
-                try:
-                    if mes == 12:
-                        data_vencimento = datetime(ano + 1, 1, 1) - timedelta(days=1)
-                    else:
-                        data_vencimento = datetime(ano, mes + 1, 1) - timedelta(days=1)
-                except ValueError:
-                    # Caso o dia não exista no mês
-                    data_vencimento = datetime(ano, mes, 28).date()
-                
-                # Criar fatura simples
-                fatura = FaturaSimples.objects.create(
-                    aluno=aluno,
+            ).values_list('aluno_id', flat=True)
+        )
+        
+        faturas_criadas = [
+            self._nova_fatura_simples(aluno_id, personal_trainer.pk, mes, ano, valor_fatura)
+            for aluno_id in alunos_ids
+            if aluno_id not in alunos_faturados
+        ]
+        
+        with transaction.atomic():
+            FaturaSimples.objects.bulk_create(faturas_criadas, batch_size=self.TAMANHO_LOTE_FATURAMENTO)
+            Cobranca.sincronizar(faturas_simples=[fatura.pk for fatura in faturas_criadas])
+        
+        if faturas_criadas:
+            invalidar_cache_financeiro(personal_trainer.pk)
+        
+        return faturas_criadas
+    
+    def gerar_faturas_simples_em_lotes(self, mes, ano, personal_trainer, valor_padrao=None, tamanho_lote=None):
+        """
+        Gera as faturas simples do mês de um personal trainer em lotes.
+        
+        Cada lote é gravado na mesma transação do seu checkpoint, então uma execução
+        interrompida continua a partir do último aluno processado. Depois de uma
+        varredura concluída, a próxima execução percorre os alunos de novo desde o
+        início, para faturar os cadastrados ou reativados depois dela; quem já tem
+        fatura no mês é ignorado. O valor da fatura vem do contrato ativo do aluno
+        ou, na falta dele, de valor_padrao.
+        Retorna a quantidade de faturas criadas nesta execução.
+        """
+        tamanho_lote = tamanho_lote or self.TAMANHO_LOTE_FATURAMENTO
+        
+        checkpoint, _ = CheckpointFaturamento.objects.get_or_create(
+            personal_trainer=personal_trainer,
+            mes_referencia=mes,
+            ano_referencia=ano
+        )
+        if checkpoint.concluido:
+            checkpoint.ultimo_aluno_id = 0
+            checkpoint.concluido = False
+            checkpoint.save(update_fields=['ultimo_aluno_id', 'concluido', 'data_atualizacao'])
+        
+        faturas_criadas = 0
+        
+        while True:
+            lote = list(
+                Aluno.objects.filter(
                     personal_trainer=personal_trainer,
+                    ativo=True,
+                    id__gt=checkpoint.ultimo_aluno_id
+                ).order_by('id').values_list(
+                    'id', 'contrato__ativo', 'contrato__valor_personalizado', 'contrato__plano_mensalidade__valor'
+                )[:tamanho_lote]
+            )
+            
+            if not lote:
+                checkpoint.concluido = True
+                checkpoint.save(update_fields=['concluido', 'data_atualizacao'])
+                break
+            
+            alunos_faturados = set(
+                FaturaSimples.objects.filter(
+                    aluno_id__in=[aluno_id for aluno_id, *_ in lote],
                     mes_referencia=mes,
-                    ano_referencia=ano,
-                    valor=valor_fatura,
-                    data_vencimento=data_vencimento,
-                    status='pendente'
-                )
+                    ano_referencia=ano
+                ).values_list('aluno_id', flat=True)
+            )
+            
+            novas_faturas = []
+            for aluno_id, contrato_ativo, valor_personalizado, valor_plano in lote:
+                if aluno_id in alunos_faturados:
+                    continue
+                
+                valor = (valor_personalizado or valor_plano) if contrato_ativo else valor_padrao
+                if valor is None:
+                    continue
                 
-                faturas_criadas.append(fatura)
+                novas_faturas.append(
+                    self._nova_fatura_simples(aluno_id, personal_trainer.pk, mes, ano, valor)
+                )
+            
+            with transaction.atomic():
+                FaturaSimples.objects.bulk_create(novas_faturas)
+                Cobranca.sincronizar(faturas_simples=[fatura.pk for fatura in novas_faturas])
+                checkpoint.ultimo_aluno_id = lote[-1][0]
+                checkpoint.faturas_criadas += len(novas_faturas)
+                checkpoint.save(update_fields=['ultimo_aluno_id', 'faturas_criadas', 'data_atualizacao'])
+            
+            faturas_criadas += len(novas_faturas)
+        
+        if faturas_criadas:
+            invalidar_cache_financeiro(personal_trainer.pk)
         
         return faturas_criadas
     
-    def atualizar_status_faturas(self):
-        """Atualiza status das faturas baseado na data de vencimento."""
-        hoje = timezone.now().date()
+    def _nova_fatura_simples(self, aluno_id, personal_trainer_id, mes, ano, valor):
+        """Monta (sem salvar) uma fatura simples com vencimento no último dia do mês."""
+        data_vencimento = calcular_data_vencimento(ano, mes, 31)
         
-        # Marcar como atrasadas
-        faturas_atrasadas = Fatura.objects.filter(
-            status='pendente',
-            data_vencimento__lt=hoje
+        # bulk_create não chama save(), então o status é definido como em FaturaSimples.save()
+        status = 'atrasada' if data_vencimento < timezone.now().date() else 'pendente'
+        
+        return FaturaSimples(
+            aluno_id=aluno_id,
+            personal_trainer_id=personal_trainer_id,
+            mes_referencia=mes,
+            ano_referencia=ano,
+            valor=valor,
+            data_vencimento=data_vencimento,
+            status=status
         )
-        faturas_atrasadas.update(status='atrasada')
+    
+    def atualizar_status_faturas(self):
+        """
+        Atualiza o status de Fatura e FaturaSimples pela data de vencimento.
         
-        return faturas_atrasadas.count()
+        Cada transição é um único UPDATE; o retorno traz a quantidade exata de
+        linhas alteradas em cada uma delas.
+        """
+        agora = timezone.now()
+        hoje = agora.date()
+        
+        faturas_atrasadas = Fatura.objects.filter(status='pendente', data_vencimento__lt=hoje)
+        faturas_reabertas = Fatura.objects.filter(status='atrasada', data_vencimento__gte=hoje)
+        faturas_simples_atrasadas = FaturaSimples.objects.filter(status='pendente', data_vencimento__lt=hoje)
+        faturas_simples_reabertas = FaturaSimples.objects.filter(status='atrasada', data_vencimento__gte=hoje)
+        
+        # update() não aciona auto_now, então data_atualizacao é definida aqui
+        with transaction.atomic():
+            # Meses dos relatórios e da receita consolidada afetados pela troca de status
+            chaves_relatorio = set(
+                (faturas_atrasadas | faturas_reabertas).order_by().values_list(
+                    'aluno__personal_trainer_id', 'ano_referencia', 'mes_referencia'
+                ).distinct()
+            )
+            chaves_receita = chaves_relatorio | set(
+                (faturas_simples_atrasadas | faturas_simples_reabertas).order_by().values_list(
+                    'personal_trainer_id', 'ano_referencia', 'mes_referencia'
+                ).distinct()
+            )
+            
+            resultado = {
+                'faturas_atrasadas': faturas_atrasadas.update(
+                    status='atrasada',
+                    data_atualizacao=agora
+                ),
+                'faturas_reabertas': faturas_reabertas.update(
+                    status='pendente',
+                    data_atualizacao=agora
+                ),
+                'faturas_simples_atrasadas': faturas_simples_atrasadas.update(
+                    status='atrasada',
+                    data_atualizacao=agora
+                ),
+                'faturas_simples_reabertas': faturas_simples_reabertas.update(
+                    status='pendente',
+                    data_atualizacao=agora
+                ),
+            }
+            
+            # Mesmas transições no livro de cobranças (as parciais mantêm o status)
+            Cobranca.objects.filter(status='pendente', data_vencimento__lt=hoje).update(
+                status='atrasada',
+                data_atualizacao=agora
+            )
+            Cobranca.objects.filter(status='atrasada', data_vencimento__gte=hoje).update(
+                status='pendente',
+                data_atualizacao=agora
+            )
+            
+            RelatorioFinanceiro.atualizar_faturas(chaves_relatorio, apenas_existentes=True)
+            ReceitaMensal.recalcular(chaves_receita, recebimentos=False)
+        
+        if any(resultado.values()):
+            invalidar_cache_financeiro()
+        
+        return resultado
     
     def calcular_estatisticas_financeiras(self, personal_trainer, mes=None, ano=None):
-        """Calcula estatísticas financeiras do personal trainer."""
-        # Filtros base
-        faturas_qs = Fatura.objects.filter(aluno__personal_trainer=personal_trainer)
-        pagamentos_qs = Pagamento.objects.filter(fatura__aluno__personal_trainer=personal_trainer)
+        """Calcula estatísticas financeiras do personal trainer (em cache até a próxima escrita)."""
+        periodo = (mes, ano) if mes and ano else ('todos', 'todos')
+        return obter_ou_calcular(
+            personal_trainer.pk,
+            'estatisticas',
+            periodo,
+            lambda: self._calcular_estatisticas_financeiras(personal_trainer, mes, ano)
+        )
+    
+    def previsao_recebimentos(self, personal_trainer, meses=3):
+        """
+        Recebimentos esperados dia a dia nos próximos `meses` meses (ver financeiro.previsao).
         
-        if mes and ano:
-            faturas_qs = faturas_qs.filter(mes_referencia=mes, ano_referencia=ano)
-            pagamentos_qs = pagamentos_qs.filter(
-                fatura__mes_referencia=mes,
-                fatura__ano_referencia=ano
-            )
+        Em cache por personal trainer e dia, até a próxima escrita em faturas,
+        pagamentos ou contratos.
+        """
+        hoje = timezone.now().date()
+        return obter_ou_calcular(
+            personal_trainer.pk,
+            'previsao_recebimentos',
+            (hoje.isoformat(), meses),
+            lambda: calcular_previsao(personal_trainer, hoje, meses)
+        )
+    
+    def analise_coortes(self, personal_trainer, meses=12):
+        """
+        Retenção, MRR, churn e ARPU por coorte de início (ver financeiro.coortes).
         
-        # Receita total
-        receita_total = pagamentos_qs.aggregate(
-            total=Sum('valor_pago')
-        )['total'] or Decimal('0.00')
+        Em cache por personal trainer e dia, até a próxima escrita em faturas.
+        """
+        hoje = timezone.now().date()
+        return obter_ou_calcular(
+            personal_trainer.pk,
+            'coortes',
+            (hoje.isoformat(), meses),
+            lambda: calcular_coortes(personal_trainer, hoje, meses)
+        )
+    
+    def _calcular_estatisticas_financeiras(self, personal_trainer, mes=None, ano=None):
+        """Calcula as estatísticas com uma única consulta de agregação condicional no livro de cobranças."""
+        cobrancas = Cobranca.objects.filter(personal_trainer=personal_trainer)
         
-        # Faturas pendentes
-        valor_pendente = faturas_qs.filter(
-            status__in=['pendente', 'atrasada']
-        ).aggregate(
-            total=Sum('valor_final')
-        )['total'] or Decimal('0.00')
+        if mes and ano:
+            cobrancas = cobrancas.filter(mes_referencia=mes, ano_referencia=ano)
         
-        # Faturas pagas
-        valor_recebido = faturas_qs.filter(
-            status='paga'
-        ).aggregate(
-            total=Sum('valor_final')
-        )['total'] or Decimal('0.00')
+        atrasada = Q(status__in=['pendente', 'atrasada'], data_vencimento__lt=timezone.now().date())
         
-        # Inadimplência
-        faturas_atrasadas = faturas_qs.filter(status='atrasada').count()
-        total_faturas = faturas_qs.count()
-        percentual_inadimplencia = (faturas_atrasadas / max(total_faturas, 1)) * 100
+        # valor_pago acumula os pagamentos de cada cobrança, então a receita sai da mesma consulta
+        totais = cobrancas.aggregate(
+            receita_total=Sum('valor_pago'),
+            valor_pendente=Sum('valor', filter=Q(status__in=['pendente', 'atrasada'])),
+            valor_recebido=Sum('valor', filter=Q(status='paga')),
+            faturas_atrasadas=Count('id', filter=atrasada),
+            total_faturas=Count('id'),
+            ticket_medio=Avg('valor'),
+        )
         
-        # Ticket médio
-        ticket_medio = faturas_qs.aggregate(
-            media=Avg('valor_final')
-        )['media'] or Decimal('0.00')
+        faturas_atrasadas = totais['faturas_atrasadas']
+        total_faturas = totais['total_faturas']
+        percentual_inadimplencia = (faturas_atrasadas / max(total_faturas, 1)) * 100
         
         return {
-            'receita_total': receita_total,
-            'valor_pendente': valor_pendente,
-            'valor_recebido': valor_recebido,
+            'receita_total': totais['receita_total'] or Decimal('0.00'),
+            'valor_pendente': totais['valor_pendente'] or Decimal('0.00'),
+            'valor_recebido': totais['valor_recebido'] or Decimal('0.00'),
             'faturas_atrasadas': faturas_atrasadas,
             'total_faturas': total_faturas,
             'percentual_inadimplencia': round(percentual_inadimplencia, 2),
-            'ticket_medio': ticket_medio,
+            'ticket_medio': totais['ticket_medio'] or Decimal('0.00'),
         }
     
     def gerar_relatorio_financeiro(self, personal_trainer, periodo_inicio, periodo_fim):
-        """Gera relatório financeiro em PDF."""
+        """
+        Gera relatório financeiro em PDF e retorna o caminho do arquivo no storage.
+        
+        O nome do arquivo é o hash dos dados do relatório, dentro da pasta do
+        personal trainer; se os dados não mudaram, o PDF existente é reaproveitado.
+        """
+        return self._gerar_pdf_relatorio_financeiro(personal_trainer, periodo_inicio, periodo_fim)[1]
+    
+    def solicitar_relatorio_financeiro(self, personal_trainer, periodo_inicio, periodo_fim):
+        """Registra o pedido do relatório em PDF e enfileira a geração em segundo plano."""
+        from .tasks import gerar_relatorio_financeiro_pdf
+        
+        relatorio = RelatorioFinanceiroPDF.objects.create(
+            personal_trainer=personal_trainer,
+            periodo_inicio=periodo_inicio,
+            periodo_fim=periodo_fim
+        )
+        
+        # Só enfileira após o commit, para o worker encontrar o registro
+        transaction.on_commit(lambda: gerar_relatorio_financeiro_pdf.delay(str(relatorio.pk)))
+        
+        return relatorio
+    
+    def processar_relatorio_financeiro(self, relatorio_id):
+        """Gera o PDF de um pedido de RelatorioFinanceiroPDF (executado pela tarefa do Celery)."""
+        relatorio = RelatorioFinanceiroPDF.objects.select_related('personal_trainer').get(pk=relatorio_id)
+        
+        relatorio.status = 'gerando'
+        relatorio.save(update_fields=['status'])
+        
+        try:
+            chave, caminho = self._gerar_pdf_relatorio_financeiro(
+                relatorio.personal_trainer,
+                relatorio.periodo_inicio,
+                relatorio.periodo_fim
+            )
+        except Exception as e:
+            relatorio.status = 'erro'
+            relatorio.erro = str(e)
+        else:
+            relatorio.status = 'concluido'
+            relatorio.chave_conteudo = chave
+            relatorio.arquivo_pdf.name = caminho
+        
+        relatorio.data_conclusao = timezone.now()
+        relatorio.save(update_fields=['status', 'erro', 'chave_conteudo', 'arquivo_pdf', 'data_conclusao'])
+        
+        return relatorio
+    
+    def _chave_relatorio_financeiro(self, dados):
+        """Hash SHA-256 dos dados que entram no relatório."""
+        conteudo = {
+            'periodo': [str(dados['periodo_inicio']), str(dados['periodo_fim'])],
+            'faturas': [
+                [f.pk, f.status, str(f.valor_final), str(f.valor_pago), str(f.data_vencimento)]
+                for f in dados['faturas']
+            ],
+            'pagamentos': [
+                [p.pk, str(p.valor_pago), str(p.data_pagamento)]
+                for p in dados['pagamentos']
+            ],
+            'estatisticas': {chave: str(valor) for chave, valor in dados['estatisticas'].items()},
+        }
+        return hashlib.sha256(json.dumps(conteudo, sort_keys=True).encode()).hexdigest()
+    
+    def _gerar_pdf_relatorio_financeiro(self, personal_trainer, periodo_inicio, periodo_fim):
+        """Retorna (chave, caminho) do PDF, gerando-o apenas se ainda não existir."""
         # Coletar dados
         dados = self._coletar_dados_financeiros(personal_trainer, periodo_inicio, periodo_fim)
         
-        # Gerar gráficos
-        graficos = self._gerar_graficos_financeiros(dados)
+        chave = self._chave_relatorio_financeiro(dados)
+        caminho = f"relatorios_financeiros/{personal_trainer.pk}/{chave}.pdf"
         
-        # Criar PDF
-        filename = f"relatorio_financeiro_{periodo_inicio}_{periodo_fim}.pdf"
-        filepath = os.path.join(settings.MEDIA_ROOT, 'relatorios_financeiros', filename)
+        if default_storage.exists(caminho):
+            return chave, caminho
         
-        # Garantir que o diretório existe
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Gerar gráficos
+        graficos = self._gerar_graficos_financeiros(dados)
         
-        # Criar PDF
-        doc = SimpleDocTemplate(filepath, pagesize=A4)
+        # Criar PDF em memória e gravar no storage ao final
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
         
         # Cabeçalho
@@ -272,10 +566,20 @@ class FinanceiroService:
         story.append(resumo_table)
         story.append(Spacer(1, 30))
         
+        # Gráficos
+        for nome, altura in (('receita_mensal', 10 * cm), ('status_faturas', 12 * cm)):
+            if nome in graficos:
+                imagem = BytesIO(base64.b64decode(graficos[nome]))
+                story.append(Image(imagem, width=16 * cm, height=altura, kind='proportional'))
+                story.append(Spacer(1, 20))
+        
         # Construir PDF
         doc.build(story)
         
-        return f"relatorios_financeiros/{filename}"
+        # save() não sobrescreve: se outro worker gravou a mesma chave, fica com outro nome
+        caminho = default_storage.save(caminho, ContentFile(buffer.getvalue()))
+        
+        return chave, caminho
     
     def _coletar_dados_financeiros(self, personal_trainer, periodo_inicio, periodo_fim):
         """Coleta dados financeiros para relatório."""
@@ -367,7 +671,7 @@ class FinanceiroService:
         
         # Salvar como base64
         buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
+        plt.savefig(buffer, format='png', dpi=self.DPI_GRAFICOS, bbox_inches='tight')
         buffer.seek(0)
         grafico_base64 = base64.b64encode(buffer.getvalue()).decode()
         plt.close()
@@ -406,119 +710,695 @@ class FinanceiroService:
         
         # Salvar como base64
         buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
+        plt.savefig(buffer, format='png', dpi=self.DPI_GRAFICOS, bbox_inches='tight')
         buffer.seek(0)
         grafico_base64 = base64.b64encode(buffer.getvalue()).decode()
         plt.close()
         
         return grafico_base64
     
-    def registrar_pagamento(self, fatura, valor_pago, data_pagamento, forma_pagamento, observacoes=''):
-        """Registra um pagamento e atualiza status da fatura."""
-        # Criar pagamento
-        pagamento = Pagamento.objects.create(
-            fatura=fatura,
-            valor_pago=valor_pago,
-            data_pagamento=data_pagamento,
-            forma_pagamento=forma_pagamento,
-            observacoes=observacoes
+    def registrar_pagamento(self, fatura, valor_pago, data_pagamento, forma_pagamento, observacoes='',
+                            comprovante=None, chave_idempotencia=None):
+        """
+        Registra um pagamento e atualiza status da fatura.
+        
+        A linha da fatura fica travada (SELECT ... FOR UPDATE) até o fim da transação,
+        então pagamentos simultâneos da mesma fatura são gravados um de cada vez sem
+        bloquear as demais faturas. Com chave_idempotencia, uma repetição da mesma
+        requisição devolve o pagamento registrado na primeira vez.
+        """
+        def registrar():
+            # Pagamento.save() acumula o valor e atualiza o status da fatura
+            pagamento = Pagamento.objects.create(
+                fatura=fatura,
+                valor_pago=valor_pago,
+                data_pagamento=data_pagamento,
+                forma_pagamento=forma_pagamento,
+                observacoes=observacoes,
+                comprovante=comprovante
+            )
+            return {'pagamento_id': pagamento.pk}
+        
+        resultado = self._executar_idempotente(
+            fatura.aluno.personal_trainer_id,
+            chave_idempotencia,
+            'registrar_pagamento',
+            fatura.pk,
+            Fatura.objects.filter(pk=fatura.pk),
+            registrar
         )
         
-        # Calcular total pago
-        total_pago = fatura.pagamentos.aggregate(
-            total=Sum('valor_pago')
-        )['total'] or Decimal('0.00')
+        fatura.refresh_from_db(fields=['valor_pago', 'status', 'data_atualizacao'])
         
-        # Atualizar status da fatura
-        if total_pago >= fatura.valor_final:
-            fatura.status = 'paga'
-        elif total_pago > 0:
-            fatura.status = 'parcial'
+        return Pagamento.objects.get(pk=resultado['pagamento_id'])
+    
+    def marcar_fatura_simples_paga(self, fatura, data_pagamento=None, chave_idempotencia=None):
+        """
+        Marca a fatura simples como paga.
         
-        fatura.save()
+        A troca de status é um UPDATE condicional (só vale se a fatura ainda não
+        estiver paga), então duas requisições simultâneas não contam o pagamento
+        duas vezes. Retorna True se a fatura foi marcada por esta chamada (ou pela
+        chamada original com a mesma chave_idempotencia) e False se já estava paga.
+        """
+        data_pagamento = data_pagamento or timezone.now().date()
         
-        return pagamento
+        def marcar():
+            marcadas = FaturaSimples.objects.filter(pk=fatura.pk).exclude(status='paga').update(
+                status='paga',
+                data_pagamento=data_pagamento,
+                # update() não aciona auto_now
+                data_atualizacao=timezone.now()
+            )
+            if marcadas:
+                # Mesmos efeitos de FaturaSimples.save()
+                Cobranca.sincronizar(faturas_simples=[fatura.pk])
+                invalidar_cache_financeiro(fatura.personal_trainer_id)
+            return {'marcada': bool(marcadas)}
+        
+        resultado = self._executar_idempotente(
+            fatura.personal_trainer_id,
+            chave_idempotencia,
+            'marcar_como_paga',
+            fatura.pk,
+            FaturaSimples.objects.filter(pk=fatura.pk),
+            marcar
+        )
+        
+        fatura.refresh_from_db(fields=['status', 'data_pagamento', 'data_atualizacao'])
+        return resultado['marcada']
+    
+    def _executar_idempotente(self, personal_trainer_id, chave, operacao, objeto_id, travar, executar):
+        """
+        Executa executar() em uma transação, com as linhas de `travar` bloqueadas.
+        
+        Sem chave, apenas executa. Com chave, o resultado (um dict serializável em
+        JSON) é gravado em RegistroIdempotencia junto com a operação e a fatura
+        alvo, na mesma transação; chamadas seguintes com a mesma chave devolvem
+        esse resultado sem executar de novo. A chave é verificada depois do
+        bloqueio, então uma repetição simultânea espera a original terminar e
+        encontra o registro. Reusar a chave em outra operação ou outra fatura
+        levanta ValueError.
+        """
+        try:
+            with transaction.atomic():
+                list(travar.select_for_update())
+                
+                registro = None
+                if chave:
+                    registro = RegistroIdempotencia.objects.filter(
+                        personal_trainer_id=personal_trainer_id,
+                        chave=chave
+                    ).first()
+                
+                if registro is None:
+                    resultado = executar()
+                    if chave:
+                        RegistroIdempotencia.objects.create(
+                            personal_trainer_id=personal_trainer_id,
+                            chave=chave,
+                            operacao=operacao,
+                            objeto_id=objeto_id,
+                            resultado=resultado
+                        )
+                    return resultado
+        except IntegrityError:
+            # Outra requisição com a mesma chave (em outra fatura) gravou primeiro;
+            # esta transação foi desfeita por inteiro
+            registro = RegistroIdempotencia.objects.filter(
+                personal_trainer_id=personal_trainer_id,
+                chave=chave
+            ).first() if chave else None
+            if registro is None:
+                raise
+        
+        if registro.operacao != operacao:
+            raise ValueError('A chave de idempotência já foi usada em outra operação.')
+        if registro.objeto_id != objeto_id:
+            raise ValueError('A chave de idempotência já foi usada em outra fatura.')
+        return registro.resultado
+    
+    def limpar_registros_idempotencia(self, dias=None):
+        """
+        Exclui os registros de idempotência com mais de `dias` dias (padrão:
+        IDEMPOTENCIA_DIAS_RETENCAO) e retorna quantos foram excluídos.
+        
+        Depois disso, uma repetição com a chave antiga é tratada como uma
+        requisição nova.
+        """
+        if dias is None:
+            dias = settings.IDEMPOTENCIA_DIAS_RETENCAO
+        excluidos, _ = RegistroIdempotencia.objects.filter(
+            data_criacao__lt=timezone.now() - timedelta(days=dias)
+        ).delete()
+        return excluidos
+    
+    def reconciliar_valor_pago(self, personal_trainer=None):
+        """Reconstrói o total pago e o status das faturas a partir dos pagamentos."""
+        faturas = Fatura.objects.all()
+        if personal_trainer is not None:
+            faturas = faturas.filter(aluno__personal_trainer=personal_trainer)
+        
+        with transaction.atomic():
+            atualizadas = faturas.reconciliar_valor_pago()
+            
+            # O status das faturas pode ter mudado em qualquer mês já consolidado
+            relatorios = RelatorioFinanceiro.objects.filter(personal_trainer__isnull=False).order_by('ano', 'mes')
+            if personal_trainer is not None:
+                relatorios = relatorios.filter(personal_trainer=personal_trainer)
+            primeiro = relatorios.values_list('ano', 'mes').first()
+            if primeiro is not None:
+                RelatorioFinanceiro.gerar_relatorios(primeiro, relatorios.values_list('ano', 'mes').last(), personal_trainer)
+        
+        invalidar_cache_financeiro(personal_trainer.pk if personal_trainer is not None else None)
+        
+        return atualizadas
+    
+    def importar_extrato(self, personal_trainer, conteudo, nome_arquivo, formato, forma_pagamento='pix'):
+        """
+        Importa um extrato (CSV ou OFX) e concilia os créditos com as faturas em aberto.
+        
+        A conciliação roda em memória sobre as faturas carregadas uma única vez; as
+        faturas casadas são baixadas em uma transação, com atualizações em lote.
+        Lançamentos já importados antes são ignorados. Retorna o ExtratoBancario.
+        """
+        lancamentos = ler_extrato(conteudo, formato)
+        
+        existentes = set()
+        if lancamentos:
+            existentes = set(LinhaExtrato.objects.filter(
+                personal_trainer=personal_trainer,
+                data__gte=min(lancamento.data for lancamento in lancamentos),
+                data__lte=max(lancamento.data for lancamento in lancamentos)
+            ).values_list('identificador', flat=True))
+        
+        conciliador = Conciliador(personal_trainer)
+        linhas = []
+        conciliacoes = []
+        for lancamento in lancamentos:
+            if lancamento.identificador in existentes:
+                continue
+            existentes.add(lancamento.identificador)
+            
+            status, escolhido, candidatos = conciliador.conciliar(lancamento)
+            linha = LinhaExtrato(
+                personal_trainer=personal_trainer,
+                data=lancamento.data,
+                valor=lancamento.valor,
+                descricao=lancamento.descricao,
+                identificador=lancamento.identificador,
+                status=status,
+                candidatos=Conciliador.serializar(candidatos)
+            )
+            linhas.append(linha)
+            if escolhido is not None:
+                conciliacoes.append((linha, escolhido.tipo, escolhido.id))
+        
+        with transaction.atomic():
+            self._aplicar_conciliacoes(personal_trainer, conciliacoes, forma_pagamento)
+            
+            situacoes = Counter(linha.status for linha in linhas)
+            extrato = ExtratoBancario.objects.create(
+                personal_trainer=personal_trainer,
+                nome_arquivo=nome_arquivo[:255],
+                formato=formato,
+                total_linhas=len(linhas),
+                linhas_conciliadas=situacoes['conciliada'],
+                linhas_em_revisao=situacoes['revisao'],
+                linhas_sem_correspondencia=situacoes['sem_correspondencia'],
+                linhas_duplicadas=len(lancamentos) - len(linhas)
+            )
+            for linha in linhas:
+                linha.extrato = extrato
+            LinhaExtrato.objects.bulk_create(linhas, batch_size=500)
+        
+        return extrato
+    
+    def resolver_linha_extrato(self, linha, referencia=None, forma_pagamento='pix'):
+        """
+        Resolve uma linha em revisão: concilia com a fatura candidata escolhida
+        ('simples:12' ou 'fatura:5') ou, sem referência, marca a linha como ignorada.
+        
+        Retorna True se a linha foi conciliada.
+        """
+        if linha.status not in ('revisao', 'sem_correspondencia'):
+            return False
+        if referencia is not None and referencia not in {candidato['referencia'] for candidato in linha.candidatos}:
+            raise ValueError('A fatura escolhida não é candidata desta linha.')
+        
+        status_anterior = linha.status
+        with transaction.atomic():
+            if referencia is None:
+                linha.status = 'ignorada'
+            else:
+                tipo, fatura_id = referencia.split(':')
+                linha.status = 'conciliada'
+                self._aplicar_conciliacoes(linha.personal_trainer, [(linha, tipo, int(fatura_id))], forma_pagamento)
+            
+            if linha.status == status_anterior:
+                return False
+            
+            linha.save(update_fields=['status', 'fatura_simples', 'pagamento'])
+            contadores = {
+                'revisao': 'linhas_em_revisao',
+                'sem_correspondencia': 'linhas_sem_correspondencia',
+                'conciliada': 'linhas_conciliadas',
+            }
+            alteracoes = {contadores[status_anterior]: F(contadores[status_anterior]) - 1}
+            if linha.status in contadores:
+                alteracoes[contadores[linha.status]] = F(contadores[linha.status]) + 1
+            ExtratoBancario.objects.filter(pk=linha.extrato_id).update(**alteracoes)
+        
+        return linha.status == 'conciliada'
+    
+    def _aplicar_conciliacoes(self, personal_trainer, conciliacoes, forma_pagamento):
+        """
+        Baixa as faturas conciliadas. `conciliacoes` traz (linha, tipo, fatura_id).
+        
+        As faturas são travadas e conferidas de novo dentro da transação; as que
+        foram pagas nesse meio tempo deixam a linha sem correspondência. Faturas
+        simples são baixadas com um bulk_update e as faturas com contrato recebem
+        os pagamentos com um bulk_create, seguidos da reconciliação do total pago.
+        """
+        if not conciliacoes:
+            return
+        
+        agora = timezone.now()
+        ids_simples = [fatura_id for _, tipo, fatura_id in conciliacoes if tipo == 'simples']
+        ids_faturas = [fatura_id for _, tipo, fatura_id in conciliacoes if tipo == 'fatura']
+        
+        abertas_simples = {
+            fatura.pk: fatura for fatura in FaturaSimples.objects.select_for_update().filter(
+                personal_trainer=personal_trainer,
+                pk__in=ids_simples
+            ).exclude(status='paga').only('id', 'personal_trainer_id', 'ano_referencia', 'mes_referencia')
+        }
+        abertas = {
+            fatura.pk: fatura for fatura in Fatura.objects.select_for_update().filter(
+                aluno__personal_trainer=personal_trainer,
+                pk__in=ids_faturas,
+                status__in=['pendente', 'atrasada', 'parcial']
+            ).only('id', 'ano_referencia', 'mes_referencia')
+        }
+        
+        faturas_simples = []
+        pagamentos = []
+        for linha, tipo, fatura_id in conciliacoes:
+            if tipo == 'simples' and fatura_id in abertas_simples:
+                fatura = abertas_simples.pop(fatura_id)
+                fatura.status = 'paga'
+                fatura.data_pagamento = linha.data
+                fatura.data_atualizacao = agora
+                faturas_simples.append(fatura)
+                linha.fatura_simples = fatura
+            elif tipo == 'fatura' and fatura_id in abertas:
+                pagamento = Pagamento(
+                    fatura=abertas.pop(fatura_id),
+                    data_pagamento=linha.data,
+                    valor_pago=linha.valor,
+                    forma_pagamento=forma_pagamento,
+                    observacoes=f'Conciliado pelo extrato bancário: {linha.descricao}'
+                )
+                pagamentos.append(pagamento)
+                linha.pagamento = pagamento
+            else:
+                linha.status = 'sem_correspondencia'
+        
+        if faturas_simples:
+            FaturaSimples.objects.bulk_update(
+                faturas_simples, ['status', 'data_pagamento', 'data_atualizacao'], batch_size=500
+            )
+            Cobranca.sincronizar(faturas_simples=[fatura.pk for fatura in faturas_simples])
+        
+        if pagamentos:
+            # bulk_create não chama Pagamento.save(): total pago, status e consolidados são atualizados aqui
+            Pagamento.objects.bulk_create(pagamentos, batch_size=500)
+            
+            Fatura.objects.filter(pk__in=[pagamento.fatura_id for pagamento in pagamentos]).reconciliar_valor_pago()
+            RelatorioFinanceiro.atualizar_faturas({
+                (personal_trainer.pk, pagamento.fatura.ano_referencia, pagamento.fatura.mes_referencia)
+                for pagamento in pagamentos
+            })
+            
+            recebido_por_mes = Counter()
+            for pagamento in pagamentos:
+                recebido_por_mes[pagamento.data_pagamento.replace(day=1)] += pagamento.valor_pago
+            for mes, total in recebido_por_mes.items():
+                RelatorioFinanceiro.acumular_recebimento(personal_trainer.pk, mes, total)
+            ReceitaMensal.recalcular(
+                {(personal_trainer.pk, mes.year, mes.month) for mes in recebido_por_mes},
+                faturamento=False
+            )
+        
+        invalidar_cache_financeiro(personal_trainer.pk)
+    
+    def _faturas_reajustaveis(self, plano, personal_trainer=None):
+        """
+        Faturas futuras, pendentes e sem pagamento dos contratos que seguem o valor do plano.
+        
+        Contratos com valor personalizado ficam de fora (como em valor_mensalidade,
+        valor personalizado zero segue o plano).
+        """
+        faturas = Fatura.objects.filter(
+            Q(contrato__valor_personalizado__isnull=True) | Q(contrato__valor_personalizado=0),
+            contrato__plano_mensalidade=plano,
+            status='pendente',
+            valor_pago=0,
+            data_vencimento__gte=timezone.now().date()
+        )
+        if personal_trainer is not None:
+            faturas = faturas.filter(aluno__personal_trainer=personal_trainer)
+        return faturas
+    
+    def reajustar_faturas_plano(self, plano, valor=None, personal_trainer=None, aplicar=False):
+        """
+        Reajusta para o valor do plano as faturas futuras ainda não pagas dos seus contratos.
+        
+        Sem aplicar, apenas simula: retorna a quantidade de faturas afetadas e os
+        totais atual e novo. Com aplicar, grava valor_original e valor_final
+        (mantendo desconto e acréscimo de cada fatura) em um único UPDATE e
+        atualiza o livro de cobranças e os relatórios mensais afetados.
+        """
+        valor = plano.valor if valor is None else valor
+        faturas = self._faturas_reajustaveis(plano, personal_trainer).exclude(valor_original=valor)
+        
+        resumo = faturas.aggregate(
+            faturas=Count('id'),
+            total_atual=Coalesce(Sum('valor_final'), Value(Decimal('0.00'))),
+            descontos=Coalesce(Sum('desconto'), Value(Decimal('0.00'))),
+            acrescimos=Coalesce(Sum('acrescimo'), Value(Decimal('0.00'))),
+            personal_trainers=Count('aluno__personal_trainer', distinct=True),
+        )
+        resumo['valor'] = valor
+        resumo['total_novo'] = resumo['faturas'] * valor - resumo.pop('descontos') + resumo.pop('acrescimos')
+        resumo['diferenca'] = resumo['total_novo'] - resumo['total_atual']
+        resumo['atualizadas'] = 0
+        
+        if not aplicar or not resumo['faturas']:
+            return resumo
+        
+        with transaction.atomic():
+            chaves = set(
+                faturas.values_list('aluno__personal_trainer_id', 'ano_referencia', 'mes_referencia').distinct()
+            )
+            resumo['atualizadas'] = faturas.update(
+                valor_original=valor,
+                valor_final=Value(valor) - F('desconto') + F('acrescimo'),
+                # update() não aciona auto_now
+                data_atualizacao=timezone.now()
+            )
+            Cobranca.sincronizar(faturas=self._faturas_reajustaveis(plano, personal_trainer))
+            RelatorioFinanceiro.atualizar_faturas(chaves, apenas_existentes=True)
+        
+        for trainer_id in {chave[0] for chave in chaves}:
+            invalidar_cache_financeiro(trainer_id)
+        
+        return resumo
+    
+    def aplicar_encargos_atraso(self, data=None, personal_trainer=None):
+        """
+        Apura multa e juros das faturas vencidas e não pagas (pensado para rodar uma vez por dia).
+        
+        Os encargos de cada fatura são recalculados do zero sobre o saldo em aberto
+        (valor original menos desconto e valor pago, nunca negativo): multa de COBRANCA_MULTA_PERCENTUAL mais juros de
+        COBRANCA_JUROS_MENSAL_PERCENTUAL ao mês, pro rata dia. Como o fator só
+        depende da data de vencimento, cada lote de vencimentos é gravado com um
+        único UPDATE (um CASE por vencimento) que também recalcula valor_final;
+        acréscimos lançados à mão são preservados. Cada alteração fica registrada
+        em LancamentoEncargo. Faturas já apuradas no dia são ignoradas.
+        Retorna a quantidade de faturas alteradas.
+        """
+        hoje = data or timezone.now().date()
+        multa_percentual = settings.COBRANCA_MULTA_PERCENTUAL
+        juros_percentual = settings.COBRANCA_JUROS_MENSAL_PERCENTUAL
+        multa = multa_percentual / 100
+        juros_diario = juros_percentual / 100 / 30
+        
+        faturas = Fatura.objects.filter(
+            status__in=['pendente', 'atrasada', 'parcial'],
+            data_vencimento__lt=hoje
+        ).exclude(
+            Exists(LancamentoEncargo.objects.filter(
+                fatura=OuterRef('pk'), data_referencia=hoje, estornado=False
+            ))
+        )
+        if personal_trainer is not None:
+            faturas = faturas.filter(aluno__personal_trainer=personal_trainer)
+        
+        vencimentos = sorted(faturas.order_by().values_list('data_vencimento', flat=True).distinct())
+        alteradas = 0
+        
+        for inicio in range(0, len(vencimentos), TAMANHO_LOTE_CHAVES):
+            lote = vencimentos[inicio:inicio + TAMANHO_LOTE_CHAVES]
+            fator = Case(
+                *[
+                    When(data_vencimento=vencimento, then=Value(multa + juros_diario * (hoje - vencimento).days))
+                    for vencimento in lote
+                ],
+                output_field=DecimalField(max_digits=12, decimal_places=8)
+            )
+            saldo = Greatest(F('valor_original') - F('desconto') - F('valor_pago'), Value(Decimal('0.00')))
+            encargos = Round(saldo * fator, 2)
+            
+            with transaction.atomic():
+                alvo = faturas.filter(data_vencimento__in=lote)
+                anteriores = {
+                    pk: encargos_anteriores
+                    for pk, encargos_anteriores in alvo.select_for_update(of=('self',)).values_list('pk', 'encargos')
+                }
+                alvo.update(
+                    acrescimo=F('acrescimo') - F('encargos') + encargos,
+                    valor_final=F('valor_original') - F('desconto') + F('acrescimo') - F('encargos') + encargos,
+                    encargos=encargos,
+                    # update() não aciona auto_now
+                    data_atualizacao=timezone.now()
+                )
+                
+                lancamentos = []
+                chaves = set()
+                for pk, encargos_novos, vencimento, trainer_id, ano, mes in Fatura.objects.filter(
+                    pk__in=anteriores
+                ).values_list('pk', 'encargos', 'data_vencimento', 'aluno__personal_trainer_id',
+                              'ano_referencia', 'mes_referencia'):
+                    if encargos_novos == anteriores[pk]:
+                        continue
+                    lancamentos.append(LancamentoEncargo(
+                        fatura_id=pk,
+                        data_referencia=hoje,
+                        dias_atraso=(hoje - vencimento).days,
+                        multa_percentual=multa_percentual,
+                        juros_mensal_percentual=juros_percentual,
+                        encargos_anteriores=anteriores[pk],
+                        encargos_novos=encargos_novos
+                    ))
+                    chaves.add((trainer_id, ano, mes))
+                
+                LancamentoEncargo.objects.bulk_create(lancamentos)
+                Cobranca.sincronizar(faturas=[lancamento.fatura_id for lancamento in lancamentos])
+                RelatorioFinanceiro.atualizar_faturas(chaves, apenas_existentes=True)
+            
+            for trainer_id in {chave[0] for chave in chaves}:
+                invalidar_cache_financeiro(trainer_id)
+            alteradas += len(lancamentos)
+        
+        return alteradas
+    
+    def estornar_encargos(self, data_referencia, personal_trainer=None):
+        """
+        Estorna a apuração de encargos de um dia, voltando cada fatura aos encargos anteriores.
+        
+        Só são estornados os lançamentos que ainda são os mais recentes de cada
+        fatura; apurações posteriores precisam ser estornadas antes. Retorna a
+        quantidade de faturas estornadas.
+        """
+        lancamentos = LancamentoEncargo.objects.filter(
+            data_referencia=data_referencia,
+            estornado=False
+        ).exclude(
+            Exists(LancamentoEncargo.objects.filter(
+                fatura=OuterRef('fatura'),
+                data_referencia__gt=data_referencia,
+                estornado=False
+            ))
+        )
+        if personal_trainer is not None:
+            lancamentos = lancamentos.filter(fatura__aluno__personal_trainer=personal_trainer)
+        
+        pendentes = list(lancamentos.values_list('pk', 'fatura_id', 'encargos_anteriores'))
+        estornados = 0
+        
+        for inicio in range(0, len(pendentes), TAMANHO_LOTE_CHAVES):
+            lote = pendentes[inicio:inicio + TAMANHO_LOTE_CHAVES]
+            anteriores = Case(
+                *[When(pk=fatura_id, then=Value(encargos)) for _, fatura_id, encargos in lote],
+                output_field=DecimalField(max_digits=8, decimal_places=2)
+            )
+            faturas = Fatura.objects.filter(pk__in=[fatura_id for _, fatura_id, _ in lote])
+            
+            with transaction.atomic():
+                chaves = set(faturas.values_list('aluno__personal_trainer_id', 'ano_referencia', 'mes_referencia'))
+                faturas.update(
+                    acrescimo=F('acrescimo') - F('encargos') + anteriores,
+                    valor_final=F('valor_original') - F('desconto') + F('acrescimo') - F('encargos') + anteriores,
+                    encargos=anteriores,
+                    data_atualizacao=timezone.now()
+                )
+                LancamentoEncargo.objects.filter(pk__in=[pk for pk, _, _ in lote]).update(
+                    estornado=True,
+                    data_estorno=timezone.now()
+                )
+                Cobranca.sincronizar(faturas=faturas)
+                RelatorioFinanceiro.atualizar_faturas(chaves, apenas_existentes=True)
+            
+            for trainer_id in {chave[0] for chave in chaves}:
+                invalidar_cache_financeiro(trainer_id)
+            estornados += len(lote)
+        
+        return estornados
+    
+    def sincronizar_cobrancas(self, personal_trainer=None, tamanho_lote=1000, ao_gravar_lote=None):
+        """
+        Copia Fatura e FaturaSimples para o livro de cobranças, em lotes pela chave primária.
+        
+        Cada lote tem a sua própria transação curta e a cópia é um upsert, então o
+        comando pode rodar com o sistema no ar (as escritas novas já são copiadas
+        pelos próprios modelos) e ser interrompido e repetido. Retorna as cobranças gravadas.
+        """
+        origens = [
+            ('faturas', Fatura.objects.all(), 'aluno__personal_trainer'),
+            ('faturas_simples', FaturaSimples.objects.all(), 'personal_trainer'),
+        ]
+        
+        gravadas = 0
+        for origem, queryset, campo_trainer in origens:
+            if personal_trainer is not None:
+                queryset = queryset.filter(**{campo_trainer: personal_trainer})
+            
+            ultimo_id = 0
+            while True:
+                ids = list(
+                    queryset.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:tamanho_lote]
+                )
+                if not ids:
+                    break
+                
+                with transaction.atomic():
+                    gravadas += Cobranca.sincronizar(**{origem: ids})
+                ultimo_id = ids[-1]
+                
+                if ao_gravar_lote is not None:
+                    ao_gravar_lote(origem, gravadas)
+        
+        invalidar_cache_financeiro(personal_trainer.pk if personal_trainer is not None else None)
+        
+        return gravadas
+    
+    def gerar_relatorios_financeiros(self, inicio, fim, personal_trainer=None):
+        """Gera ou atualiza os relatórios mensais de inicio a fim ((ano, mes)) em uma passada agrupada."""
+        return RelatorioFinanceiro.gerar_relatorios(inicio, fim, personal_trainer)
+    
+    def reconstruir_receitas_mensais(self, personal_trainer=None):
+        """Reconstrói a receita mensal consolidada a partir das faturas e pagamentos."""
+        return ReceitaMensal.reconstruir(personal_trainer)
+    
+    ORDENACOES_EXTRATO_ALUNO = ('nome', 'receita_total', 'receita_pendente', 'receita_faturada', 'taxa_pagamento')
+    
+    def extrato_por_aluno(self, personal_trainer, data_inicio=None, data_fim=None,
+                          ordenar_por='nome', limite=None, apenas_ativos=True):
+        """
+        Retorna os alunos anotados com os totais das cobranças do período (Fatura e FaturaSimples).
+        
+        Anotações: receita_total (valor pago), receita_pendente (saldo em aberto),
+        receita_faturada (soma das duas) e taxa_pagamento (%). Cobranças canceladas
+        ficam de fora. O período filtra pela data de vencimento; ordenação ('-campo'
+        para decrescente) e limite são aplicados no banco.
+        """
+        campo_ordenacao = ordenar_por.lstrip('-')
+        if campo_ordenacao not in self.ORDENACOES_EXTRATO_ALUNO:
+            raise ValueError(f'Ordenação inválida: {ordenar_por}')
+        
+        periodo = Q(cobrancas__status__in=[*Cobranca.STATUS_EM_ABERTO, 'paga'])
+        if data_inicio:
+            periodo &= Q(cobrancas__data_vencimento__gte=data_inicio)
+        if data_fim:
+            periodo &= Q(cobrancas__data_vencimento__lte=data_fim)
+        
+        def total(expressao, filtro=Q()):
+            return Coalesce(
+                Sum(expressao, filter=periodo & filtro),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        
+        alunos = Aluno.objects.filter(personal_trainer=personal_trainer)
+        if apenas_ativos:
+            alunos = alunos.filter(ativo=True)
+        
+        alunos = alunos.annotate(
+            receita_total=total('cobrancas__valor_pago'),
+            receita_pendente=total(
+                F('cobrancas__valor') - F('cobrancas__valor_pago'),
+                Q(cobrancas__status__in=Cobranca.STATUS_EM_ABERTO)
+            ),
+        ).annotate(
+            receita_faturada=F('receita_total') + F('receita_pendente'),
+        ).annotate(
+            # Cast evita a divisão inteira do SQLite quando os valores não têm centavos
+            taxa_pagamento=Case(
+                When(
+                    receita_faturada__gt=0,
+                    then=Cast('receita_total', FloatField()) * 100 / Cast('receita_faturada', FloatField())
+                ),
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        ).order_by(ordenar_por, 'nome')
+        
+        if limite:
+            alunos = alunos[:limite]
+        
+        return alunos
     
     def gerar_relatorio_periodo(self, personal_trainer, data_inicio, data_fim):
-        """Gera relatório financeiro para um período específico usando FaturaSimples."""
-        # Filtros base usando FaturaSimples - todas as faturas do período
-        faturas_qs = FaturaSimples.objects.filter(
+        """Gera relatório financeiro para um período específico a partir do livro de cobranças."""
+        # Todas as cobranças do período (Fatura e FaturaSimples), exceto as canceladas
+        faturas_qs = Cobranca.objects.filter(
             personal_trainer=personal_trainer,
             data_vencimento__gte=data_inicio,
             data_vencimento__lte=data_fim
-        ).select_related('aluno')
+        ).exclude(status='cancelada').select_related('aluno')
         
         # Todas as faturas do período (para exibição completa)
-        todas_faturas = faturas_qs.order_by('-data_vencimento')
+        todas_faturas = faturas_qs.com_status_atual().order_by('-data_vencimento', '-id')
         
         # Calcular estatísticas
         receita_total = faturas_qs.filter(
-            status='paga',
             data_pagamento__gte=data_inicio,
             data_pagamento__lte=data_fim
-        ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
+        ).aggregate(total=Sum('valor_pago'))['total'] or Decimal('0.00')
         
-        faturas_pagas = faturas_qs.filter(status='paga').count()
-        faturas_pendentes = faturas_qs.filter(status='pendente').count()
-        faturas_vencidas = faturas_qs.filter(status='atrasada').count()
+        faturas_pagas = faturas_qs.pagas().count()
+        faturas_pendentes = faturas_qs.pendentes().count()
+        faturas_vencidas = faturas_qs.atrasadas().count()
         
-        receita_pendente = faturas_qs.filter(
-            status__in=['pendente', 'atrasada']
-        ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
+        receita_pendente = faturas_qs.em_aberto().aggregate(
+            total=Sum(F('valor') - F('valor_pago'))
+        )['total'] or Decimal('0.00')
         
         total_faturas = faturas_qs.count()
         taxa_inadimplencia = (faturas_vencidas / max(total_faturas, 1)) * 100
         
-        # Receita por mês (últimos 6 meses)
-        receita_por_mes = []
-        mes_atual = data_fim.month
-        ano_atual = data_fim.year
-        
-        for i in range(5, -1, -1):
-            mes_calc = mes_atual - i
-            ano_calc = ano_atual
-            
-            if mes_calc <= 0:
-                mes_calc += 12
-                ano_calc -= 1
-            
-            receita_mes = faturas_qs.filter(
-                status='paga',
-                mes_referencia=mes_calc,
-                ano_referencia=ano_calc
-            ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-            
-            receita_por_mes.append({
-                'mes': f"{mes_calc:02d}/{ano_calc}",
-                'receita': float(receita_mes)
-            })
-        
-        # Receita por aluno
-        receita_por_aluno = []
-        alunos = Aluno.objects.filter(
-            personal_trainer=personal_trainer,
-            ativo=True
-        )
+        # Receita por mês (últimos 6 meses), da receita consolidada
+        receita_por_mes = [
+            {
+                'mes': f"{receita.mes:02d}/{receita.ano}",
+                'receita': float(receita.total_pago)
+            }
+            for receita in ReceitaMensal.objects.serie(personal_trainer, data_fim.year, data_fim.month, meses=6)
+        ]
         
-        for aluno in alunos:
-            faturas_aluno = faturas_qs.filter(aluno=aluno)
-            receita_aluno = faturas_aluno.filter(status='paga').aggregate(
-                total=Sum('valor')
-            )['total'] or Decimal('0.00')
-            
-            pendente_aluno = faturas_aluno.filter(
-                status__in=['pendente', 'atrasada']
-            ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-            
-            total_aluno = receita_aluno + pendente_aluno
-            taxa_pagamento = (receita_aluno / max(total_aluno, 1)) * 100
-            
-            receita_por_aluno.append({
-                'nome': aluno.nome,
-                'receita_total': receita_aluno,
-                'receita_pendente': pendente_aluno,
-                'taxa_pagamento': round(taxa_pagamento, 1)
-            })
+        # Receita por aluno (uma única consulta agrupada)
+        receita_por_aluno = self.extrato_por_aluno(personal_trainer, data_inicio, data_fim)
         
         # Dados para gráfico
         labels_meses = [item['mes'] for item in receita_por_mes]
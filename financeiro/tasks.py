@@ -0,0 +1,13 @@
+"""
+Tarefas em segundo plano (Celery) da gestão financeira.
+"""
+from celery import shared_task
+
+from .services import FinanceiroService
+
+
+@shared_task
+def gerar_relatorio_financeiro_pdf(relatorio_id):
+    """Gera o PDF de um RelatorioFinanceiroPDF pendente."""
+    relatorio = FinanceiroService().processar_relatorio_financeiro(relatorio_id)
+    return relatorio.status
@@ -1,3 +1,276 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from accounts.models import User
+from alunos.models import Aluno
+
+from .models import (
+    Cobranca, ContratoAluno, Fatura, FaturaSimples, LancamentoEncargo, Pagamento, PlanoMensalidade,
+    ReceitaMensal, RegistroIdempotencia
+)
+from .services import FinanceiroService
+
+
+def criar_personal(numero=1):
+    return User.objects.create_user(
+        username=f'personal{numero}',
+        email=f'personal{numero}@teste.com',
+        password='senha',
+        first_name='Personal',
+        last_name=str(numero)
+    )
+
+
+def criar_aluno(personal_trainer, numero=1):
+    return Aluno.objects.create(
+        personal_trainer=personal_trainer,
+        nome=f'Aluno {numero}',
+        email=f'aluno{numero}@teste.com',
+        telefone='11999999999',
+        data_nascimento=date(1990, 1, 1),
+        sexo='M',
+        peso_inicial=Decimal('70.0'),
+        altura=Decimal('1.75'),
+        data_inicio=date(2025, 1, 1)
+    )
+
+
+def criar_fatura(aluno, mes, ano, valor, data_vencimento, **campos):
+    contrato = getattr(aluno, 'contrato', None) or ContratoAluno.objects.create(
+        aluno=aluno,
+        plano_mensalidade=PlanoMensalidade.objects.get_or_create(
+            nome='Mensal', defaults={'valor': valor, 'aulas_incluidas': 8}
+        )[0],
+        data_inicio=date(2025, 1, 1)
+    )
+    return Fatura.objects.create(
+        aluno=aluno,
+        contrato=contrato,
+        mes_referencia=mes,
+        ano_referencia=ano,
+        valor_original=valor,
+        data_vencimento=data_vencimento,
+        **campos
+    )
+
+
+class ReceitaConsolidadaTest(TestCase):
+    """Cartões, gráfico e extrato por aluno contam Fatura e FaturaSimples do mesmo jeito."""
+
+    def setUp(self):
+        self.personal = criar_personal()
+        self.service = FinanceiroService()
+
+        aluno_contrato = criar_aluno(self.personal, 1)
+        fatura = criar_fatura(aluno_contrato, 9, 2026, Decimal('100.00'), date(2026, 9, 10))
+        self.service.registrar_pagamento(fatura, Decimal('100.00'), date(2026, 9, 12), 'pix')
+
+        aluno_simples = criar_aluno(self.personal, 2)
+        fatura_simples = FaturaSimples.objects.create(
+            personal_trainer=self.personal,
+            aluno=aluno_simples,
+            mes_referencia=9,
+            ano_referencia=2026,
+            valor=Decimal('50.00'),
+            data_vencimento=date(2026, 9, 20)
+        )
+        self.service.marcar_fatura_simples_paga(fatura_simples, data_pagamento=date(2026, 9, 20))
+
+    def test_totais_iguais_nas_tres_visoes(self):
+        relatorio = self.service.gerar_relatorio_periodo(self.personal, date(2026, 9, 1), date(2026, 9, 30))
+        estatisticas = self.service.calcular_estatisticas_financeiras(self.personal, 9, 2026)
+        por_aluno = sum(aluno.receita_total for aluno in relatorio['receita_por_aluno'])
+
+        self.assertEqual(relatorio['receita_total'], Decimal('150.00'))
+        self.assertEqual(estatisticas['receita_total'], Decimal('150.00'))
+        self.assertEqual(relatorio['dados_receita'][-1], 150.0)
+        self.assertEqual(por_aluno, Decimal('150.00'))
+
+    def test_reconstrucao_mantem_faturamento(self):
+        receita = ReceitaMensal.objects.get(personal_trainer=self.personal, ano=2026, mes=9)
+        self.service.reconstruir_receitas_mensais(self.personal)
+        reconstruida = ReceitaMensal.objects.get(personal_trainer=self.personal, ano=2026, mes=9)
+
+        self.assertEqual(receita.total_faturado, Decimal('150.00'))
+        self.assertEqual(receita.total_pago, Decimal('150.00'))
+        self.assertEqual(
+            (reconstruida.total_faturado, reconstruida.total_pago, reconstruida.quantidade_faturas),
+            (receita.total_faturado, receita.total_pago, receita.quantidade_faturas)
+        )
+
+
+class PagamentoTest(TestCase):
+    """Pagamentos mantêm o total pago da fatura e da cobrança."""
+
+    def setUp(self):
+        self.personal = criar_personal()
+        self.service = FinanceiroService()
+        self.fatura = criar_fatura(criar_aluno(self.personal), 9, 2026, Decimal('100.00'), date(2026, 9, 10))
+
+    def assertValorPago(self, valor):
+        self.fatura.refresh_from_db()
+        self.assertEqual(self.fatura.valor_pago, valor)
+        self.assertEqual(Cobranca.objects.get(fatura=self.fatura).valor_pago, valor)
+
+    def test_editar_e_excluir_pagamento(self):
+        pagamento = self.service.registrar_pagamento(self.fatura, Decimal('40.00'), date(2026, 9, 12), 'pix')
+        self.assertValorPago(Decimal('40.00'))
+
+        pagamento.valor_pago = Decimal('70.00')
+        pagamento.save()
+        self.assertValorPago(Decimal('70.00'))
+
+        Pagamento.objects.get(pk=pagamento.pk).delete()
+        self.assertValorPago(Decimal('0.00'))
+
+    def test_repeticao_com_a_mesma_chave(self):
+        primeiro = self.service.registrar_pagamento(
+            self.fatura, Decimal('40.00'), date(2026, 9, 12), 'pix', chave_idempotencia='chave-1'
+        )
+        repetido = self.service.registrar_pagamento(
+            self.fatura, Decimal('40.00'), date(2026, 9, 12), 'pix', chave_idempotencia='chave-1'
+        )
+
+        self.assertEqual(repetido.pk, primeiro.pk)
+        self.assertEqual(Pagamento.objects.count(), 1)
+        self.assertValorPago(Decimal('40.00'))
+
+    def test_repeticao_de_marcar_como_paga(self):
+        fatura_simples = FaturaSimples.objects.create(
+            personal_trainer=self.personal,
+            aluno=self.fatura.aluno,
+            mes_referencia=10,
+            ano_referencia=2026,
+            valor=Decimal('50.00'),
+            data_vencimento=date(2026, 10, 10)
+        )
+
+        self.assertTrue(self.service.marcar_fatura_simples_paga(fatura_simples, chave_idempotencia='chave-2'))
+        # Sem a chave a fatura já paga não é marcada de novo; com ela volta o resultado original
+        self.assertFalse(self.service.marcar_fatura_simples_paga(fatura_simples))
+        self.assertTrue(self.service.marcar_fatura_simples_paga(fatura_simples, chave_idempotencia='chave-2'))
+
+    def test_chave_reusada_em_outra_fatura(self):
+        self.service.registrar_pagamento(
+            self.fatura, Decimal('40.00'), date(2026, 9, 12), 'pix', chave_idempotencia='chave-3'
+        )
+        outra = criar_fatura(self.fatura.aluno, 10, 2026, Decimal('100.00'), date(2026, 10, 10))
+
+        with self.assertRaises(ValueError):
+            self.service.registrar_pagamento(
+                outra, Decimal('40.00'), date(2026, 10, 12), 'pix', chave_idempotencia='chave-3'
+            )
+
+    def test_excluir_fatura_com_pagamento(self):
+        self.service.registrar_pagamento(self.fatura, Decimal('40.00'), date(2026, 9, 12), 'pix')
+
+        self.fatura.delete()
+
+        self.assertFalse(Pagamento.objects.exists())
+        self.assertFalse(Cobranca.objects.exists())
+
+
+class RespostaCondicionalTest(TestCase):
+    """Os endpoints AJAX só respondem 304 enquanto os dados não mudam."""
+
+    def setUp(self):
+        self.personal = criar_personal()
+        self.client.force_login(self.personal)
+        self.fatura_simples = FaturaSimples.objects.create(
+            personal_trainer=self.personal,
+            aluno=criar_aluno(self.personal),
+            mes_referencia=9,
+            ano_referencia=2026,
+            valor=Decimal('50.00'),
+            data_vencimento=date(2026, 9, 20)
+        )
+        self.url = reverse('financeiro:ajax_estatisticas_mes', args=[9, 2026])
+
+    def test_etag_muda_apos_exclusao(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.fatura_simples.delete()
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_nao_gera_304(self):
+        resposta = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', resposta)
+
+        self.fatura_simples.delete()
+
+        resposta = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(resposta.status_code, 200)
+
+
+class RegistroIdempotenciaTest(TestCase):
+    """Os registros de idempotência só ficam guardados durante o prazo de retenção."""
+
+    def test_limpeza_exclui_apenas_registros_antigos(self):
+        personal = criar_personal()
+        antigo = RegistroIdempotencia.objects.create(
+            personal_trainer=personal, chave='antiga', operacao='marcar_como_paga', objeto_id=1
+        )
+        RegistroIdempotencia.objects.filter(pk=antigo.pk).update(data_criacao=timezone.now() - timedelta(days=31))
+        RegistroIdempotencia.objects.create(
+            personal_trainer=personal, chave='recente', operacao='marcar_como_paga', objeto_id=1
+        )
+
+        excluidos = FinanceiroService().limpar_registros_idempotencia(dias=30)
+
+        self.assertEqual(excluidos, 1)
+        self.assertEqual(list(RegistroIdempotencia.objects.values_list('chave', flat=True)), ['recente'])
+
+
+@override_settings(COBRANCA_MULTA_PERCENTUAL=Decimal('2.00'), COBRANCA_JUROS_MENSAL_PERCENTUAL=Decimal('1.00'))
+class EncargosAtrasoTest(TestCase):
+    """Multa e juros sobre o saldo em aberto das faturas vencidas."""
+
+    def setUp(self):
+        self.personal = criar_personal()
+        self.service = FinanceiroService()
+        self.fatura = criar_fatura(criar_aluno(self.personal), 9, 2026, Decimal('100.00'), date(2026, 9, 10))
+
+    def assertEncargos(self, encargos):
+        self.fatura.refresh_from_db()
+        self.assertEqual(self.fatura.encargos, encargos)
+        self.assertEqual(self.fatura.valor_final, Decimal('100.00') + encargos)
+        self.assertEqual(Cobranca.objects.get(fatura=self.fatura).valor, Decimal('100.00') + encargos)
+
+    def test_encargos_por_dias_de_atraso(self):
+        # 10 dias: 2% de multa + 1% ao mês pro rata (0,333...%) sobre R$ 100,00
+        self.assertEqual(self.service.aplicar_encargos_atraso(date(2026, 9, 20)), 1)
+        self.assertEncargos(Decimal('2.33'))
+
+    def test_encargos_sobre_o_saldo_em_aberto(self):
+        self.service.registrar_pagamento(self.fatura, Decimal('40.00'), date(2026, 9, 12), 'pix')
+
+        self.service.aplicar_encargos_atraso(date(2026, 9, 20))
+
+        self.assertEncargos(Decimal('1.40'))
+
+    def test_apurar_de_novo_no_mesmo_dia_nao_altera(self):
+        self.service.aplicar_encargos_atraso(date(2026, 9, 20))
+
+        self.assertEqual(self.service.aplicar_encargos_atraso(date(2026, 9, 20)), 0)
+        self.assertEncargos(Decimal('2.33'))
+        self.assertEqual(LancamentoEncargo.objects.count(), 1)
+
+    def test_estorno_recusado_com_apuracao_posterior(self):
+        self.service.aplicar_encargos_atraso(date(2026, 9, 20))
+        self.service.aplicar_encargos_atraso(date(2026, 9, 21))
+        self.assertEncargos(Decimal('2.37'))
+
+        self.assertEqual(self.service.estornar_encargos(date(2026, 9, 20)), 0)
+        self.assertEncargos(Decimal('2.37'))
+
+        self.assertEqual(self.service.estornar_encargos(date(2026, 9, 21)), 1)
+        self.assertEncargos(Decimal('2.33'))
+        self.assertEqual(self.service.estornar_encargos(date(2026, 9, 20)), 1)
+        self.assertEncargos(Decimal('0.00'))
@@ -19,6 +19,11 @@ urlpatterns = [
     # Pagamentos
     path('faturas/<int:fatura_id>/pagar/', views.registrar_pagamento, name='registrar_pagamento'),
     
+    # Extratos bancários (conciliação)
+    path('extratos/importar/', views.importar_extrato, name='importar_extrato'),
+    path('extratos/<int:pk>/', views.extrato_detail, name='extrato_detail'),
+    path('extratos/linhas/<int:pk>/resolver/', views.resolver_linha_extrato, name='resolver_linha_extrato'),
+    
     # Contratos
     path('contratos/', views.lista_contratos, name='lista_contratos'),
     path('contratos/criar/', views.criar_contrato, name='criar_contrato'),
@@ -28,15 +33,23 @@ urlpatterns = [
     path('planos/', views.lista_planos, name='lista_planos'),
     path('planos/criar/', views.criar_plano, name='criar_plano'),
     path('planos/<int:pk>/editar/', views.editar_plano, name='editar_plano'),
+    path('planos/<int:pk>/reajustar/', views.reajustar_plano, name='reajustar_plano'),
     path('planos/<int:pk>/deletar/', views.deletar_plano, name='deletar_plano'),
     
     # Relatórios
     path('relatorio/', views.relatorio_financeiro, name='relatorio_financeiro'),
+    path('relatorio/coortes/', views.analise_coortes, name='analise_coortes'),
     path('inadimplencia/', views.inadimplencia_view, name='inadimplencia'),
+    path('relatorio/pdf/', views.solicitar_relatorio_pdf, name='solicitar_relatorio_pdf'),
+    path('relatorio/pdf/<uuid:pk>/', views.status_relatorio_pdf, name='status_relatorio_pdf'),
+
+    # Exportação
+    path('exportar/<slug:tipo>/<str:formato>/', views.exportar_dados, name='exportar_dados'),
     
     # AJAX
     path('ajax/estatisticas/<int:mes>/<int:ano>/', views.ajax_estatisticas_mes, name='ajax_estatisticas_mes'),
     path('ajax/grafico-receita/', views.ajax_dados_grafico_receita, name='ajax_grafico_receita'),
+    path('ajax/previsao-recebimentos/', views.ajax_previsao_recebimentos, name='ajax_previsao_recebimentos'),
     path('ajax/contrato/<int:pk>/update/', views.ajax_update_contrato, name='ajax_update_contrato'),
     path('ajax/plano/<int:pk>/details/', views.ajax_plano_details, name='ajax_plano_details'),
     path('ajax/plano/<int:pk>/delete/', views.ajax_delete_plano, name='ajax_delete_plano'),
@@ -2,7 +2,9 @@
 Views para gestão financeira.
 """
 import os
+import uuid
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
@@ -15,8 +17,12 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 import json
 
-from .models import PlanoMensalidade, ContratoAluno, Fatura, Pagamento, FaturaSimples
-from .forms import PlanoMensalidadeForm, ContratoAlunoForm, FaturaForm, FaturaSimplesForm, PagamentoForm, FiltroFinanceiroForm, GerarFaturasAutomaticasForm
+from .models import PlanoMensalidade, ContratoAluno, Fatura, Pagamento, FaturaSimples, ReceitaMensal, RelatorioFinanceiroPDF, ExtratoBancario, LinhaExtrato, Cobranca
+from .forms import PlanoMensalidadeForm, ContratoAlunoForm, FaturaForm, FaturaSimplesForm, PagamentoForm, FiltroFinanceiroForm, GerarFaturasAutomaticasForm, ImportarExtratoForm
+from .conciliacao import ErroExtrato
+from .condicional import resposta_json_condicional
+from .exportacao import EXPORTACOES, linhas_exportacao, resposta_csv, resposta_xlsx
+from .paginacao import paginar_por_cursor
 from .services import FinanceiroService
 from alunos.models import Aluno
 
@@ -34,67 +40,40 @@ def dashboard_financeiro(request):
     stats_gerais = service.calcular_estatisticas_financeiras(request.user)
     stats_mes = service.calcular_estatisticas_financeiras(request.user, mes_atual, ano_atual)
     
-    # Faturas recentes (usando FaturaSimples - apenas alunos ativos)
-    faturas_recentes = FaturaSimples.objects.filter(
+    # Livro de cobranças: faturas com contrato e faturas simples (apenas alunos ativos)
+    cobrancas = Cobranca.objects.filter(
         personal_trainer=request.user,
         aluno__ativo=True
-    ).select_related('aluno').order_by('-data_criacao')[:10]
-    
-    # Faturas atrasadas (usando FaturaSimples - apenas alunos ativos)
-    faturas_atrasadas = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        aluno__ativo=True,
-        status='atrasada'
-    ).select_related('aluno').order_by('data_vencimento')[:5]
-    
-    # Pagamentos recentes (usando FaturaSimples - apenas alunos ativos)
-    pagamentos_recentes = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        aluno__ativo=True,
-        status='paga'
-    ).select_related('aluno').order_by('-data_pagamento')[:10]
+    )
     
-    # Alunos ativos (usando FaturaSimples para contar alunos únicos)
-    contratos_ativos = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        aluno__ativo=True
-    ).values('aluno').distinct().count()
+    faturas_recentes = cobrancas.com_status_atual().select_related('aluno').order_by('-data_vencimento', '-id')[:10]
+    faturas_atrasadas = cobrancas.atrasadas().select_related('aluno').order_by('data_vencimento')[:5]
+    pagamentos_recentes = cobrancas.pagas().select_related('aluno').order_by('-data_pagamento')[:10]
     
     # Receita do mês atual (baseada na data de pagamento, não de vencimento)
     data_inicio_mes = hoje.replace(day=1)
     data_fim_mes = (data_inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    em_aberto = Q(status__in=Cobranca.STATUS_EM_ABERTO)
+    
+    # Contadores do topo em uma única consulta
+    totais = cobrancas.aggregate(
+        contratos_ativos=Count('aluno', distinct=True),
+        receita_mes=Sum('valor_pago', filter=Q(data_pagamento__gte=data_inicio_mes, data_pagamento__lte=data_fim_mes)),
+        faturas_pendentes=Count('id', filter=em_aberto & Q(data_vencimento__gte=hoje)),
+        faturas_vencidas=Count('id', filter=em_aberto & Q(data_vencimento__lt=hoje)),
+    )
+    contratos_ativos = totais['contratos_ativos']
+    receita_mes_atual = totais['receita_mes'] or Decimal('0.00')
+    faturas_pendentes = totais['faturas_pendentes']
+    faturas_vencidas = totais['faturas_vencidas']
     
-    receita_mes_atual = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        aluno__ativo=True,
-        status='paga',
-        data_pagamento__gte=data_inicio_mes,
-        data_pagamento__lte=data_fim_mes
-    ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-    
-    # Faturas pendentes (apenas alunos ativos)
-    faturas_pendentes = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        aluno__ativo=True,
-        status='pendente'
-    ).count()
-    
-    # Faturas vencidas (apenas alunos ativos)
-    faturas_vencidas = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        aluno__ativo=True,
-        status='atrasada'
-    ).count()
-    
-    # Receita por forma de pagamento (últimos 30 dias) - usando FaturaSimples (apenas alunos ativos)
+    # Receita por data de pagamento (últimos 30 dias)
     data_limite = hoje - timedelta(days=30)
-    receita_forma_pagamento = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        aluno__ativo=True,
-        status='paga',
+    receita_forma_pagamento = cobrancas.filter(
+        valor_pago__gt=0,
         data_pagamento__gte=data_limite
     ).values('data_pagamento').annotate(
-        total=Sum('valor'),
+        total=Sum('valor_pago'),
         count=Count('id')
     ).order_by('-total')
     
@@ -106,27 +85,10 @@ def dashboard_financeiro(request):
         7: 'Jul', 8: 'Ago', 9: 'Set', 10: 'Out', 11: 'Nov', 12: 'Dez'
     }
     
-    for i in range(5, -1, -1):  # 6 meses atrás até o mês atual
-        mes_calc = hoje.month - i
-        ano_calc = 2025  # Usando o ano fixo 2025 onde existem as faturas
-        
-        # Ajustar ano se o mês for menor que 1
-        if mes_calc <= 0:
-            mes_calc += 12
-            ano_calc -= 1
-        
-        # Calcular receita baseada no mês de referência (não na data de pagamento)
-        # Isso garante que todas as faturas pagas sejam contabilizadas no mês correto
-        receita_mes = FaturaSimples.objects.filter(
-            personal_trainer=request.user,
-            aluno__ativo=True,
-            status='paga',
-            mes_referencia=mes_calc,
-            ano_referencia=ano_calc
-        ).aggregate(total=Sum('valor'))['total'] or 0
-        
-        receitas_ultimos_meses.append(float(receita_mes))
-        nomes_meses.append(meses_abreviados[mes_calc])
+    # Receita consolidada pelo mês de referência: toda fatura paga conta no mês a que se refere
+    for receita in ReceitaMensal.objects.serie(request.user, ano_atual, mes_atual, meses=6):
+        receitas_ultimos_meses.append(float(receita.total_pago))
+        nomes_meses.append(meses_abreviados[receita.mes])
     
     context = {
         'stats_gerais': stats_gerais,
@@ -157,21 +119,16 @@ def lista_faturas(request):
     faturas = FaturaSimples.objects.filter(
         personal_trainer=request.user,
         aluno__ativo=True  # Apenas alunos ativos
-    ).select_related('aluno').order_by('-ano_referencia', '-mes_referencia')
+    ).com_status_atual().select_related('aluno').order_by('-ano_referencia', '-mes_referencia')
     
     # Aplicar filtros
     if filtro_form.is_valid():
-        if filtro_form.cleaned_data['aluno']:
-            faturas = faturas.filter(aluno=filtro_form.cleaned_data['aluno'])
-        
-        if filtro_form.cleaned_data['status']:
-            faturas = faturas.filter(status=filtro_form.cleaned_data['status'])
-        
-        if filtro_form.cleaned_data['mes']:
-            faturas = faturas.filter(mes_referencia=filtro_form.cleaned_data['mes'])
-        
-        if filtro_form.cleaned_data['ano']:
-            faturas = faturas.filter(ano_referencia=filtro_form.cleaned_data['ano'])
+        faturas = faturas.filtrar(
+            status=filtro_form.cleaned_data['status'],
+            aluno=filtro_form.cleaned_data['aluno'],
+            mes=filtro_form.cleaned_data['mes'],
+            ano=filtro_form.cleaned_data['ano']
+        )
         
         # TODO: Adicionar campos de data no formulário se necessário
         # if filtro_form.cleaned_data.get('data_vencimento_inicio'):
@@ -180,15 +137,14 @@ def lista_faturas(request):
         # if filtro_form.cleaned_data.get('data_vencimento_fim'):
         #     faturas = faturas.filter(data_vencimento__lte=filtro_form.cleaned_data['data_vencimento_fim'])
     
-    # Atualizar status das faturas (FaturaSimples já atualiza automaticamente)
-    # service = FinanceiroService()
-    # service.atualizar_status_faturas()
+    # O status exibido é calculado na consulta (com_status_atual); a varredura
+    # periódica fica a cargo do comando atualizar_status_faturas
     
     # Estatísticas da lista filtrada
     total_faturas = faturas.count()
     valor_total = faturas.aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
     faturas_pagas = faturas.filter(status='paga').count()
-    faturas_pendentes = faturas.filter(status__in=['pendente', 'atrasada']).count()
+    faturas_pendentes = faturas.exclude(status='paga').count()
     
     context = {
         'faturas': faturas,
@@ -211,9 +167,9 @@ def fatura_detail(request, pk):
         aluno__personal_trainer=request.user
     )
     
-    # Pagamentos da fatura
+    # Pagamentos da fatura (o total já fica acumulado em fatura.valor_pago)
     pagamentos = fatura.pagamentos.order_by('-data_pagamento')
-    total_pago = pagamentos.aggregate(total=Sum('valor_pago'))['total'] or Decimal('0.00')
+    total_pago = fatura.valor_pago
     saldo_devedor = fatura.valor_final - total_pago
     
     context = {
@@ -279,6 +235,12 @@ def gerar_faturas_automaticas(request):
     return render(request, 'financeiro/gerar_faturas.html', context)
 
 
+def _chave_idempotencia(request):
+    """Chave de idempotência do cabeçalho Idempotency-Key ou do campo do formulário."""
+    chave = request.headers.get('Idempotency-Key') or request.POST.get('chave_idempotencia', '')
+    return chave.strip()[:64] or None
+
+
 @login_required
 def registrar_pagamento(request, fatura_id):
     """Registrar pagamento de uma fatura."""
@@ -289,28 +251,34 @@ def registrar_pagamento(request, fatura_id):
     )
     
     if request.method == 'POST':
-        form = PagamentoForm(request.POST, user=request.user)
+        form = PagamentoForm(request.POST, request.FILES)
+        # Gerada ao exibir o formulário: um reenvio do mesmo formulário não duplica o pagamento
+        chave_idempotencia = _chave_idempotencia(request)
         if form.is_valid():
-            pagamento = form.save()
-            
-            # Atualizar status da fatura usando o serviço
             service = FinanceiroService()
-            service.registrar_pagamento(
-                fatura=pagamento.fatura,
-                valor_pago=pagamento.valor_pago,
-                data_pagamento=pagamento.data_pagamento,
-                forma_pagamento=pagamento.forma_pagamento,
-                observacoes=pagamento.observacoes
-            )
-            
-            messages.success(request, 'Pagamento registrado com sucesso!')
-            return redirect('financeiro:fatura_detail', pk=fatura.pk)
+            try:
+                service.registrar_pagamento(
+                    fatura,
+                    form.cleaned_data['valor_pago'],
+                    form.cleaned_data['data_pagamento'],
+                    form.cleaned_data['forma_pagamento'],
+                    form.cleaned_data['observacoes'],
+                    comprovante=form.cleaned_data['comprovante'],
+                    chave_idempotencia=chave_idempotencia
+                )
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, 'Pagamento registrado com sucesso!')
+                return redirect('financeiro:fatura_detail', pk=fatura.pk)
     else:
-        form = PagamentoForm(user=request.user, initial={'fatura': fatura})
+        form = PagamentoForm(initial={'valor_pago': fatura.saldo_devedor})
+        chave_idempotencia = uuid.uuid4().hex
     
     context = {
         'form': form,
         'fatura': fatura,
+        'chave_idempotencia': chave_idempotencia or uuid.uuid4().hex,
     }
     
     return render(request, 'financeiro/registrar_pagamento.html', context)
@@ -383,6 +351,13 @@ def editar_plano(request, pk):
         if form.is_valid():
             plano = form.save()
             messages.success(request, f'Plano "{plano.nome}" atualizado com sucesso!')
+            
+            # Faturas futuras geradas com o valor anterior: oferecer o reajuste.
+            # O plano é compartilhado, então o reajuste vale para todos os personal trainers.
+            if 'valor' in form.changed_data:
+                resumo = FinanceiroService().reajustar_faturas_plano(plano)
+                if resumo['faturas']:
+                    return redirect('financeiro:reajustar_plano', pk=plano.pk)
             return redirect('financeiro:lista_planos')
     else:
         form = PlanoMensalidadeForm(instance=plano)
@@ -393,6 +368,31 @@ def editar_plano(request, pk):
     })
 
 
+@login_required
+def reajustar_plano(request, pk):
+    """
+    Prévia e aplicação do reajuste das faturas futuras para o valor atual do plano.
+    
+    O plano é compartilhado: o reajuste alcança as faturas de todos os personal
+    trainers com contratos nele, não só as de quem alterou o valor.
+    """
+    plano = get_object_or_404(PlanoMensalidade, pk=pk)
+    service = FinanceiroService()
+    
+    if request.method == 'POST':
+        resumo = service.reajustar_faturas_plano(plano, aplicar=True)
+        messages.success(
+            request,
+            f'{resumo["atualizadas"]} fatura(s) reajustada(s) para R$ {plano.valor}.'
+        )
+        return redirect('financeiro:lista_planos')
+    
+    return render(request, 'financeiro/reajustar_plano.html', {
+        'plano': plano,
+        'resumo': service.reajustar_faturas_plano(plano),
+    })
+
+
 @login_required
 def deletar_plano(request, pk):
     """Deletar plano de mensalidade."""
@@ -453,22 +453,130 @@ def relatorio_financeiro(request):
     return render(request, 'financeiro/relatorio_financeiro.html', context)
 
 
+@login_required
+def analise_coortes(request):
+    """Retenção, MRR, churn e ARPU por coorte de início dos alunos."""
+    try:
+        meses = min(max(int(request.GET.get('meses', 12)), 3), 24)
+    except ValueError:
+        meses = 12
+    
+    service = FinanceiroService()
+    analise = service.analise_coortes(request.user, meses)
+    matrizes = [
+        {
+            'titulo': titulo,
+            'percentual': percentual,
+            'linhas': [
+                {'coorte': coorte['coorte'], 'alunos': coorte['alunos'], 'valores': coorte[chave]}
+                for coorte in analise['coortes']
+            ],
+        }
+        for chave, titulo, percentual in [
+            ('retencao', 'Retenção (% da coorte pagante)', True),
+            ('mrr', 'MRR (R$)', False),
+            ('churn', 'Churn (% dos pagantes do mês anterior)', True),
+            ('arpu', 'ARPU (R$ por pagante)', False),
+        ]
+    ]
+    context = {
+        'analise': analise,
+        'matrizes': matrizes,
+        'meses': meses,
+    }
+    
+    return render(request, 'financeiro/coortes.html', context)
+
+
+@login_required
+def solicitar_relatorio_pdf(request):
+    """Enfileira a geração do relatório financeiro em PDF e retorna o id para acompanhar."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+    
+    hoje = timezone.now().date()
+    try:
+        data_inicio = datetime.strptime(request.POST.get('data_inicio', ''), '%Y-%m-%d').date()
+    except ValueError:
+        data_inicio = hoje.replace(day=1)
+    try:
+        data_fim = datetime.strptime(request.POST.get('data_fim', ''), '%Y-%m-%d').date()
+    except ValueError:
+        data_fim = hoje
+    
+    if data_inicio > data_fim:
+        return JsonResponse({'error': 'A data inicial deve ser anterior à final'}, status=400)
+    
+    service = FinanceiroService()
+    relatorio = service.solicitar_relatorio_financeiro(request.user, data_inicio, data_fim)
+    
+    # No modo eager a tarefa já terminou aqui
+    relatorio.refresh_from_db()
+    
+    return JsonResponse({
+        'id': str(relatorio.pk),
+        'status': relatorio.status,
+        'url_status': reverse('financeiro:status_relatorio_pdf', args=[relatorio.pk]),
+    }, status=202)
+
+
+@login_required
+def status_relatorio_pdf(request, pk):
+    """Retorna o status da geração de um relatório financeiro em PDF."""
+    relatorio = get_object_or_404(RelatorioFinanceiroPDF, pk=pk, personal_trainer=request.user)
+    
+    return JsonResponse({
+        'id': str(relatorio.pk),
+        'status': relatorio.status,
+        'progresso': relatorio.get_status_display(),
+        'url_download': relatorio.url_download,
+        'erro': relatorio.erro,
+    })
+
+
+def _parametro_inteiro(request, nome):
+    valor = request.GET.get(nome, '')
+    return int(valor) if valor.isdigit() else None
+
+
+@login_required
+def exportar_dados(request, tipo, formato):
+    """Exporta faturas, pagamentos, alunos ou presenças em CSV (streaming) ou XLSX."""
+    if tipo not in EXPORTACOES or formato not in ('csv', 'xlsx'):
+        return JsonResponse({'error': 'Exportação inválida'}, status=404)
+
+    # Mesmos filtros das listas de faturas; ids e números inválidos são ignorados
+    filtros = {
+        'status': request.GET.get('status'),
+        'aluno': _parametro_inteiro(request, 'aluno'),
+        'mes': _parametro_inteiro(request, 'mes'),
+        'ano': _parametro_inteiro(request, 'ano'),
+        'data_inicio': request.GET.get('data_inicio'),
+        'data_fim': request.GET.get('data_fim'),
+        'apenas_ativos': request.GET.get('apenas_ativos') == '1',
+    }
+
+    titulo, cabecalho, linhas = linhas_exportacao(tipo, request.user, filtros)
+    nome_arquivo = f"{tipo}_{timezone.now().strftime('%Y%m%d_%H%M')}"
+
+    if formato == 'csv':
+        return resposta_csv(nome_arquivo, cabecalho, linhas)
+    return resposta_xlsx(nome_arquivo, titulo, cabecalho, linhas)
+
+
 @login_required
 def inadimplencia_view(request):
     """Relatório de inadimplência."""
-    from django.core.paginator import Paginator
-    
     # Filtros
     dias_atraso = request.GET.get('dias_atraso')
     valor_minimo = request.GET.get('valor_minimo')
     ordenar = request.GET.get('ordenar', 'dias_atraso')
     
-    # Query base - faturas atrasadas (usando FaturaSimples)
+    # Query base - cobranças atrasadas (livro único de Fatura e FaturaSimples)
     hoje = timezone.now().date()
-    faturas_vencidas = FaturaSimples.objects.filter(
-        personal_trainer=request.user,
-        status='atrasada'
-    ).select_related('aluno')
+    faturas_vencidas = Cobranca.objects.filter(
+        personal_trainer=request.user
+    ).atrasadas().select_related('aluno')
     
     # Aplicar filtros
     if dias_atraso:
@@ -478,56 +586,45 @@ def inadimplencia_view(request):
     if valor_minimo:
         faturas_vencidas = faturas_vencidas.filter(valor__gte=valor_minimo)
     
-    # O campo dias_atraso já é calculado automaticamente pela propriedade do modelo
-    
-    # Ordenação
-    if ordenar == 'dias_atraso':
-        faturas_vencidas = sorted(faturas_vencidas, key=lambda f: f.dias_atraso, reverse=True)
-    elif ordenar == 'valor':
-        faturas_vencidas = faturas_vencidas.order_by('-valor')
-    elif ordenar == 'vencimento':
-        faturas_vencidas = faturas_vencidas.order_by('data_vencimento')
-    elif ordenar == 'aluno':
-        faturas_vencidas = faturas_vencidas.order_by('aluno__nome')
-    
-    # Paginação
-    paginator = Paginator(faturas_vencidas, 20)
-    page_number = request.GET.get('page')
-    faturas_vencidas = paginator.get_page(page_number)
+    # Ordenação no banco; 'id' desempata e torna a ordem estável para o cursor.
+    # Maior atraso equivale ao vencimento mais antigo.
+    ordenacoes = {
+        'dias_atraso': ['data_vencimento', 'id'],
+        'valor': ['-valor', 'id'],
+        'vencimento': ['data_vencimento', 'id'],
+        'aluno': ['aluno__nome', 'id'],
+    }
     
-    # Estatísticas resumo (usando FaturaSimples)
-    todas_faturas = FaturaSimples.objects.filter(personal_trainer=request.user)
-    total_faturas = todas_faturas.count()
-    total_vencidas = todas_faturas.filter(status='atrasada').count()
+    # Paginação por cursor (não depende de OFFSET)
+    total_filtradas = faturas_vencidas.count()
+    faturas_vencidas = paginar_por_cursor(
+        faturas_vencidas,
+        ordenacoes.get(ordenar, ordenacoes['dias_atraso']),
+        apos=request.GET.get('apos'),
+        antes=request.GET.get('antes'),
+        por_pagina=20
+    )
     
-    total_em_atraso = todas_faturas.filter(status='atrasada').aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
+    # Filtros atuais, repetidos nos links de paginação
+    parametros = request.GET.copy()
+    for chave in ('apos', 'antes', 'page'):
+        parametros.pop(chave, None)
     
-    clientes_inadimplentes = todas_faturas.filter(status='atrasada').values('aluno').distinct().count()
+    # Estatísticas resumo (livro de cobranças) em uma única consulta
+    resumo = Cobranca.objects.filter(personal_trainer=request.user).resumo_inadimplencia()
     
-    total_clientes = Aluno.objects.filter(
+    resumo['total_clientes'] = Aluno.objects.filter(
         personal_trainer=request.user,
         ativo=True
     ).count()
     
-    taxa_inadimplencia = (total_vencidas / max(total_faturas, 1)) * 100
-    
-    # Calcular média de dias em atraso
-    faturas_com_atraso = todas_faturas.filter(status='atrasada')
-    
-    total_dias_atraso = sum((hoje - f.data_vencimento).days for f in faturas_com_atraso)
-    media_dias_atraso = total_dias_atraso // max(faturas_com_atraso.count(), 1)
-    
-    resumo = {
-        'total_em_atraso': total_em_atraso,
-        'faturas_vencidas': total_vencidas,
-        'clientes_inadimplentes': clientes_inadimplentes,
-        'total_clientes': total_clientes,
-        'taxa_inadimplencia': round(taxa_inadimplencia, 2),
-        'media_dias_atraso': media_dias_atraso,
-    }
+    taxa_inadimplencia = (resumo['faturas_vencidas'] / max(resumo['total_faturas'], 1)) * 100
+    resumo['taxa_inadimplencia'] = round(taxa_inadimplencia, 2)
     
     context = {
         'faturas_vencidas': faturas_vencidas,
+        'total_filtradas': total_filtradas,
+        'parametros': parametros.urlencode(),
         'resumo': resumo,
     }
     
@@ -582,10 +679,9 @@ def ajax_update_contrato(request, pk):
 @login_required
 def ajax_plano_details(request, pk):
     """Detalhes do plano via AJAX."""
-    try:
+    def calcular():
         plano = get_object_or_404(PlanoMensalidade, pk=pk)
-        
-        return JsonResponse({
+        return {
             'success': True,
             'plano': {
                 'id': plano.id,
@@ -595,7 +691,12 @@ def ajax_plano_details(request, pk):
                 'descricao': plano.descricao,
                 'ativo': plano.ativo,
             }
-        })
+        }
+    
+    try:
+        return resposta_json_condicional(
+            request, 'plano', [pk], PlanoMensalidade.objects.filter(pk=pk), calcular
+        )
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
@@ -633,44 +734,129 @@ def ajax_delete_plano(request, pk):
 
 # AJAX Views
 @login_required
-def ajax_estatisticas_mes(request):
-    """Retorna estatísticas do mês via AJAX."""
-    mes = int(request.GET.get('mes', timezone.now().month))
-    ano = int(request.GET.get('ano', timezone.now().year))
+def ajax_estatisticas_mes(request, mes=None, ano=None):
+    """Retorna estatísticas do mês via AJAX (304 se o navegador já tem a versão atual)."""
+    mes = mes or int(request.GET.get('mes', timezone.now().month))
+    ano = ano or int(request.GET.get('ano', timezone.now().year))
     
     service = FinanceiroService()
-    stats = service.calcular_estatisticas_financeiras(request.user, mes, ano)
+    # A data entra na versão porque o atraso das faturas muda com o dia
+    return resposta_json_condicional(
+        request, 'estatisticas', [mes, ano, timezone.now().date()],
+        Cobranca.objects.filter(personal_trainer=request.user),
+        lambda: service.calcular_estatisticas_financeiras(request.user, mes, ano)
+    )
+
+
+@login_required
+def ajax_previsao_recebimentos(request):
+    """AJAX: previsão de recebimentos dia a dia para o dashboard."""
+    try:
+        meses = min(max(int(request.GET.get('meses', 3)), 1), 12)
+    except ValueError:
+        meses = 3
     
-    return JsonResponse(stats, safe=False)
+    service = FinanceiroService()
+    return JsonResponse(service.previsao_recebimentos(request.user, meses))
 
 
 @login_required
 def ajax_dados_grafico_receita(request):
-    """Retorna dados para gráfico de receita via AJAX."""
-    # Últimos 12 meses
+    """Retorna dados para gráfico de receita via AJAX (304 se o navegador já tem a versão atual)."""
+    # Últimos 12 meses, da receita consolidada
     hoje = timezone.now().date()
-    data_inicio = hoje.replace(day=1) - timedelta(days=365)
-    
-    pagamentos = Pagamento.objects.filter(
-        fatura__aluno__personal_trainer=request.user,
-        data_pagamento__gte=data_inicio,
-        data_pagamento__lte=hoje
-    ).values('data_pagamento__year', 'data_pagamento__month').annotate(
-        total=Sum('valor_pago')
-    ).order_by('data_pagamento__year', 'data_pagamento__month')
-    
-    dados = []
-    for p in pagamentos:
-        dados.append({
-            'mes': f"{p['data_pagamento__month']:02d}/{p['data_pagamento__year']}",
-            'valor': float(p['total'])
-        })
     
-    return JsonResponse(dados, safe=False)
+    def calcular():
+        return [
+            {
+                'mes': f"{receita.mes:02d}/{receita.ano}",
+                'valor': float(receita.total_recebido)
+            }
+            for receita in ReceitaMensal.objects.serie(request.user, hoje.year, hoje.month)
+        ]
+    
+    return resposta_json_condicional(
+        request, 'grafico_receita', [hoje.year, hoje.month],
+        ReceitaMensal.objects.filter(personal_trainer=request.user),
+        calcular, safe=False
+    )
 
 
 # ===== VIEWS SIMPLIFICADAS PARA FATURAS =====
 
+@login_required
+def importar_extrato(request):
+    """Importa um extrato bancário ou de PIX e concilia com as faturas em aberto."""
+    if request.method == 'POST':
+        form = ImportarExtratoForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            service = FinanceiroService()
+            try:
+                extrato = service.importar_extrato(
+                    request.user,
+                    arquivo.read(),
+                    arquivo.name,
+                    form.formato,
+                    form.cleaned_data['forma_pagamento']
+                )
+            except ErroExtrato as erro:
+                form.add_error('arquivo', str(erro))
+            else:
+                messages.success(
+                    request,
+                    f'{extrato.linhas_conciliadas} de {extrato.total_linhas} lançamento(s) conciliado(s); '
+                    f'{extrato.linhas_em_revisao} aguardando revisão.'
+                )
+                return redirect('financeiro:extrato_detail', pk=extrato.pk)
+    else:
+        form = ImportarExtratoForm()
+    
+    context = {
+        'form': form,
+        'extratos': ExtratoBancario.objects.filter(personal_trainer=request.user)[:10],
+        'linhas_em_revisao': LinhaExtrato.objects.filter(personal_trainer=request.user, status='revisao').count(),
+    }
+    
+    return render(request, 'financeiro/importar_extrato.html', context)
+
+
+@login_required
+def extrato_detail(request, pk):
+    """Resultado da conciliação de um extrato, com a fila de revisão."""
+    extrato = get_object_or_404(ExtratoBancario, pk=pk, personal_trainer=request.user)
+    linhas = extrato.linhas.select_related('fatura_simples__aluno', 'pagamento__fatura__aluno')
+    
+    context = {
+        'extrato': extrato,
+        'linhas_revisao': [linha for linha in linhas if linha.status == 'revisao'],
+        'linhas': [linha for linha in linhas if linha.status != 'revisao'],
+    }
+    
+    return render(request, 'financeiro/extrato_detail.html', context)
+
+
+@login_required
+def resolver_linha_extrato(request, pk):
+    """Concilia uma linha em revisão com a fatura escolhida ou a ignora."""
+    linha = get_object_or_404(LinhaExtrato, pk=pk, personal_trainer=request.user)
+    
+    if request.method == 'POST':
+        service = FinanceiroService()
+        referencia = None if 'ignorar' in request.POST else request.POST.get('referencia')
+        try:
+            if service.resolver_linha_extrato(linha, referencia):
+                messages.success(request, 'Lançamento conciliado!')
+            elif linha.status == 'ignorada':
+                messages.info(request, 'Lançamento ignorado.')
+            else:
+                messages.error(request, 'A fatura escolhida já foi paga.')
+        except ValueError:
+            messages.error(request, 'Escolha uma das faturas sugeridas.')
+    
+    return redirect('financeiro:extrato_detail', pk=linha.extrato_id)
+
+
 class FinanceiroListView(LoginRequiredMixin, ListView):
     """Lista todas as faturas simples do personal trainer."""
     model = FaturaSimples
@@ -681,26 +867,15 @@ class FinanceiroListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         queryset = FaturaSimples.objects.filter(
             personal_trainer=self.request.user
-        ).select_related('aluno').order_by('-ano_referencia', '-mes_referencia')
+        ).com_status_atual().select_related('aluno').order_by('-ano_referencia', '-mes_referencia')
         
         # Filtros
-        status = self.request.GET.get('status')
-        if status:
-            queryset = queryset.filter(status=status)
-        
-        aluno_id = self.request.GET.get('aluno')
-        if aluno_id:
-            queryset = queryset.filter(aluno_id=aluno_id)
-        
-        mes = self.request.GET.get('mes')
-        if mes:
-            queryset = queryset.filter(mes_referencia=mes)
-        
-        ano = self.request.GET.get('ano')
-        if ano:
-            queryset = queryset.filter(ano_referencia=ano)
-        
-        return queryset
+        return queryset.filtrar(
+            status=self.request.GET.get('status'),
+            aluno=self.request.GET.get('aluno'),
+            mes=self.request.GET.get('mes'),
+            ano=self.request.GET.get('ano')
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -729,9 +904,9 @@ class FinanceiroListView(LoginRequiredMixin, ListView):
         faturas = self.get_queryset()
         context['total_faturas'] = faturas.count()
         context['total_valor'] = faturas.aggregate(total=Sum('valor'))['total'] or 0
-        context['faturas_pendentes'] = faturas.filter(status='pendente').count()
-        context['faturas_atrasadas'] = faturas.filter(status='atrasada').count()
-        context['faturas_pagas'] = faturas.filter(status='paga').count()
+        context['faturas_pendentes'] = faturas.pendentes().count()
+        context['faturas_atrasadas'] = faturas.atrasadas().count()
+        context['faturas_pagas'] = faturas.pagas().count()
         
         return context
 
@@ -795,26 +970,24 @@ def dashboard_financeiro_simples(request):
     
     # Estatísticas básicas
     total_faturas = faturas.count()
-    faturas_pendentes = faturas.filter(status='pendente').count()
-    faturas_atrasadas = faturas.filter(status='atrasada').count()
-    faturas_pagas = faturas.filter(status='paga').count()
+    faturas_pendentes = faturas.pendentes().count()
+    faturas_atrasadas = faturas.atrasadas().count()
+    faturas_pagas = faturas.pagas().count()
     
     # Valores
     valor_total = faturas.aggregate(total=Sum('valor'))['total'] or 0
-    valor_pendente = faturas.filter(status='pendente').aggregate(total=Sum('valor'))['total'] or 0
-    valor_atrasado = faturas.filter(status='atrasada').aggregate(total=Sum('valor'))['total'] or 0
-    valor_pago = faturas.filter(status='paga').aggregate(total=Sum('valor'))['total'] or 0
+    valor_pendente = faturas.pendentes().aggregate(total=Sum('valor'))['total'] or 0
+    valor_atrasado = faturas.atrasadas().aggregate(total=Sum('valor'))['total'] or 0
+    valor_pago = faturas.pagas().aggregate(total=Sum('valor'))['total'] or 0
     
     # Faturas recentes
-    faturas_recentes = faturas.order_by('-data_criacao')[:5]
+    faturas_recentes = faturas.com_status_atual().order_by('-data_criacao')[:5]
     
     # Faturas vencendo em 7 dias
     hoje = timezone.now().date()
     data_limite = hoje + timedelta(days=7)
-    faturas_vencendo = faturas.filter(
-        data_vencimento__lte=data_limite,
-        data_vencimento__gte=hoje,
-        status='pendente'
+    faturas_vencendo = faturas.pendentes().filter(
+        data_vencimento__lte=data_limite
     ).order_by('data_vencimento')
     
     context = {
@@ -835,15 +1008,19 @@ def dashboard_financeiro_simples(request):
 
 @login_required
 def marcar_como_paga(request, fatura_id):
-    """AJAX para marcar fatura como paga."""
+    """AJAX para marcar fatura como paga (aceita o cabeçalho Idempotency-Key)."""
     if request.method == 'POST':
         fatura = get_object_or_404(FaturaSimples, id=fatura_id, personal_trainer=request.user)
         
-        if fatura.status != 'paga':
-            fatura.status = 'paga'
-            fatura.data_pagamento = timezone.now().date()
-            fatura.save()
-            
+        service = FinanceiroService()
+        try:
+            marcada = service.marcar_fatura_simples_paga(
+                fatura, chave_idempotencia=_chave_idempotencia(request)
+            )
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+        
+        if marcada:
             return JsonResponse({
                 'success': True,
                 'message': 'Fatura marcada como paga!'
@@ -0,0 +1,68 @@
+"""
+Cache versionado por personal trainer, compartilhado pelos apps.
+
+Cada espaço de nomes (ex.: 'financeiro', 'frequencia') tem uma versão global e
+uma versão por personal trainer, que entram em todas as chaves; qualquer escrita
+troca a versão e, com isso, todas as entradas antigas deixam de ser lidas (e
+expiram sozinhas).
+"""
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+TEMPO_CACHE = 60 * 15
+
+
+def _chave_versao(namespace, personal_trainer_id=None):
+    if personal_trainer_id is None:
+        return f'{namespace}:versao'
+    return f'{namespace}:versao:{personal_trainer_id}'
+
+
+def _versao(chave):
+    versao = cache.get(chave)
+    if versao is None:
+        # Versão inicial imprevisível, para não reaproveitar entradas de antes de uma limpeza do cache
+        cache.add(chave, time.time_ns(), None)
+        versao = cache.get(chave)
+    return versao
+
+
+def _incrementar(chave):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, time.time_ns(), None)
+
+
+def versao(namespace, personal_trainer_id):
+    """Versão atual dos dados do personal trainer no espaço de nomes."""
+    return f'{_versao(_chave_versao(namespace))}.{_versao(_chave_versao(namespace, personal_trainer_id))}'
+
+
+def chave_cache(namespace, personal_trainer_id, nome, *partes):
+    """Monta a chave de cache de uma consulta do personal trainer na versão atual."""
+    sufixo = ':'.join(str(parte) for parte in partes)
+    return f'{namespace}:{nome}:{personal_trainer_id}:{versao(namespace, personal_trainer_id)}:{sufixo}'
+
+
+def obter_ou_calcular(namespace, personal_trainer_id, nome, partes, calcular, timeout=TEMPO_CACHE):
+    """Retorna o valor em cache ou o calcula e guarda."""
+    chave = chave_cache(namespace, personal_trainer_id, nome, *partes)
+    valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave, valor, timeout)
+    return valor
+
+
+def invalidar(namespace, personal_trainer_id=None):
+    """
+    Invalida o cache de um personal trainer (ou de todos, sem personal trainer).
+
+    A troca de versão só acontece após o commit, para que uma leitura concorrente
+    não guarde dados de antes da escrita.
+    """
+    transaction.on_commit(partial(_incrementar, _chave_versao(namespace, personal_trainer_id)))
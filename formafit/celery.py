@@ -0,0 +1,14 @@
+"""
+Configuração do Celery para as tarefas em segundo plano do FormaFit.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'formafit.settings')
+
+app = Celery('formafit')
+
+# Configurações com prefixo CELERY_ no settings.py
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -4,6 +4,7 @@ Sistema completo para personal trainers - Gestão de alunos, treinos e finanças
 """
 
 import os
+from decimal import Decimal
 from pathlib import Path
 from decouple import config
 
@@ -34,6 +35,7 @@ INSTALLED_APPS = [
     'relatorios',
     'frequencia',
     'financeiro',
+    'notificacoes',
 ]
 
 MIDDLEWARE = [
@@ -88,6 +90,31 @@ DATABASES = {
 #     }
 # }
 
+# Cache (Redis quando REDIS_URL estiver configurado; memória local caso contrário)
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Celery (tarefas em segundo plano). Sem broker configurado as tarefas rodam no
+# próprio processo (modo eager), o que basta para desenvolvimento local.
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=not CELERY_BROKER_URL, cast=bool)
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TIMEZONE = 'America/Sao_Paulo'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -140,5 +167,18 @@ CORS_ALLOW_CREDENTIALS = True
 CHATPRO_API_KEY = config('CHATPRO_API_KEY')
 CHATPRO_API_URL = config('CHATPRO_API_URL')
 
+# Régua de cobrança: intervalo (dias) entre os lembretes de uma fatura vencida
+COBRANCA_INTERVALO_LEMBRETES_DIAS = config('COBRANCA_INTERVALO_LEMBRETES_DIAS', default=7, cast=int)
+
+# Encargos por atraso das faturas: multa única (% do valor) e juros mensais pro rata dia
+COBRANCA_MULTA_PERCENTUAL = config('COBRANCA_MULTA_PERCENTUAL', default='2.00', cast=Decimal)
+COBRANCA_JUROS_MENSAL_PERCENTUAL = config('COBRANCA_JUROS_MENSAL_PERCENTUAL', default='1.00', cast=Decimal)
+
+# Idempotência dos pagamentos: por quantos dias os resultados gravados ficam disponíveis para repetições
+IDEMPOTENCIA_DIAS_RETENCAO = config('IDEMPOTENCIA_DIAS_RETENCAO', default=30, cast=int)
+
+# Agenda: quantas semanas à frente as aulas recorrentes (horários padrão) ficam criadas
+AGENDA_HORIZONTE_SEMANAS = config('AGENDA_HORIZONTE_SEMANAS', default=8, cast=int)
+
 # Email Configuration (for notifications)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend' if DEBUG else 'django.core.mail.backends.smtp.EmailBackend'
@@ -0,0 +1,26 @@
+"""
+Cache das estatísticas de frequência por personal trainer.
+
+Usa o cache versionado de formafit.cache no espaço de nomes 'frequencia':
+qualquer escrita em agendamentos, presenças ou horários padrão troca a versão
+do personal trainer.
+"""
+from formafit import cache as cache_versionado
+from formafit.cache import TEMPO_CACHE
+
+NAMESPACE = 'frequencia'
+
+
+def versao_frequencia(personal_trainer_id):
+    """Versão atual dos dados de frequência do personal trainer."""
+    return cache_versionado.versao(NAMESPACE, personal_trainer_id)
+
+
+def obter_ou_calcular(personal_trainer_id, nome, partes, calcular, timeout=TEMPO_CACHE):
+    """Retorna o valor em cache ou o calcula e guarda."""
+    return cache_versionado.obter_ou_calcular(NAMESPACE, personal_trainer_id, nome, partes, calcular, timeout)
+
+
+def invalidar_cache_frequencia(personal_trainer_id):
+    """Invalida o cache de frequência do personal trainer após o commit."""
+    cache_versionado.invalidar(NAMESPACE, personal_trainer_id)
@@ -0,0 +1,81 @@
+"""
+Detecção de conflitos de horário na agenda do personal trainer.
+
+Duas aulas do mesmo personal trainer conflitam quando estão no mesmo dia e os
+intervalos [início, fim) se sobrepõem. Aulas canceladas ou remarcadas não ocupam
+horário. Para uma aula só, aulas_conflitantes faz uma consulta por intervalo
+(coberta pelo índice de data e horário); para operações em lote, AgendaOcupada
+carrega a agenda do período uma vez e responde em memória.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from .models import AgendaAula
+
+# Status que liberam o horário
+STATUS_LIVRES = ('cancelado', 'remarcado')
+
+
+def aulas_conflitantes(personal_trainer_id, data_aula, horario_inicio, horario_fim, excluir_pk=None):
+    """Aulas do personal trainer que se sobrepõem ao horário informado."""
+    aulas = AgendaAula.objects.filter(
+        aluno__personal_trainer_id=personal_trainer_id,
+        data_aula=data_aula,
+        horario_inicio__lt=horario_fim,
+        horario_fim__gt=horario_inicio
+    ).exclude(status__in=STATUS_LIVRES)
+    if excluir_pk is not None:
+        aulas = aulas.exclude(pk=excluir_pk)
+    return aulas.select_related('aluno').order_by('horario_inicio')
+
+
+def descrever_conflitos(aulas):
+    """Texto curto com as aulas em conflito, para mensagens de erro."""
+    return ', '.join(
+        f"{aula.aluno.nome} ({aula.horario_inicio:%H:%M}–{aula.horario_fim:%H:%M})"
+        for aula in aulas
+    )
+
+
+class AgendaOcupada:
+    """
+    Horários ocupados de um ou mais personal trainers, indexados por dia.
+
+    Cada (personal trainer, dia) guarda uma lista ordenada por início; a busca
+    usa bisect para descartar as aulas que começam depois do fim do intervalo.
+    """
+
+    def __init__(self):
+        self._dias = defaultdict(list)
+
+    @classmethod
+    def carregar(cls, personal_trainer_ids, data_inicio, data_fim):
+        """Agenda ocupada dos personal trainers entre as duas datas, em uma consulta."""
+        agenda = cls()
+        for trainer_id, data_aula, horario_inicio, horario_fim, aluno_id in AgendaAula.objects.filter(
+            aluno__personal_trainer_id__in=personal_trainer_ids,
+            data_aula__range=(data_inicio, data_fim)
+        ).exclude(
+            status__in=STATUS_LIVRES
+        ).values_list('aluno__personal_trainer_id', 'data_aula', 'horario_inicio', 'horario_fim', 'aluno_id'):
+            agenda.adicionar(trainer_id, data_aula, horario_inicio, horario_fim, aluno_id)
+        return agenda
+
+    def adicionar(self, personal_trainer_id, data_aula, horario_inicio, horario_fim, aluno_id):
+        insort(self._dias[(personal_trainer_id, data_aula)], (horario_inicio, horario_fim, aluno_id))
+
+    def conflitos(self, personal_trainer_id, data_aula, horario_inicio, horario_fim):
+        """Intervalos (início, fim, aluno_id) que se sobrepõem ao horário informado."""
+        ocupados = self._dias.get((personal_trainer_id, data_aula))
+        if not ocupados:
+            return []
+        # Só as aulas que começam antes do fim podem se sobrepor
+        limite = bisect_left(ocupados, (horario_fim,))
+        return [ocupado for ocupado in ocupados[:limite] if ocupado[1] > horario_inicio]
+
+    def reservar(self, personal_trainer_id, data_aula, horario_inicio, horario_fim, aluno_id):
+        """Ocupa o horário se estiver livre; retorna os conflitos (vazio quando reservou)."""
+        conflitos = self.conflitos(personal_trainer_id, data_aula, horario_inicio, horario_fim)
+        if not conflitos:
+            self.adicionar(personal_trainer_id, data_aula, horario_inicio, horario_fim, aluno_id)
+        return conflitos
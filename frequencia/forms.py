@@ -2,6 +2,7 @@
 Formulários simplificados para frequência.
 """
 from django import forms
+from .conflitos import STATUS_LIVRES, aulas_conflitantes, descrever_conflitos
 from .models import AgendaAula, RegistroPresenca
 from alunos.models import Aluno
 
@@ -65,6 +66,18 @@ class AgendaAulaForm(forms.ModelForm):
             if horario_fim <= horario_inicio:
                 raise forms.ValidationError('O horário de fim deve ser posterior ao horário de início.')
         
+        aluno = cleaned_data.get('aluno')
+        data_aula = cleaned_data.get('data_aula')
+        status = cleaned_data.get('status')
+        if aluno and data_aula and horario_inicio and horario_fim and status not in STATUS_LIVRES:
+            conflitos = aulas_conflitantes(
+                aluno.personal_trainer_id, data_aula, horario_inicio, horario_fim, excluir_pk=self.instance.pk
+            )
+            if conflitos:
+                raise forms.ValidationError(
+                    f'Já existe aula neste horário: {descrever_conflitos(conflitos)}.'
+                )
+        
         return cleaned_data
 
 
@@ -0,0 +1,185 @@
+"""
+Feeds iCalendar (ICS) da agenda, para assinatura em aplicativos de calendário.
+
+Cada aluno e cada personal trainer têm uma URL com um token assinado (não
+expira; trocar a SECRET_KEY invalida todos). O token já traz o personal
+trainer, então a ETag sai só da versão do cache de frequência: um cliente que
+pergunta se o feed mudou recebe 304 sem nenhuma consulta ao banco.
+
+Cada aula já criada em AgendaAula vira um evento avulso; as canceladas ou
+remarcadas saem como STATUS:CANCELLED. Os horários padrão não viram séries
+(RRULE): uma série em aberto publicaria ocorrências que a agenda recusou por
+conflito ou que foram movidas para outro horário. O feed alcança, portanto, o
+horizonte mantido pelo comando materializar_agenda. O texto é gerado evento a
+evento e guardado no cache ao fim da primeira transmissão.
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .cache import TEMPO_CACHE, versao_frequencia
+from .conflitos import STATUS_LIVRES
+from .models import AgendaAula
+
+SALT_TOKEN = 'frequencia.ics'
+
+# Aulas passadas incluídas no feed
+DIAS_HISTORICO_ICS = 60
+
+
+def gerar_token(tipo, objeto_id, personal_trainer_id):
+    """Token da URL de assinatura ('aluno' ou 'personal')."""
+    return signing.dumps([tipo, objeto_id, personal_trainer_id], salt=SALT_TOKEN)
+
+
+def ler_token(token):
+    """(tipo, id, personal_trainer_id) do token; levanta signing.BadSignature se inválido."""
+    tipo, objeto_id, personal_trainer_id = signing.loads(token, salt=SALT_TOKEN)
+    if tipo not in ('aluno', 'personal'):
+        raise signing.BadSignature('Tipo de feed inválido.')
+    return tipo, objeto_id, personal_trainer_id
+
+
+def _texto(valor):
+    """Escapa um valor de texto (RFC 5545, 3.3.11)."""
+    return (
+        str(valor).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _linha(conteudo):
+    """Linha terminada em CRLF, dobrada a cada 75 octetos (sem quebrar caracteres UTF-8)."""
+    partes = []
+    atual = ''
+    tamanho = 0
+    for caractere in conteudo:
+        octetos = len(caractere.encode())
+        if tamanho + octetos > 75:
+            partes.append(atual)
+            atual = ' '
+            tamanho = 1
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return '\r\n'.join(partes) + '\r\n'
+
+
+def _data_hora(data, horario):
+    return datetime.combine(data, horario).strftime('%Y%m%dT%H%M%S')
+
+
+def _fuso():
+    """VTIMEZONE com o deslocamento atual do fuso do sistema (sem horário de verão)."""
+    deslocamento = int(timezone.localtime().utcoffset().total_seconds() // 60)
+    sinal = '-' if deslocamento < 0 else '+'
+    horas, minutos = divmod(abs(deslocamento), 60)
+    offset = f'{sinal}{horas:02d}{minutos:02d}'
+    return ''.join(_linha(linha) for linha in [
+        'BEGIN:VTIMEZONE',
+        f'TZID:{settings.TIME_ZONE}',
+        'BEGIN:STANDARD',
+        'DTSTART:19700101T000000',
+        f'TZOFFSETFROM:{offset}',
+        f'TZOFFSETTO:{offset}',
+        'END:STANDARD',
+        'END:VTIMEZONE',
+    ])
+
+
+def _evento(uid, inicio, fim, resumo, carimbo, extras=()):
+    linhas = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{carimbo}',
+        f'DTSTART;TZID={settings.TIME_ZONE}:{inicio}',
+        f'DTEND;TZID={settings.TIME_ZONE}:{fim}',
+        f'SUMMARY:{_texto(resumo)}',
+        *extras,
+        'END:VEVENT',
+    ]
+    return ''.join(_linha(linha) for linha in linhas)
+
+
+def eventos_ics(nome_calendario, alunos_filtro, resumo, hoje):
+    """
+    Gera o calendário em pedaços de texto (cabeçalho, um VEVENT por vez, rodapé).
+
+    alunos_filtro restringe as aulas (ex.: {'aluno_id': 1}); resumo(nome_do_aluno)
+    monta o título dos eventos.
+    """
+    carimbo = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+    yield ''.join(_linha(linha) for linha in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//FormaFit//Agenda//PT-BR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_texto(nome_calendario)}',
+        f'X-WR-TIMEZONE:{settings.TIME_ZONE}',
+    ])
+    yield _fuso()
+
+    for aula in AgendaAula.objects.filter(
+        data_aula__gte=hoje - timedelta(days=DIAS_HISTORICO_ICS), **alunos_filtro
+    ).values(
+        'id', 'aluno__nome', 'data_aula', 'horario_inicio', 'horario_fim', 'status', 'tipo_treino'
+    ).order_by('data_aula', 'horario_inicio').iterator(chunk_size=1000):
+        extras = [f"STATUS:{'CANCELLED' if aula['status'] in STATUS_LIVRES else 'CONFIRMED'}"]
+        if aula['tipo_treino']:
+            extras.append(f"DESCRIPTION:{_texto(aula['tipo_treino'])}")
+        yield _evento(
+            f"aula-{aula['id']}@formafit",
+            _data_hora(aula['data_aula'], aula['horario_inicio']),
+            _data_hora(aula['data_aula'], aula['horario_fim']),
+            resumo(aula['aluno__nome']),
+            carimbo,
+            extras
+        )
+
+    yield _linha('END:VCALENDAR')
+
+
+def resposta_ics(request, token, personal_trainer_id, gerar, nome_arquivo):
+    """
+    Responde com o feed do token: 304 se o cliente já tem a versão atual, o texto
+    em cache se houver, ou a geração transmitida evento a evento (e guardada no
+    cache ao terminar).
+
+    gerar() deve retornar o iterador de eventos_ics; só é chamada quando é preciso gerar.
+    """
+    hoje = timezone.now().date()
+    versao = f'{token}:{versao_frequencia(personal_trainer_id)}:{hoje.isoformat()}'
+    assinatura = hashlib.md5(versao.encode(), usedforsecurity=False).hexdigest()
+    etag = quote_etag(assinatura)
+    chave = f'frequencia:ics:{assinatura}'
+
+    resposta = get_conditional_response(request, etag=etag)
+    if resposta is None:
+        conteudo = cache.get(chave)
+        if conteudo is not None:
+            resposta = HttpResponse(conteudo, content_type='text/calendar; charset=utf-8')
+        else:
+            def transmitir(pedacos):
+                gerados = []
+                for pedaco in pedacos:
+                    gerados.append(pedaco)
+                    yield pedaco
+                # Só chega aqui se o cliente recebeu o feed inteiro
+                cache.set(chave, ''.join(gerados), TEMPO_CACHE)
+
+            resposta = StreamingHttpResponse(
+                transmitir(gerar()), content_type='text/calendar; charset=utf-8'
+            )
+        resposta['Content-Disposition'] = f'inline; filename="{nome_arquivo}"'
+
+    resposta['ETag'] = etag
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
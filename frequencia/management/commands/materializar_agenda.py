@@ -0,0 +1,63 @@
+"""
+Management command para criar as aulas recorrentes dos horários padrão dos alunos.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from frequencia.services import FrequenciaService
+
+
+class Command(BaseCommand):
+    help = 'Mantém a agenda dos alunos ativos preenchida até o horizonte configurado; pensado para rodar toda noite'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Dia de referência (DD/MM/AAAA, padrão: hoje)')
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+        parser.add_argument('--semanas', type=int, help='Horizonte em semanas (padrão: AGENDA_HORIZONTE_SEMANAS)')
+        parser.add_argument('--tamanho-lote', type=int, default=1000, help='Alunos por lote (padrão: 1000)')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] < 1:
+            raise CommandError('O tamanho do lote deve ser maior que zero.')
+        if options['semanas'] is not None and options['semanas'] < 1:
+            raise CommandError('O horizonte deve ser de pelo menos uma semana.')
+
+        data = None
+        if options['data']:
+            try:
+                data = datetime.strptime(options['data'], '%d/%m/%Y').date()
+            except ValueError:
+                raise CommandError(f"Data inválida: {options['data']}. Use o formato DD/MM/AAAA.")
+
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        conflitos = []
+
+        def conflito(aula, ocupados):
+            conflitos.append(aula)
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'Conflito: aluno {aula.aluno_id} em {aula.data_aula:%d/%m/%Y} '
+                    f'às {aula.horario_inicio:%H:%M} ({len(ocupados)} aula(s) no horário)'
+                )
+
+        criadas = FrequenciaService().materializar_agenda(
+            data,
+            personal_trainer,
+            semanas=options['semanas'],
+            tamanho_lote=options['tamanho_lote'],
+            ao_encontrar_conflito=conflito
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'{criadas} aula(s) criada(s).'))
+        if conflitos:
+            self.stdout.write(self.style.WARNING(
+                f'{len(conflitos)} aula(s) não criada(s) por conflito de horário (use -v 2 para detalhes).'
+            ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frequencia', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendaaula',
+            index=models.Index(fields=['data_aula', 'horario_inicio'], name='frequencia__data_au_fb9a96_idx'),
+        ),
+    ]
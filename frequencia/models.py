@@ -4,6 +4,7 @@ Modelos para controle de frequência dos alunos.
 from django.db import models
 from django.utils import timezone
 from alunos.models import Aluno
+from .cache import invalidar_cache_frequencia
 
 
 class RegistroPresenca(models.Model):
@@ -34,6 +35,14 @@ class RegistroPresenca(models.Model):
     def __str__(self):
         return f"{self.aluno.nome} - {self.data_aula.strftime('%d/%m/%Y')} - {self.get_status_display()}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidar_cache_frequencia(self.aluno.personal_trainer_id)
+    
+    def delete(self, *args, **kwargs):
+        invalidar_cache_frequencia(self.aluno.personal_trainer_id)
+        return super().delete(*args, **kwargs)
+    
     @property
     def duracao_aula(self):
         """Calcula a duração da aula em minutos."""
@@ -72,6 +81,10 @@ class AgendaAula(models.Model):
         verbose_name_plural = 'Agendamentos de Aulas'
         ordering = ['data_aula', 'horario_inicio']
         unique_together = ['aluno', 'data_aula', 'horario_inicio']
+        indexes = [
+            # Busca de conflitos: aulas do dia que começam antes do fim do horário
+            models.Index(fields=['data_aula', 'horario_inicio']),
+        ]
     
     def __str__(self):
         return f"{self.aluno.nome} - {self.data_aula.strftime('%d/%m/%Y')} às {self.horario_inicio.strftime('%H:%M')}"
@@ -97,6 +110,11 @@ class AgendaAula(models.Model):
                 )
         
         super().save(*args, **kwargs)
+        invalidar_cache_frequencia(self.aluno.personal_trainer_id)
+    
+    def delete(self, *args, **kwargs):
+        invalidar_cache_frequencia(self.aluno.personal_trainer_id)
+        return super().delete(*args, **kwargs)
 
 
 class RelatorioFrequencia(models.Model):
@@ -0,0 +1,201 @@
+"""
+Serviços do controle de frequência.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, FloatField, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+
+from alunos.models import Aluno, HorarioPadraoAluno
+from .cache import invalidar_cache_frequencia, obter_ou_calcular
+from .conflitos import AgendaOcupada
+from .models import AgendaAula, RegistroPresenca
+
+
+def _contagem_por_aluno(queryset):
+    """Subquery com a quantidade de linhas do aluno da consulta externa."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(aluno=OuterRef('pk')).order_by().values('aluno').annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class FrequenciaService:
+    """Serviço para estatísticas de frequência."""
+    
+    def ranking_frequencia(self, personal_trainer, data_inicio, data_fim, limite=5):
+        """
+        Alunos com maior percentual de presença no período (presenças / aulas realizadas).
+        
+        As duas contagens entram como subqueries correlacionadas em uma única
+        consulta sobre Aluno, e a ordenação e o limite são feitos no banco. O
+        resultado fica em cache até a próxima escrita em agendamentos ou presenças.
+        """
+        def calcular():
+            alunos = Aluno.objects.filter(
+                personal_trainer=personal_trainer
+            ).annotate(
+                total_aulas=_contagem_por_aluno(AgendaAula.objects.filter(
+                    data_aula__range=(data_inicio, data_fim),
+                    status='realizado'
+                )),
+                presencas=_contagem_por_aluno(RegistroPresenca.objects.filter(
+                    data_aula__range=(data_inicio, data_fim),
+                    status='presente'
+                ))
+            ).filter(
+                total_aulas__gt=0
+            ).annotate(
+                # Em decimal antes de arredondar: o PostgreSQL não tem ROUND(double precision, integer)
+                percentual=Round(Cast(
+                    Cast('presencas', FloatField()) * 100 / F('total_aulas'),
+                    DecimalField(max_digits=5, decimal_places=1)
+                ), 1)
+            ).order_by('-percentual', 'nome')[:limite]
+            # O SQLite devolve o decimal calculado sem as casas fixas
+            return [
+                {**linha, 'percentual': round(float(linha['percentual']), 1)}
+                for linha in alunos.values('pk', 'total_aulas', 'presencas', 'percentual')
+            ]
+        
+        ranking = obter_ou_calcular(
+            personal_trainer.pk,
+            'ranking',
+            (data_inicio.isoformat(), data_fim.isoformat(), limite),
+            calcular
+        )
+        alunos = Aluno.objects.in_bulk([linha['pk'] for linha in ranking])
+        return [
+            {
+                'aluno': alunos[linha['pk']],
+                'total_aulas': linha['total_aulas'],
+                'presencas': linha['presencas'],
+                'percentual': linha['percentual'],
+            }
+            for linha in ranking
+            if linha['pk'] in alunos
+        ]
+    
+    def aulas_calendario(self, personal_trainer, data_inicio, data_fim):
+        """
+        Aulas do período agrupadas por dia, no formato compacto do feed do calendário.
+        
+        Só as colunas exibidas são lidas (values()); os dias sem aula ficam de fora.
+        """
+        dias = defaultdict(list)
+        for aula in AgendaAula.objects.filter(
+            aluno__personal_trainer=personal_trainer,
+            data_aula__range=(data_inicio, data_fim)
+        ).values(
+            'id', 'aluno_id', 'aluno__nome', 'data_aula', 'horario_inicio', 'horario_fim', 'status', 'tipo_treino'
+        ).order_by('data_aula', 'horario_inicio'):
+            dias[aula['data_aula'].isoformat()].append({
+                'id': aula['id'],
+                'aluno_id': aula['aluno_id'],
+                'aluno': aula['aluno__nome'],
+                'inicio': aula['horario_inicio'].strftime('%H:%M'),
+                'fim': aula['horario_fim'].strftime('%H:%M'),
+                'status': aula['status'],
+                'tipo': aula['tipo_treino'],
+            })
+        return {
+            'inicio': data_inicio.isoformat(),
+            'fim': data_fim.isoformat(),
+            'dias': dias,
+        }
+    
+    def materializar_agenda(self, data=None, personal_trainer=None, aluno=None, semanas=None, tamanho_lote=1000,
+                            ao_encontrar_conflito=None):
+        """
+        Cria as aulas dos horários padrão ativos até o horizonte da agenda.
+        
+        Para cada aluno ativo, as ocorrências de amanhã até `semanas` semanas à
+        frente (AGENDA_HORIZONTE_SEMANAS por padrão) são calculadas em memória e
+        comparadas com as aulas já existentes (aluno, data, horário), inclusive as
+        canceladas ou remarcadas, que não são recriadas. Ocorrências que batem com
+        outra aula do personal trainer (ver frequencia.conflitos) não são criadas e
+        são passadas para ao_encontrar_conflito(aula, conflitos). As demais são
+        gravadas com bulk_create, `tamanho_lote` alunos por vez. Rodar de novo não
+        cria duplicatas. Retorna a quantidade de aulas de fato inseridas (as que
+        uma execução concorrente já tinha criado não contam).
+        
+        Só cria aulas: as aulas futuras de um horário padrão depois desativado ou
+        alterado continuam na agenda e precisam ser canceladas ou editadas à parte.
+        """
+        hoje = data or timezone.now().date()
+        semanas = settings.AGENDA_HORIZONTE_SEMANAS if semanas is None else semanas
+        inicio = hoje + timedelta(days=1)
+        fim = hoje + timedelta(weeks=semanas)
+        
+        horarios = HorarioPadraoAluno.objects.filter(ativo=True, aluno__ativo=True)
+        if personal_trainer is not None:
+            horarios = horarios.filter(aluno__personal_trainer=personal_trainer)
+        if aluno is not None:
+            horarios = horarios.filter(aluno=aluno)
+        
+        por_aluno = defaultdict(list)
+        trainers = {}
+        for aluno_id, dia_semana, horario_inicio, horario_fim, data_inicio, trainer_id in horarios.values_list(
+            'aluno_id', 'dia_semana', 'horario_inicio', 'horario_fim', 'aluno__data_inicio', 'aluno__personal_trainer_id'
+        ).order_by('aluno__personal_trainer_id', 'aluno_id'):
+            por_aluno[aluno_id].append((dia_semana, horario_inicio, horario_fim, max(inicio, data_inicio)))
+            trainers[aluno_id] = trainer_id
+        
+        alunos = list(por_aluno)
+        criadas = 0
+        for posicao in range(0, len(alunos), tamanho_lote):
+            lote = alunos[posicao:posicao + tamanho_lote]
+            existentes = set(
+                AgendaAula.objects.filter(
+                    aluno_id__in=lote,
+                    data_aula__range=(inicio, fim)
+                ).values_list('aluno_id', 'data_aula', 'horario_inicio')
+            )
+            agenda = AgendaOcupada.carregar({trainers[aluno_id] for aluno_id in lote}, inicio, fim)
+            
+            novas = []
+            for aluno_id in lote:
+                trainer_id = trainers[aluno_id]
+                for dia_semana, horario_inicio, horario_fim, primeira_data in por_aluno[aluno_id]:
+                    data_aula = primeira_data + timedelta(days=(dia_semana - primeira_data.weekday()) % 7)
+                    while data_aula <= fim:
+                        if (aluno_id, data_aula, horario_inicio) not in existentes:
+                            aula = AgendaAula(
+                                aluno_id=aluno_id,
+                                data_aula=data_aula,
+                                horario_inicio=horario_inicio,
+                                horario_fim=horario_fim,
+                                status='agendado',
+                                tipo_treino='Treino Regular',
+                                observacoes='Agendamento automático (horário padrão)'
+                            )
+                            conflitos = agenda.reservar(trainer_id, data_aula, horario_inicio, horario_fim, aluno_id)
+                            if not conflitos:
+                                novas.append(aula)
+                            elif ao_encontrar_conflito is not None:
+                                ao_encontrar_conflito(aula, conflitos)
+                        data_aula += timedelta(weeks=1)
+            
+            if not novas:
+                continue
+            
+            # ignore_conflicts cobre uma execução concorrente criando as mesmas aulas;
+            # o bulk_create não diz quantas ignorou, então conta-se o lote antes e depois
+            aulas_lote = AgendaAula.objects.filter(aluno_id__in=lote, data_aula__range=(inicio, fim))
+            with transaction.atomic():
+                antes = aulas_lote.count()
+                AgendaAula.objects.bulk_create(novas, batch_size=tamanho_lote, ignore_conflicts=True)
+                criadas += aulas_lote.count() - antes
+            
+            # bulk_create não passa pelo save(), que é quem invalida o cache
+            for trainer_id in {trainers[nova.aluno_id] for nova in novas}:
+                invalidar_cache_frequencia(trainer_id)
+        
+        return criadas
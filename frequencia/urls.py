@@ -24,4 +24,6 @@ urlpatterns = [
     path('registrar-presenca/', views.RegistroPresencaCreateView.as_view(), name='registrar_presenca'),
     path('registrar-presenca-rapido/<int:aula_id>/', views.registrar_presenca_rapido, name='registrar_presenca_rapido'),
     path('calendario/', views.calendario_view, name='calendario'),
+    path('calendario/feed/', views.calendario_feed, name='calendario_feed'),
+    path('calendario/ics/<str:token>.ics', views.calendario_ics, name='calendario_ics'),
 ]
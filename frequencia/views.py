@@ -8,13 +8,23 @@ from django.contrib import messages
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
 from django.db.models import Q
-from django.http import JsonResponse
+from django.core import signing
+from django.http import Http404, JsonResponse
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from .models import AgendaAula, RegistroPresenca
 from .forms import AgendaAulaForm, RegistroPresencaForm
+from .cache import versao_frequencia
+from .conflitos import STATUS_LIVRES, aulas_conflitantes, descrever_conflitos
+from .ics import eventos_ics, gerar_token, ler_token, resposta_ics
+from .services import FrequenciaService
+from accounts.models import User
 from alunos.models import Aluno
+from financeiro.condicional import resposta_json_condicional
+
+# Maior intervalo aceito pelo feed do calendário (um mês com as semanas das bordas)
+DIAS_MAXIMOS_FEED = 62
 
 
 class AgendaListView(LoginRequiredMixin, ListView):
@@ -168,37 +178,8 @@ def agenda_dashboard(request):
         data_aula__range=[hoje, hoje + timedelta(days=7)]
     ).count()
     
-    # Estatísticas de frequência dos alunos (este mês)
-    alunos_stats = []
-    alunos = Aluno.objects.filter(personal_trainer=request.user)
-    
-    for aluno in alunos:
-        total_aulas_mes = AgendaAula.objects.filter(
-            aluno=aluno,
-            data_aula__gte=primeiro_dia_mes,
-            data_aula__lte=hoje,
-            status='realizado'
-        ).count()
-        
-        presencas = RegistroPresenca.objects.filter(
-            aluno=aluno,
-            data_aula__gte=primeiro_dia_mes,
-            data_aula__lte=hoje,
-            status='presente'
-        ).count()
-        
-        if total_aulas_mes > 0:
-            percentual = (presencas / total_aulas_mes) * 100
-            alunos_stats.append({
-                'aluno': aluno,
-                'total_aulas': total_aulas_mes,
-                'presencas': presencas,
-                'percentual': round(percentual, 1)
-            })
-    
-    # Ordenar por percentual de frequência
-    alunos_stats.sort(key=lambda x: x['percentual'], reverse=True)
-    alunos_stats = alunos_stats[:5]  # Top 5
+    # Top 5 em frequência no mês (uma consulta, em cache até a próxima escrita)
+    alunos_stats = FrequenciaService().ranking_frequencia(request.user, primeiro_dia_mes, hoje)
     
     context = {
         'aulas_hoje': aulas_hoje,
@@ -211,6 +192,15 @@ def agenda_dashboard(request):
     return render(request, 'frequencia/dashboard.html', context)
 
 
+def _conflitos_reativacao(aula, novo_status):
+    """Aulas que impedem uma aula cancelada ou remarcada de voltar a ocupar o horário."""
+    if aula.status not in STATUS_LIVRES or novo_status in STATUS_LIVRES:
+        return []
+    return list(aulas_conflitantes(
+        aula.aluno.personal_trainer_id, aula.data_aula, aula.horario_inicio, aula.horario_fim, excluir_pk=aula.pk
+    ))
+
+
 @login_required
 def alterar_status_aula(request, pk):
     """
@@ -221,9 +211,13 @@ def alterar_status_aula(request, pk):
     if request.method == 'POST':
         novo_status = request.POST.get('status')
         if novo_status in dict(AgendaAula.STATUS_CHOICES):
-            aula.status = novo_status
-            aula.save()
-            messages.success(request, f'Status da aula alterado para {aula.get_status_display()}')
+            conflitos = _conflitos_reativacao(aula, novo_status)
+            if conflitos:
+                messages.error(request, f'Já existe aula neste horário: {descrever_conflitos(conflitos)}.')
+            else:
+                aula.status = novo_status
+                aula.save()
+                messages.success(request, f'Status da aula alterado para {aula.get_status_display()}')
         else:
             messages.error(request, 'Status inválido')
         
@@ -247,6 +241,14 @@ def alterar_status_rapido(request, pk):
         novo_status = request.POST.get('status')
         
         if novo_status in dict(AgendaAula.STATUS_CHOICES):
+            conflitos = _conflitos_reativacao(aula, novo_status)
+            if conflitos:
+                mensagem = f'Já existe aula neste horário: {descrever_conflitos(conflitos)}.'
+                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                    return JsonResponse({'success': False, 'message': mensagem}, status=409)
+                messages.error(request, mensagem)
+                return redirect('frequencia:dashboard')
+            
             aula.status = novo_status
             aula.save()
             
@@ -358,78 +360,95 @@ class RegistroPresencaCreateView(LoginRequiredMixin, CreateView):
 def calendario_view(request):
     """
     View do calendário de aulas.
+    
+    A página só traz a grade; as aulas de cada mês ou semana exibidos são
+    buscadas no feed JSON (calendario_feed).
     """
-    import calendar
-    from datetime import datetime, date, timedelta
-    
-    # Obter mês e ano dos parâmetros GET ou usar atual
-    hoje = date.today()
-    ano = int(request.GET.get('ano', hoje.year))
-    mes = int(request.GET.get('mes', hoje.month))
-    
-    # Validação básica
-    if mes < 1 or mes > 12:
-        mes = hoje.month
-    if ano < 2020 or ano > 2030:
-        ano = hoje.year
-    
-    # Criar calendário
-    cal = calendar.Calendar(firstweekday=6)  # Domingo como primeiro dia
-    dias_mes = cal.monthdayscalendar(ano, mes)
-    
-    # Buscar aulas do mês
-    primeiro_dia = date(ano, mes, 1)
-    if mes == 12:
-        ultimo_dia = date(ano + 1, 1, 1) - timedelta(days=1)
-    else:
-        ultimo_dia = date(ano, mes + 1, 1) - timedelta(days=1)
-    
-    aulas_mes = AgendaAula.objects.filter(
-        aluno__personal_trainer=request.user,
-        data_aula__gte=primeiro_dia,
-        data_aula__lte=ultimo_dia
-    ).select_related('aluno').order_by('data_aula', 'horario_inicio')
-    
-    # Organizar aulas por dia
-    aulas_por_dia = {}
-    for aula in aulas_mes:
-        dia = aula.data_aula.day
-        if dia not in aulas_por_dia:
-            aulas_por_dia[dia] = []
-        aulas_por_dia[dia].append(aula)
-    
-    # Navegação (mês anterior/próximo)
-    if mes == 1:
-        mes_anterior = 12
-        ano_anterior = ano - 1
-    else:
-        mes_anterior = mes - 1
-        ano_anterior = ano
-    
-    if mes == 12:
-        mes_proximo = 1
-        ano_proximo = ano + 1
-    else:
-        mes_proximo = mes + 1
-        ano_proximo = ano
+    hoje = timezone.now().date()
+    try:
+        referencia = date(int(request.GET.get('ano', hoje.year)), int(request.GET.get('mes', hoje.month)), 1)
+    except ValueError:
+        referencia = hoje.replace(day=1)
     
     context = {
-        'ano': ano,
-        'mes': mes,
-        'nome_mes': calendar.month_name[mes],
-        'dias_mes': dias_mes,
-        'aulas_por_dia': aulas_por_dia,
+        'ano': referencia.year,
+        'mes': referencia.month,
         'hoje': hoje,
-        'mes_anterior': mes_anterior,
-        'ano_anterior': ano_anterior,
-        'mes_proximo': mes_proximo,
-        'ano_proximo': ano_proximo,
         'dias_semana': ['Dom', 'Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb'],
+        'status_choices': AgendaAula.STATUS_CHOICES,
+        'url_ics': request.build_absolute_uri(reverse(
+            'frequencia:calendario_ics', args=[gerar_token('personal', request.user.pk, request.user.pk)]
+        )),
     }
     
     return render(request, 'frequencia/calendario.html', context)
 
 
+@login_required
+def calendario_feed(request):
+    """
+    Feed JSON das aulas entre ?inicio= e ?fim= (AAAA-MM-DD), agrupadas por dia.
+    
+    Responde 304 quando o navegador já tem a versão atual do intervalo (ETag
+    derivada da quantidade de aulas e da maior data_atualizacao).
+    """
+    try:
+        data_inicio = date.fromisoformat(request.GET.get('inicio', ''))
+        data_fim = date.fromisoformat(request.GET.get('fim', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Informe inicio e fim no formato AAAA-MM-DD.'}, status=400)
+    
+    if data_fim < data_inicio:
+        return JsonResponse({'error': 'O fim deve ser igual ou posterior ao início.'}, status=400)
+    if (data_fim - data_inicio).days > DIAS_MAXIMOS_FEED:
+        return JsonResponse({'error': f'O intervalo pode ter no máximo {DIAS_MAXIMOS_FEED} dias.'}, status=400)
+    
+    return resposta_json_condicional(
+        request, 'calendario', [data_inicio, data_fim],
+        AgendaAula.objects.filter(
+            aluno__personal_trainer=request.user,
+            data_aula__range=(data_inicio, data_fim)
+        ),
+        lambda: FrequenciaService().aulas_calendario(request.user, data_inicio, data_fim),
+        versao_cache=versao_frequencia
+    )
+
+
+def calendario_ics(request, token):
+    """
+    Feed iCalendar da agenda de um aluno ou do personal trainer (URL de assinatura).
+    
+    Não exige login: o token assinado identifica o feed.
+    """
+    try:
+        tipo, objeto_id, personal_trainer_id = ler_token(token)
+    except signing.BadSignature:
+        raise Http404('Feed não encontrado.')
+    
+    hoje = timezone.now().date()
+    
+    def gerar():
+        if tipo == 'aluno':
+            aluno = get_object_or_404(
+                Aluno.objects.select_related('personal_trainer'),
+                pk=objeto_id,
+                personal_trainer_id=personal_trainer_id
+            )
+            personal = aluno.personal_trainer.nome_completo or 'Personal'
+            return eventos_ics(
+                f'Treinos - {aluno.nome}', {'aluno_id': aluno.pk}, lambda nome: f'Treino com {personal}', hoje
+            )
+        personal_trainer = get_object_or_404(User, pk=objeto_id)
+        return eventos_ics(
+            f'Agenda - {personal_trainer.nome_completo or personal_trainer.email}',
+            {'aluno__personal_trainer_id': personal_trainer.pk},
+            lambda nome: f'Aula - {nome}',
+            hoje
+        )
+    
+    return resposta_ics(request, token, personal_trainer_id, gerar, f'agenda-{tipo}.ics')
+
+
 @login_required
 def registrar_presenca_rapido(request, aula_id):
     """
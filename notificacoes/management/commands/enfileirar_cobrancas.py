@@ -0,0 +1,44 @@
+"""
+Management command para enfileirar os lembretes de pagamento do dia.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from notificacoes.services import NotificacaoService
+
+
+class Command(BaseCommand):
+    help = 'Enfileira os lembretes de faturas a vencer e vencidas; pensado para rodar uma vez por dia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Dia de referência (DD/MM/AAAA, padrão: hoje)')
+        parser.add_argument('--personal-trainer', help='E-mail do personal trainer (padrão: todos)')
+        parser.add_argument('--tamanho-lote', type=int, default=1000, help='Notificações por lote (padrão: 1000)')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] < 1:
+            raise CommandError('O tamanho do lote deve ser maior que zero.')
+
+        data = None
+        if options['data']:
+            try:
+                data = datetime.strptime(options['data'], '%d/%m/%Y').date()
+            except ValueError:
+                raise CommandError(f"Data inválida: {options['data']}. Use o formato DD/MM/AAAA.")
+
+        personal_trainer = None
+        if options['personal_trainer']:
+            try:
+                personal_trainer = User.objects.get(email=options['personal_trainer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Personal trainer não encontrado: {options['personal_trainer']}")
+
+        criadas = NotificacaoService().enfileirar_cobrancas(
+            data,
+            personal_trainer,
+            tamanho_lote=options['tamanho_lote']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'{criadas} lembrete(s) de pagamento enfileirado(s).'))
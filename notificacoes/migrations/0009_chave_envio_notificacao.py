@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:00
+
+from django.db import migrations, models
+import notificacoes.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificacoes', '0008_alter_configuracaonotificacao_horario_preferencial_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='chave_envio',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='configuracaonotificacao',
+            name='horario_preferencial',
+            field=models.TimeField(default=notificacoes.models.horario_atual),
+        ),
+        migrations.AlterField(
+            model_name='notificacaoautomatica',
+            name='horario_envio',
+            field=models.TimeField(default=notificacoes.models.horario_atual, help_text='Horário preferencial para envio'),
+        ),
+    ]
@@ -7,6 +7,11 @@ from django.conf import settings
 from alunos.models import Aluno
 
 
+def horario_atual():
+    """Horário atual, usado como padrão dos campos de horário (avaliado a cada registro)."""
+    return timezone.localtime().time()
+
+
 class TipoNotificacao(models.Model):
     """
     Tipos de notificações disponíveis no sistema.
@@ -72,6 +77,9 @@ class Notificacao(models.Model):
     
     erro_envio = models.TextField(blank=True, help_text="Detalhes do erro, se houver")
     
+    # Identifica notificações geradas automaticamente, evitando duplicatas na mesma rodada
+    chave_envio = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    
     class Meta:
         verbose_name = 'Notificação'
         verbose_name_plural = 'Notificações'
@@ -111,7 +119,7 @@ class NotificacaoAutomatica(models.Model):
     
     # Configurações de tempo
     antecedencia_dias = models.IntegerField(default=0, help_text="Dias de antecedência para envio")
-    horario_envio = models.TimeField(default=timezone.now().time(), help_text="Horário preferencial para envio")
+    horario_envio = models.TimeField(default=horario_atual, help_text="Horário preferencial para envio")
     
     # Filtros
     apenas_alunos_ativos = models.BooleanField(default=True)
@@ -165,7 +173,7 @@ class ConfiguracaoNotificacao(models.Model):
     receber_relatorio_progresso = models.BooleanField(default=True)
     
     # Configurações de horário
-    horario_preferencial = models.TimeField(default=timezone.now().time())
+    horario_preferencial = models.TimeField(default=horario_atual)
     dias_antecedencia_pagamento = models.IntegerField(default=3)
     
     # Contatos alternativos
@@ -0,0 +1,197 @@
+"""
+Serviços do sistema de notificações.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.template import Context, Template
+from django.utils import timezone
+
+from financeiro.models import Cobranca
+from .models import ConfiguracaoNotificacao, Notificacao, NotificacaoAutomatica
+
+# Gatilhos da régua de cobrança, na ordem de prioridade quando mais de um se aplica no mesmo dia
+GATILHOS_COBRANCA = [
+    'pagamento_vencido',
+    'pagamento_vence_hoje',
+    'pagamento_vence_3_dias',
+    'pagamento_vence_amanha',
+]
+
+# Textos usados quando o tipo de notificação não define templates próprios
+TITULOS_COBRANCA = {
+    'pagamento_vence_3_dias': 'Sua mensalidade vence em {{ dias }} dias',
+    'pagamento_vence_amanha': 'Sua mensalidade vence amanhã',
+    'pagamento_vence_hoje': 'Sua mensalidade vence hoje',
+    'pagamento_vencido': 'Mensalidade em atraso',
+}
+
+MENSAGENS_COBRANCA = {
+    'pagamento_vence_3_dias': (
+        'Olá, {{ aluno.nome }}! A mensalidade de {{ referencia }} no valor de R$ {{ valor }} '
+        'vence em {{ data }}.'
+    ),
+    'pagamento_vence_amanha': (
+        'Olá, {{ aluno.nome }}! A mensalidade de {{ referencia }} no valor de R$ {{ valor }} '
+        'vence amanhã ({{ data }}).'
+    ),
+    'pagamento_vence_hoje': (
+        'Olá, {{ aluno.nome }}! A mensalidade de {{ referencia }} no valor de R$ {{ valor }} '
+        'vence hoje.'
+    ),
+    'pagamento_vencido': (
+        'Olá, {{ aluno.nome }}! A mensalidade de {{ referencia }} no valor de R$ {{ valor }} '
+        'venceu em {{ data }} e está há {{ dias_atraso }} dia(s) em aberto.'
+    ),
+}
+
+CAMPOS_COBRANCA = [
+    'id', 'origem', 'fatura_id', 'fatura_simples_id', 'personal_trainer_id', 'aluno_id',
+    'aluno__nome', 'aluno__ativo', 'valor', 'valor_pago', 'data_vencimento',
+    'mes_referencia', 'ano_referencia',
+    'aluno__config_notificacao__receber_lembrete_pagamento',
+    'aluno__config_notificacao__dias_antecedencia_pagamento',
+    'aluno__config_notificacao__horario_preferencial',
+]
+
+
+class NotificacaoService:
+    """Serviço para geração de notificações automáticas."""
+
+    def enfileirar_cobrancas(self, data=None, personal_trainer=None, tamanho_lote=1000):
+        """
+        Enfileira os lembretes de pagamento do dia para todas as cobranças em aberto.
+
+        As cobranças a vencer e vencidas são lidas em uma única consulta (já com as
+        preferências de notificação de cada aluno); a régua é aplicada em memória e
+        as notificações são gravadas com bulk_create, um lote por vez. Cada lembrete
+        tem uma chave (gatilho, fatura, dia), então rodar de novo no mesmo dia não
+        cria duplicatas. Retorna a quantidade de notificações criadas.
+        """
+        hoje = data or timezone.localdate()
+
+        automaticas = {
+            automatica.trigger: automatica
+            for automatica in NotificacaoAutomatica.objects.filter(
+                ativa=True,
+                trigger__in=GATILHOS_COBRANCA,
+                tipo_notificacao__ativo=True
+            ).select_related('tipo_notificacao')
+        }
+        if not automaticas:
+            return 0
+
+        # Janela de busca: até a maior antecedência configurada (aluno ou régua)
+        antecedencia_maxima = max(
+            [1, *(automatica.antecedencia_dias for automatica in automaticas.values())]
+        )
+        if 'pagamento_vence_3_dias' in automaticas:
+            antecedencia_maxima = max(
+                antecedencia_maxima,
+                ConfiguracaoNotificacao.objects.aggregate(
+                    maior=Max('dias_antecedencia_pagamento')
+                )['maior'] or 0
+            )
+
+        cobrancas = Cobranca.objects.em_aberto().filter(
+            data_vencimento__lte=hoje + timedelta(days=antecedencia_maxima)
+        )
+        if personal_trainer is not None:
+            cobrancas = cobrancas.filter(personal_trainer=personal_trainer)
+
+        templates = {
+            gatilho: (
+                Template(automatica.tipo_notificacao.template_titulo or TITULOS_COBRANCA[gatilho]),
+                Template(automatica.tipo_notificacao.template_mensagem or MENSAGENS_COBRANCA[gatilho]),
+            )
+            for gatilho, automatica in automaticas.items()
+        }
+
+        criadas = 0
+        lote = []
+        for cobranca in cobrancas.values(*CAMPOS_COBRANCA).order_by('id').iterator(chunk_size=tamanho_lote):
+            gatilho = self._gatilho_cobranca(cobranca, automaticas, hoje)
+            if gatilho is None:
+                continue
+            lote.append(self._notificacao_cobranca(cobranca, gatilho, automaticas[gatilho], templates[gatilho], hoje))
+            if len(lote) >= tamanho_lote:
+                criadas += self._gravar_notificacoes(lote)
+                lote = []
+
+        if lote:
+            criadas += self._gravar_notificacoes(lote)
+        return criadas
+
+    def _gatilho_cobranca(self, cobranca, automaticas, hoje):
+        """Gatilho da régua que se aplica à cobrança hoje (ou None)."""
+        if cobranca['aluno__config_notificacao__receber_lembrete_pagamento'] is False:
+            return None
+
+        dias = (cobranca['data_vencimento'] - hoje).days
+        intervalo = max(settings.COBRANCA_INTERVALO_LEMBRETES_DIAS, 1)
+
+        for gatilho in GATILHOS_COBRANCA:
+            automatica = automaticas.get(gatilho)
+            if automatica is None or (automatica.apenas_alunos_ativos and not cobranca['aluno__ativo']):
+                continue
+
+            if gatilho == 'pagamento_vencido':
+                # Primeiro aviso após antecedencia_dias de atraso, depois a cada intervalo
+                atraso = -dias - automatica.antecedencia_dias
+                if dias < 0 and atraso >= 0 and atraso % intervalo == 0:
+                    return gatilho
+            elif gatilho == 'pagamento_vence_hoje':
+                if dias == 0:
+                    return gatilho
+            elif gatilho == 'pagamento_vence_amanha':
+                if dias == 1:
+                    return gatilho
+            else:
+                # Lembrete antecipado: a antecedência escolhida pelo aluno prevalece
+                antecedencia = cobranca['aluno__config_notificacao__dias_antecedencia_pagamento']
+                if antecedencia is None:
+                    antecedencia = automatica.antecedencia_dias
+                if dias > 0 and dias == antecedencia:
+                    return gatilho
+        return None
+
+    def _notificacao_cobranca(self, cobranca, gatilho, automatica, templates, hoje):
+        saldo = cobranca['valor'] - cobranca['valor_pago']
+        documento_id = cobranca['fatura_id'] if cobranca['origem'] == 'fatura' else cobranca['fatura_simples_id']
+        dias = (cobranca['data_vencimento'] - hoje).days
+
+        contexto = Context({
+            'aluno': {'nome': cobranca['aluno__nome']},
+            'valor': f'{saldo:.2f}'.replace('.', ','),
+            'data': cobranca['data_vencimento'].strftime('%d/%m/%Y'),
+            'referencia': f"{cobranca['mes_referencia']:02d}/{cobranca['ano_referencia']}",
+            'dias': max(dias, 0),
+            'dias_atraso': max(-dias, 0),
+        })
+        template_titulo, template_mensagem = templates
+
+        horario = cobranca['aluno__config_notificacao__horario_preferencial'] or automatica.horario_envio
+
+        return Notificacao(
+            tipo_notificacao=automatica.tipo_notificacao,
+            personal_trainer_id=cobranca['personal_trainer_id'],
+            aluno_id=cobranca['aluno_id'],
+            titulo=template_titulo.render(contexto)[:200],
+            mensagem=template_mensagem.render(contexto),
+            prioridade='alta' if gatilho == 'pagamento_vencido' else 'normal',
+            data_agendamento=timezone.make_aware(datetime.combine(hoje, horario)),
+            chave_envio=f"{gatilho}:{cobranca['origem']}:{documento_id}:{hoje:%Y%m%d}",
+        )
+
+    def _gravar_notificacoes(self, notificacoes):
+        """Grava o lote ignorando as chaves já enfileiradas; retorna quantas eram novas."""
+        existentes = set(
+            Notificacao.objects.filter(
+                chave_envio__in=[notificacao.chave_envio for notificacao in notificacoes]
+            ).values_list('chave_envio', flat=True)
+        )
+        novas = [notificacao for notificacao in notificacoes if notificacao.chave_envio not in existentes]
+        # ignore_conflicts cobre uma execução concorrente gravando as mesmas chaves
+        Notificacao.objects.bulk_create(novas, ignore_conflicts=True)
+        return len(novas)